@@ -0,0 +1,78 @@
+from tabulate import tabulate
+import subprocess
+import statistics
+import argparse
+import sys
+import re
+
+"""
+    Measures the cold-start time of the entry points: each module is imported by a new interpreter
+    with '-X importtime', the time of the entry point and of the heaviest modules it imports are reported
+    (the median of the runs). The command-line interface also reports the time of 'python -m <module> --help'.
+
+    Run from the src folder:
+        python -m benchmarks.import_time main.practice5v5 manager.run_manager.run_manager -r 5
+"""
+
+ENTRY_POINTS = ['main.practice5v5', 'main.practice5v4', 'main.practice5v3']
+IMPORT_TIME = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def import_times(module: str) -> dict:
+    """
+    Returns the cumulative import time (in seconds) of the module and of every module it imports.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"'{module}' could not be imported:\n{result.stderr}")
+
+    times = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME.match(line)
+        if match:
+            times[match.group(4)] = int(match.group(2)) / 1e6
+
+    return times
+
+
+def command_time(module: str) -> float:
+    """
+    Returns the wall time (in seconds) of 'python -m <module> --help'.
+    """
+    command = f'import runpy, sys, time; start = time.perf_counter(); sys.argv = ["{module}", "--help"]\n' \
+              f'try:\n    runpy.run_module("{module}", run_name="__main__")\nexcept SystemExit:\n    pass\n' \
+              f'print(time.perf_counter() - start, file=sys.stderr)'
+    result = subprocess.run([sys.executable, '-c', command], capture_output=True, text=True)
+    return float(result.stderr.strip().splitlines()[-1])
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Measure the cold-start time of the entry points.')
+    parser.add_argument('modules', type=str, nargs='*', default=ENTRY_POINTS, help='Modules to import')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='Number of runs of each module')
+    parser.add_argument('-n', '--top', type=int, default=5, help='Number of heaviest imported modules reported')
+    args = parser.parse_args(argv)
+
+    table = []
+    heaviest = []
+    for module in args.modules:
+        runs = [import_times(module) for _ in range(args.repeat)]
+        median_times = {name: statistics.median(run.get(name, 0) for run in runs) for name in runs[0]}
+        help_time = statistics.median(command_time(module) for _ in range(args.repeat)) if module.startswith('main.') else None
+
+        table.append([module, median_times[module] * 1000, help_time * 1000 if help_time is not None else '-'])
+
+        # The packages (their top-level module) taking the most time, except the standard library
+        packages = {name: time for name, time in median_times.items()
+                    if '.' not in name and name != module.split('.')[0] and name not in sys.stdlib_module_names}
+        for name, time in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+            heaviest.append([module, name, time * 1000])
+
+    print(tabulate(table, headers=['Entry point', 'Import (ms)', '--help (ms)'], floatfmt='.1f'))
+    print()
+    print(tabulate(heaviest, headers=['Entry point', 'Package', 'Import (ms)'], floatfmt='.1f'))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,76 @@
+from manager.text_processor import CustomTextProcessor
+from models.inverted_index import InvertedIndex
+from models.postings import Postings
+from models.postings_codecs import POSTINGS_CODECS
+
+from tabulate import tabulate
+import argparse
+import time
+import sys
+
+"""
+    Compares the postings codecs of the binary index: size of the encoded postings,
+    encoding time and decoding throughput (postings decoded per second).
+
+    Run from the src folder:
+        python -m benchmarks.postings_codecs ../lib/data/practice_05/small.zip -g .//article .//sec .//p
+"""
+
+
+def postings_size(postings_data: dict) -> int:
+    """
+    Returns the size in bytes of the arrays holding the postings.
+    """
+    return sum(len(values) * values.itemsize for name, values in postings_data.items()
+               if name in ('keys', 'tfs', 'data_offsets', 'postings_data'))
+
+
+def benchmark_codec(inverted_index: InvertedIndex, codec: str, repeat: int) -> list:
+    start_time = time.time()
+    postings_data = inverted_index.TF.export_postings(codec)
+    encoding_time = time.time() - start_time
+
+    postings = Postings()
+    postings.import_postings({name: memoryview(values) for name, values in postings_data.items()}, codec)
+    terms = list(postings)
+    number_of_postings = len(inverted_index.TF.keys) * repeat
+
+    start_time = time.time()
+    for _ in range(repeat):
+        for term in terms:
+            postings.clear_decoded_postings()
+            postings.term_postings(term)
+    decoding_time = time.time() - start_time
+
+    start_time = time.time()
+    for _ in range(repeat):
+        for term in terms:
+            postings.clear_decoded_postings()
+            for _ in postings.xpath_postings(term):
+                pass
+    scan_time = time.time() - start_time
+
+    return [codec, postings_size(postings_data), encoding_time,
+            number_of_postings / decoding_time, number_of_postings / scan_time]
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Benchmark the postings codecs.')
+    parser.add_argument('collection', type=str, nargs='?', default='../lib/data/practice_05/small.zip',
+                        help='Collection to index')
+    parser.add_argument('-g', '--granularity', type=str, nargs='+', default=['.//article'],
+                        help='Granularity of the index')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='Number of decoding passes')
+    args = parser.parse_args(argv)
+
+    inverted_index = InvertedIndex(args.collection, CustomTextProcessor(), args.granularity)
+    inverted_index.construct_inverted_index()
+
+    print(f'{len(inverted_index.TF)} terms, {len(inverted_index.TF.keys)} postings')
+    table = [benchmark_codec(inverted_index, codec, args.repeat) for codec in POSTINGS_CODECS]
+    print(tabulate(table, headers=['Codec', 'Size (bytes)', 'Encoding (s)', 'Decoding (postings/s)', 'Scan (postings/s)'],
+                   floatfmt='.3f', intfmt=','))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,82 @@
+from manager.text_processor import CustomTextProcessor
+from models.xml_parser.xml_parser import XmlParser
+
+from tabulate import tabulate
+import xml.etree.ElementTree as ET
+import argparse
+import zipfile
+import gzip
+import time
+import sys
+import re
+
+"""
+    Compares the throughput of the fused tokenizer of CustomTextProcessor and of its pre-processing pipeline
+    on the texts of the collections (the text of each XML element, or of each document of a text collection).
+    That they give the same tokens is checked by benchmarks/tokenizer_conformance.py.
+
+    Run from the src folder:
+        python -m benchmarks.tokenizer ../lib/data/practice_05/Test.zip ../lib/data/practice_02/05-Text_Only-Ascii-Coll-101-200-NoSem.gz
+"""
+
+
+def collection_texts(filename: str) -> list:
+    """
+    Returns the texts of a collection: the text of every element of the XML files of a zip,
+    or the text of every document of a text collection (gz or not).
+    """
+    if not filename.endswith('.zip'):
+        with (gzip.open if filename.endswith('.gz') else open)(filename, 'rb') as text_file:
+            return [text for _, text in XmlParser(filename).iter_text_documents(text_file)]
+
+    texts = []
+    with zipfile.ZipFile(filename, 'r') as zip_file:
+        for member in zip_file.namelist():
+            xml_content = zip_file.read(member).decode('utf-8')
+            root = ET.fromstring(re.sub('&[^;]+;', ' ', xml_content))
+            texts.extend(' '.join(element.itertext()) for element in root.iter())
+
+    return texts
+
+
+def throughput(text_processor: CustomTextProcessor, texts: list, repeat: int) -> tuple:
+    """
+    Returns the number of megabytes and tokens processed per second.
+    """
+    start_time = time.time()
+    for _ in range(repeat):
+        number_of_tokens = sum(len(text_processor.pre_processing(text)) for text in texts)
+    elapsed_time = time.time() - start_time
+
+    size = sum(len(text) for text in texts) * repeat / (1024 * 1024)
+    return size / elapsed_time, number_of_tokens * repeat / elapsed_time
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Benchmark the fused tokenizer.')
+    parser.add_argument('collections', type=str, nargs='*', default=['../lib/data/practice_05/Test.zip'],
+                        help='Collections whose texts are tokenized')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='Number of timed passes')
+    args = parser.parse_args(argv)
+
+    pipeline, fused = CustomTextProcessor(), CustomTextProcessor(fused=True)
+
+    table = []
+    for collection in args.collections:
+        texts = collection_texts(collection)
+
+        # The stems are cached by a first pass, the timed passes compare the tokenizers
+        for text in texts:
+            pipeline.pre_processing(text)
+
+        pipeline_throughput = throughput(pipeline, texts, args.repeat)
+        fused_throughput = throughput(fused, texts, args.repeat)
+        table.append([collection.split('/')[-1], len(texts),
+                      *pipeline_throughput, *fused_throughput, fused_throughput[0] / pipeline_throughput[0]])
+
+    print(tabulate(table, headers=['Collection', 'Texts', 'Pipeline (MB/s)', 'Pipeline (tokens/s)',
+                                   'Fused (MB/s)', 'Fused (tokens/s)', 'Speedup'], floatfmt='.2f', intfmt=','))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
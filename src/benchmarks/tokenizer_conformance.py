@@ -0,0 +1,73 @@
+from manager.text_processor import CustomTextProcessor
+from benchmarks.tokenizer import collection_texts
+
+from tabulate import tabulate
+import argparse
+import glob
+import sys
+
+"""
+    Checks that the fused tokenizer of CustomTextProcessor gives the same tokens as its pre-processing
+    pipeline on every text of the practice collections and on the queries. Exits with the status 1 if
+    they differ on any text, the first differing texts are printed.
+
+    Run from the src folder:
+        python -m benchmarks.tokenizer_conformance
+"""
+
+COLLECTIONS = sorted(glob.glob('../lib/data/practice_*/*.zip') + glob.glob('../lib/data/practice_*/*.gz')
+                     + glob.glob('../lib/data/practice_01/collection.xml'))
+QUERY_FILE = '../lib/data/practice_04/topics_M2DSC_7Q.txt'
+
+
+def query_texts(filename: str) -> list:
+    """
+    Returns the texts of the queries of a query file ('id text' per line).
+    """
+    with open(filename, 'r') as file:
+        return [line.split(' ', 1)[1] for line in file.read().splitlines() if ' ' in line]
+
+
+def mismatches(pipeline: CustomTextProcessor, fused: CustomTextProcessor, texts: list) -> list:
+    """
+    Returns the (text, pipeline tokens, fused tokens) of the texts whose tokens differ.
+    """
+    differing = []
+    for text in texts:
+        pipeline_tokens, fused_tokens = pipeline.pre_processing(text), fused.pre_processing(text)
+        if pipeline_tokens != fused_tokens:
+            differing.append((text, pipeline_tokens, fused_tokens))
+
+    return differing
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Check that the fused tokenizer gives the tokens of the pipeline.')
+    parser.add_argument('collections', type=str, nargs='*', default=COLLECTIONS,
+                        help='Collections whose texts are tokenized, defaults to the practice collections')
+    parser.add_argument('-q', '--query-file', type=str, default=QUERY_FILE, help='Queries whose texts are tokenized')
+    parser.add_argument('-s', '--show', type=int, default=3, help='Number of differing texts printed')
+    args = parser.parse_args(argv)
+
+    pipeline, fused = CustomTextProcessor(), CustomTextProcessor(fused=True)
+
+    table = []
+    differing = []
+    for name, texts in [(collection, collection_texts(collection)) for collection in args.collections] + \
+                       [(args.query_file, query_texts(args.query_file))]:
+        collection_differing = mismatches(pipeline, fused, texts)
+        differing.extend(collection_differing)
+        table.append([name.split('/')[-1], len(texts), len(collection_differing)])
+
+    print(tabulate(table, headers=['Collection', 'Texts', 'Mismatches'], intfmt=','))
+    if differing:
+        for text, pipeline_tokens, fused_tokens in differing[:args.show]:
+            print(f'\nText: {text[:200]!r}\nPipeline: {pipeline_tokens[:50]}\nFused: {fused_tokens[:50]}')
+        print(f'\nThe fused tokenizer differs from the pipeline on {len(differing)} texts')
+        sys.exit(1)
+
+    print('The fused tokenizer gives the tokens of the pipeline')
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
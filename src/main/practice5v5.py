@@ -1,4 +1,4 @@
-from manager.run_manager.run_manager import RunManager
+from models.postings_codecs import POSTINGS_CODECS
 
 from colorama import Fore, Style
 import argparse
@@ -24,15 +24,31 @@ def main(argv):
 
     parser.add_argument('--cos-sim', action='store_true', help='Use cosine similarity for evaluation')
     parser.add_argument('--export-weighted-idx', action='store_true', help='Export weighted index to JSON file')
+    parser.add_argument('--lazy-scoring', action='store_true', help='Weight the terms of the queries when they are run instead of the whole index')
     parser.add_argument('--query-file', type=str, help='File containing queries')
 
     parser.add_argument('-g', '--granularity', type=str, nargs='+', help='Granularity of the XPath query')
     parser.add_argument('--baseline', action='store_true', help='Run baseline')
     parser.add_argument('-o', '--bm25_optimization', action='store_true', help='Run BM25 parameter optimization experiment')
+    parser.add_argument('--run-workers', type=int, default=1, help='Number of worker processes running the configurations of the baseline and the grid search')
     parser.add_argument('-p', '--pre-processed', action='store_true', help='Use pre-processed collection to run the experiment')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Number of worker processes used to index the collection')
+    parser.add_argument('--tokenizer-workers', type=int, default=1, help='Number of worker processes pre-processing the texts when the documents are parsed serially')
+    parser.add_argument('--token-cache', type=str, help='Directory of the tokenized-corpus cache, the collections tokenized once are indexed again without parsing them')
+    parser.add_argument('--streaming', action='store_true', help='Stream the XML files instead of building their element trees')
+    parser.add_argument('--codec', type=str, default='raw', choices=POSTINGS_CODECS, help='Codec of the postings of the exported index')
+    parser.add_argument('--segments', type=str, help='Directory of the segments of an incremental index, the new documents are indexed into a new segment')
+    parser.add_argument('--delete', type=str, nargs='+', metavar='DOCNO', help='Docnos to delete from the segments of the incremental index')
+    parser.add_argument('--collection', type=str, help='Collection to index instead of the default one, ex: a zip of new documents')
+    parser.add_argument('--memory-budget', type=int, help='Memory budget of the postings in MB, the index is built in blocks merged on the disk')
+    parser.add_argument('--fused-tokenizer', action='store_true', help='Pre-process the texts with the fused tokenizer (same tokens, faster)')
+    parser.add_argument('--stem-cache', type=str, help='File of the stem cache, it is warmed from the file and saved to it after the run')
     
     args = parser.parse_args(argv)
 
+    # The indexing modules are imported once the arguments are valid, '--help' does not wait for them
+    from manager.run_manager.run_manager import RunManager
+
     start_time = time.time()
     RunManager(args).run()
     end_time = time.time()
@@ -9,8 +9,9 @@ The class provides methods to evaluate AND, OR, and NOT operators.
 
 
 class BooleanQueryParser:
-    def __init__(self, inverted_index) -> None:
+    def __init__(self, inverted_index, deleted_documents: set = None) -> None:
         self.inverted_index = inverted_index
+        self._deleted_documents = deleted_documents
 
         self._text_processor = TextProcessor()
         self._operators = ['and', 'or', 'not', '(', ')']
@@ -19,6 +20,17 @@ class BooleanQueryParser:
         self._or_operator = 'or'
         self._not_operator = 'not'
 
+    @property
+    def deleted_documents(self) -> set:
+        """
+        Returns the ids of the documents skipped when the postings are read: the given ones, or by default
+        the documents deleted from the inverted index (see InvertedIndex.delete_documents).
+        """
+        if self._deleted_documents is not None:
+            return self._deleted_documents
+
+        return getattr(self.inverted_index, 'deleted_documents', set())
+
     def AND(self, left_operand, right_operand) -> set:
         """
         Returns the intersection of two sets.
@@ -37,7 +49,7 @@ class BooleanQueryParser:
         """
         # Flatten the list of document IDs and convert to a set
         all_docs = set(chain.from_iterable(self.inverted_index.values()))
-        return all_docs.difference(operand)
+        return all_docs.difference(operand, self.deleted_documents)
 
     def _shunting_yard(self, query: str) -> list:
         """
@@ -96,7 +108,7 @@ class BooleanQueryParser:
         for token in query:
             if token not in self._operators:
                 if token in self.inverted_index:
-                    stack.append(set(self.inverted_index[token]))
+                    stack.append(set(self.inverted_index[token]).difference(self.deleted_documents))
                 else:
                     stack.append(set())
             else:
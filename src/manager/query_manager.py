@@ -1,5 +1,5 @@
 from colorama import Fore, Style
-from tabulate import tabulate
+import numpy as np
 import math
 
 
@@ -9,7 +9,7 @@ class QueryManager:
         self.weighted_index = collection.weighted_index
         self.text_processor = collection.text_processor
 
-        self.QUERY_FILE = '../lib/data/practice_04/topics_M2DSC_7Q.txt'
+        self.QUERY_FILE = collection.inverted_index.QUERY_FILE
 
     def parse_query_file(self, query_file=None):
         if (query_file is None):
@@ -30,11 +30,19 @@ class QueryManager:
 
     def launch_query(self, query_id, query):
         res = self.RSV(query)
+        res = self.translate_results(res)
         res = self.remove_overlapping_paths(res)
         query_results = self.format_query_results(query_id, res, "BengezzouIdrissMezianeGhilas")
 
         return query_results
 
+    def launch_query_grid(self, query_id, query, weights, grid_size):
+        """
+        Returns the results of a query for a grid of weighting strategies, one list per strategy, see RSV_grid.
+        """
+        return [self.format_query_results(query_id, self.remove_overlapping_paths(self.translate_results(res)), "BengezzouIdrissMezianeGhilas")
+                for res in self.RSV_grid(query, weights, grid_size)]
+
     def process_query(self, query):
         """
         Processes the query.
@@ -47,13 +55,16 @@ class QueryManager:
 
         # Remove duplicates from query_terms
         query_terms = list(set(query_terms))
+        deleted_documents = self.inverted_index.deleted_documents
 
         for term in query_terms:
+            # The weighted index is keyed by term ids
+            term = self.inverted_index.terms.get(term)
             if term in self.weighted_index:
-                for entry in self.weighted_index[term]:
-                    docno = entry['docno']
-                    xpath = entry['XPath']
-                    score = entry['weight']
+                # The scores are summed in float64, see TermWeights.postings
+                for docno, xpath, score in self.weighted_index[term].postings():
+                    if docno in deleted_documents:
+                        continue
 
                     # Accumulate scores only if term occurs in the same document and XPath
                     doc_xpath_key = (docno, xpath)
@@ -64,6 +75,65 @@ class QueryManager:
         sorted_document_scores = sorted(document_scores.items(), key=lambda x: x[1], reverse=True)
         return sorted_document_scores
 
+    def RSV_grid(self, query, weights, grid_size):
+        """
+        Returns the scores of the documents of a query for a grid of weighting strategies at once, one list
+        of sorted scores per strategy. The scores are summed and sorted like RSV, so they are the same.
+
+        Args:
+            query (str): The query.
+            weights (dict): The weights of the terms for the grid {term: (x_paths, docnos, weights)},
+                see WeightingStrategy.weight_terms_grid.
+            grid_size (int): The number of strategies of the grid.
+        """
+        query_terms = self.process_query(query)
+
+        # Remove duplicates from query_terms
+        query_terms = list(set(query_terms))
+        x_paths, docnos, term_weights = [], [], []
+        for term in query_terms:
+            # The weighted index is keyed by term ids
+            term = self.inverted_index.terms.get(term)
+            if term in weights:
+                x_paths.append(weights[term][0])
+                docnos.append(weights[term][1])
+                term_weights.append(weights[term][2])
+
+        if not x_paths:
+            return [[] for _ in range(grid_size)]
+
+        x_paths, docnos, term_weights = np.concatenate(x_paths), np.concatenate(docnos), np.concatenate(term_weights, axis=1)
+        deleted_documents = self.inverted_index.deleted_documents
+        if deleted_documents:
+            kept = ~np.isin(docnos, np.fromiter(deleted_documents, dtype=np.int64))
+            x_paths, docnos, term_weights = x_paths[kept], docnos[kept], term_weights[:, kept]
+
+        # np.add.at accumulates the scores of a (document, XPath) in the order of the terms
+        number_of_x_paths = int(x_paths.max(initial=0)) + 1
+        keys, first_positions, key_ids = np.unique(docnos * number_of_x_paths + x_paths, return_index=True, return_inverse=True)
+        scores = np.zeros((len(keys), grid_size), dtype=np.float64)
+        np.add.at(scores, key_ids, term_weights.T)
+
+        # The (document, XPath) in the order of their first occurrence, sorted by decreasing score with a stable sort
+        order = np.argsort(first_positions, kind='stable')
+        keys, scores = keys[order], scores[order].T
+        doc_x_paths = list(zip((keys // number_of_x_paths).tolist(), (keys % number_of_x_paths).tolist()))
+
+        sorted_document_scores = []
+        for row in scores:
+            ranking = np.argsort(-row, kind='stable')
+            sorted_document_scores.append([(doc_x_paths[rank], score) for rank, score in zip(ranking.tolist(), row[ranking].tolist())])
+
+        return sorted_document_scores
+
+    def translate_results(self, sorted_document_scores):
+        """
+        Translates the docno and XPath ids of the results back to strings.
+        """
+        docnos, xpaths = self.inverted_index.docnos, self.inverted_index.xpaths
+        return [((docnos.key(docno), xpaths.key(xpath)), score)
+                for (docno, xpath), score in sorted_document_scores]
+
     def remove_overlapping_paths(self, sorted_document_scores):
         # Dictionary to store the deepest paths for each document
         deepest_paths = {}
@@ -150,6 +220,7 @@ class QueryManager:
             table.append([docno, xpath, score])
 
         print(Fore.GREEN + f'Query: {query}' + Style.RESET_ALL)
+        from tabulate import tabulate
         print(tabulate(table, headers=headers, tablefmt="fancy_grid"))
         print()
 
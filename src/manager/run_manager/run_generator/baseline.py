@@ -4,13 +4,19 @@ from manager.text_processor import CustomTextProcessorNoStopNoStem
 from manager.text_processor import CustomTextProcessorNoStem
 from manager.text_processor import CustomTextProcessorNoStop
 
+from weighting_strategies.ltn_weighting import LTNWeighting
+from weighting_strategies.ltc_weighting import LTCWeighting
+from weighting_strategies.bm25_weighting import BM25Weighting
+
 from manager.run_manager.utils.utils import evaluate_run
+from manager.run_manager.utils.run_pool import RunPool
 
 
 class Baseline:
     def __init__(self, collection_file, args):
         self.COLLECTION_FILE = collection_file
         self.args = args
+        self.run_pool = RunPool()
         
         if self.args.pre_processed:
             self.collection_name = collection_file.split('/')[-1].split('.')[0]
@@ -28,11 +34,28 @@ class Baseline:
     def run_baseline(self):
         """
         Runs the baseline. The baseline generates 12 runs : 3 (weighting schemes) * 2 (stop-list) * 2 (stemmer)
+        With several run workers, the runs of a text processor are evaluated by the workers (see RunPool) while
+        the collection of the next text processor is indexed.
+        """
+        with RunPool(self.args.run_workers) as self.run_pool:
+            self.run_baseline_with_stop_and_stem()
+            self.run_baseline_with_stop_and_no_stem()
+            self.run_baseline_with_no_stop_and_stem()
+            self.run_baseline_with_no_stop_and_no_stem()
+
+    def submit_runs(self, collection) -> bool:
         """
-        self.run_baseline_with_stop_and_stem()
-        self.run_baseline_with_stop_and_no_stem()
-        self.run_baseline_with_no_stop_and_stem()
-        self.run_baseline_with_no_stop_and_no_stem()
+        Submits the 3 runs of a collection to the run workers, returns False when the runs are evaluated one
+        after the other instead. The workers share the index and the statistics of the collection, the LTC
+        and BM25 weighted indexes and statistics of the collection are not exported.
+        """
+        if not self.run_pool.is_parallel:
+            return False
+
+        for weighting_strategy in [LTNWeighting(), LTCWeighting(), BM25Weighting()]:
+            self.run_pool.evaluate_runs(collection, [weighting_strategy], self.args.granularity, self.args.pre_processed)
+
+        return True
 
     def run_baseline_with_stop_and_stem(self):
         collection = Collection(self.COLLECTION_FILE_STOP_PORTER if self.args.pre_processed else self.COLLECTION_FILE,
@@ -42,8 +65,21 @@ class Baseline:
                                 export_weighted_idx=self.args.export_weighted_idx,
                                 parser_granularity=self.args.granularity,
                                 is_collection_pre_processed=self.args.pre_processed,
+                                lazy_scoring=self.args.lazy_scoring,
+                                n_workers=self.args.workers,
+                                tokenizer_workers=self.args.tokenizer_workers,
+                                token_cache=self.args.token_cache,
+                                streaming_ingestion=self.args.streaming,
+                                postings_codec=self.args.codec,
+                                memory_budget=self.args.memory_budget,
+                                segments=self.args.segments,
+                                deleted_documents=self.args.delete,
+                                query_file=self.args.query_file,
                                 )
 
+        if self.submit_runs(collection):
+            return
+
         evaluate_run(collection, self.args.granularity, self.args.pre_processed)
 
         collection = Collection(self.COLLECTION_FILE_STOP_PORTER if self.args.pre_processed else self.COLLECTION_FILE,
@@ -53,6 +89,10 @@ class Baseline:
                                 export_weighted_idx=self.args.export_weighted_idx,
                                 parser_granularity=self.args.granularity,
                                 is_collection_pre_processed=self.args.pre_processed,
+                                lazy_scoring=self.args.lazy_scoring,
+                                segments=self.args.segments,
+                                deleted_documents=self.args.delete,
+                                query_file=self.args.query_file,
                                 )
         evaluate_run(collection, self.args.granularity, self.args.pre_processed)
 
@@ -63,6 +103,10 @@ class Baseline:
                                 export_weighted_idx=self.args.export_weighted_idx,
                                 parser_granularity=self.args.granularity,
                                 is_collection_pre_processed=self.args.pre_processed,
+                                lazy_scoring=self.args.lazy_scoring,
+                                segments=self.args.segments,
+                                deleted_documents=self.args.delete,
+                                query_file=self.args.query_file,
                                 )
         evaluate_run(collection, self.args.granularity, self.args.pre_processed)
 
@@ -74,8 +118,21 @@ class Baseline:
                                 export_weighted_idx=self.args.export_weighted_idx,
                                 parser_granularity=self.args.granularity,
                                 is_collection_pre_processed=self.args.pre_processed,
+                                lazy_scoring=self.args.lazy_scoring,
+                                n_workers=self.args.workers,
+                                tokenizer_workers=self.args.tokenizer_workers,
+                                token_cache=self.args.token_cache,
+                                streaming_ingestion=self.args.streaming,
+                                postings_codec=self.args.codec,
+                                memory_budget=self.args.memory_budget,
+                                segments=self.args.segments,
+                                deleted_documents=self.args.delete,
+                                query_file=self.args.query_file,
                                 text_processor=CustomTextProcessorNoStem()
                                 )
+        if self.submit_runs(collection):
+            return
+
         evaluate_run(collection, self.args.granularity, self.args.pre_processed)
 
         collection = Collection(self.COLLECTION_FILE_STOP_NO_STEM if self.args.pre_processed else self.COLLECTION_FILE,
@@ -85,6 +142,10 @@ class Baseline:
                                 export_weighted_idx=self.args.export_weighted_idx,
                                 parser_granularity=self.args.granularity,
                                 is_collection_pre_processed=self.args.pre_processed,
+                                lazy_scoring=self.args.lazy_scoring,
+                                segments=self.args.segments,
+                                deleted_documents=self.args.delete,
+                                query_file=self.args.query_file,
                                 text_processor=CustomTextProcessorNoStem()
                                 )
         evaluate_run(collection, self.args.granularity, self.args.pre_processed)
@@ -96,6 +157,10 @@ class Baseline:
                                 export_weighted_idx=self.args.export_weighted_idx,
                                 parser_granularity=self.args.granularity,
                                 is_collection_pre_processed=self.args.pre_processed,
+                                lazy_scoring=self.args.lazy_scoring,
+                                segments=self.args.segments,
+                                deleted_documents=self.args.delete,
+                                query_file=self.args.query_file,
                                 text_processor=CustomTextProcessorNoStem()
                                 )
         evaluate_run(collection, self.args.granularity, self.args.pre_processed)
@@ -108,8 +173,21 @@ class Baseline:
                                 export_weighted_idx=self.args.export_weighted_idx,
                                 parser_granularity=self.args.granularity,
                                 is_collection_pre_processed=self.args.pre_processed,
+                                lazy_scoring=self.args.lazy_scoring,
+                                n_workers=self.args.workers,
+                                tokenizer_workers=self.args.tokenizer_workers,
+                                token_cache=self.args.token_cache,
+                                streaming_ingestion=self.args.streaming,
+                                postings_codec=self.args.codec,
+                                memory_budget=self.args.memory_budget,
+                                segments=self.args.segments,
+                                deleted_documents=self.args.delete,
+                                query_file=self.args.query_file,
                                 text_processor=CustomTextProcessorNoStop()
                                 )
+        if self.submit_runs(collection):
+            return
+
         evaluate_run(collection, self.args.granularity, self.args.pre_processed)
 
         collection = Collection(self.COLLECTION_FILE_NO_STOP_PORTER if self.args.pre_processed else self.COLLECTION_FILE,
@@ -119,6 +197,10 @@ class Baseline:
                                 export_weighted_idx=self.args.export_weighted_idx,
                                 parser_granularity=self.args.granularity,
                                 is_collection_pre_processed=self.args.pre_processed,
+                                lazy_scoring=self.args.lazy_scoring,
+                                segments=self.args.segments,
+                                deleted_documents=self.args.delete,
+                                query_file=self.args.query_file,
                                 text_processor=CustomTextProcessorNoStop()
                                 )
         evaluate_run(collection, self.args.granularity, self.args.pre_processed)
@@ -130,6 +212,10 @@ class Baseline:
                                 export_weighted_idx=self.args.export_weighted_idx,
                                 parser_granularity=self.args.granularity,
                                 is_collection_pre_processed=self.args.pre_processed,
+                                lazy_scoring=self.args.lazy_scoring,
+                                segments=self.args.segments,
+                                deleted_documents=self.args.delete,
+                                query_file=self.args.query_file,
                                 text_processor=CustomTextProcessorNoStop()
                                 )
         evaluate_run(collection, self.args.granularity, self.args.pre_processed)
@@ -142,8 +228,21 @@ class Baseline:
                                 export_weighted_idx=self.args.export_weighted_idx,
                                 parser_granularity=self.args.granularity,
                                 is_collection_pre_processed=self.args.pre_processed,
+                                lazy_scoring=self.args.lazy_scoring,
+                                n_workers=self.args.workers,
+                                tokenizer_workers=self.args.tokenizer_workers,
+                                token_cache=self.args.token_cache,
+                                streaming_ingestion=self.args.streaming,
+                                postings_codec=self.args.codec,
+                                memory_budget=self.args.memory_budget,
+                                segments=self.args.segments,
+                                deleted_documents=self.args.delete,
+                                query_file=self.args.query_file,
                                 text_processor=CustomTextProcessorNoStopNoStem()
                                 )
+        if self.submit_runs(collection):
+            return
+
         evaluate_run(collection, self.args.granularity, self.args.pre_processed)
 
         collection = Collection(self.COLLECTION_FILE_NO_STOP_NO_STEM if self.args.pre_processed else self.COLLECTION_FILE,
@@ -153,6 +252,10 @@ class Baseline:
                                 export_weighted_idx=self.args.export_weighted_idx,
                                 parser_granularity=self.args.granularity,
                                 is_collection_pre_processed=self.args.pre_processed,
+                                lazy_scoring=self.args.lazy_scoring,
+                                segments=self.args.segments,
+                                deleted_documents=self.args.delete,
+                                query_file=self.args.query_file,
                                 text_processor=CustomTextProcessorNoStopNoStem()
                                 )
         evaluate_run(collection, self.args.granularity, self.args.pre_processed)
@@ -164,6 +267,10 @@ class Baseline:
                                 export_weighted_idx=self.args.export_weighted_idx,
                                 parser_granularity=self.args.granularity,
                                 is_collection_pre_processed=self.args.pre_processed,
+                                lazy_scoring=self.args.lazy_scoring,
+                                segments=self.args.segments,
+                                deleted_documents=self.args.delete,
+                                query_file=self.args.query_file,
                                 text_processor=CustomTextProcessorNoStopNoStem()
                                 )
         evaluate_run(collection, self.args.granularity, self.args.pre_processed)
@@ -9,91 +9,84 @@ import itertools
 import numpy as np
 import json
 
-from manager.run_manager.utils.utils import evaluate_run
+from manager.run_manager.utils.run_pool import RunPool
 
 
 class ParametersTuning:
     def __init__(self, collection_file, args):
         self.COLLECTION_FILE = collection_file
         self.args = args
+        self.run_pool = RunPool()
 
     def run_optimization(self):
-        self.bm25_grid_search()
-        self.bm25fw_grid_search()
-        self.bm25fr_grid_search()
-        self.lnu_search()
+        """
+        Runs the grid searches, their runs are evaluated by the worker processes of the run pool (see RunPool).
+        """
+        with RunPool(self.args.run_workers) as self.run_pool:
+            self.bm25_grid_search()
+            self.bm25fw_grid_search()
+            self.bm25fr_grid_search()
+            self.lnu_search()
+
+    def tuning_collection(self, **kwargs):
+        """
+        Returns the collection of a grid search: the index and the statistics are built (and exported) once for
+        the whole grid, the weights are computed by evaluate_runs so the collection is not weighted.
+        """
+        return Collection(self.COLLECTION_FILE,
+                          export_collection=True,
+                          export_statistics=self.args.statistics,
+                          export_weighted_idx=self.args.export_weighted_idx,
+                          is_collection_pre_processed=self.args.pre_processed,
+                          n_workers=self.args.workers,
+                          tokenizer_workers=self.args.tokenizer_workers,
+                          token_cache=self.args.token_cache,
+                          lazy_scoring=True,
+                          streaming_ingestion=self.args.streaming,
+                          postings_codec=self.args.codec,
+                          memory_budget=self.args.memory_budget,
+                          segments=self.args.segments,
+                          deleted_documents=self.args.delete,
+                          query_file=self.args.query_file,
+                          **kwargs
+                          )
 
     def lnu_search(self):
-        import_collection = False
-        export_collection = True
+        collection = self.tuning_collection(lnu_weighting=True)
 
+        strategies = []
         for slope in np.arange(0.1, 1.2, 0.1):
             slope = round(slope, 2)
-            collection = Collection(self.COLLECTION_FILE,
-                                    import_collection=import_collection,
-                                    export_collection=export_collection,
-                                    export_statistics=self.args.statistics,
-                                    lnu_weighting=True,
-                                    export_weighted_idx=self.args.export_weighted_idx,
-                                    is_collection_pre_processed=self.args.pre_processed,
-                                    )
-            import_collection = True
-            export_collection = False
-
-            collection.weighting_strategy = LNUWeighting(slope=slope)
-            collection.weighted_index = collection.weighting_strategy.calculate_weight(collection)
-
-            evaluate_run(collection, self.args.granularity, self.args.pre_processed)
+            strategies.append(LNUWeighting(slope=slope))
+
+        self.run_pool.evaluate_runs(collection, strategies, self.args.granularity, self.args.pre_processed)
 
     def bm25_grid_search(self):
         """
-        Runs the baseline. The baseline generates 12 runs : 3 (weighting schemes) * 2 (stop-list) * 2 (stemmer)
+        Runs the BM25 grid search over k1 and b, the runs of all the pairs are computed at once.
         """
-        import_collection = False
-        export_collection = True
+        collection = self.tuning_collection(bm25_weighting=True)
 
+        strategies = []
         for k1 in np.arange(1, 1.6, 0.1):
             k1 = round(k1, 2)
             for b in np.arange(0.5, 0.80, 0.05):
                 b = round(b, 2)
-                
-                collection = Collection(self.COLLECTION_FILE,
-                                        import_collection=import_collection,
-                                        export_collection=export_collection,
-                                        export_statistics=self.args.statistics,
-                                        bm25_weighting=True,
-                                        export_weighted_idx=self.args.export_weighted_idx,
-                                        is_collection_pre_processed=self.args.pre_processed,
-                                        )
-                import_collection = True
-                export_collection = False
-
-                collection.weighting_strategy = BM25Weighting(k1=k1, b=b)
-                collection.weighted_index = collection.weighting_strategy.calculate_weight(collection)
-
-                evaluate_run(collection, self.args.granularity, self.args.pre_processed)
+                strategies.append(BM25Weighting(k1=k1, b=b))
 
+        self.run_pool.evaluate_runs(collection, strategies, self.args.granularity, self.args.pre_processed)
 
-    def bm25fw_grid_search(self):
+    def combinations(self):
         """
-        We want to find the best values for alpha, beta and gamma.
-        BM25F variant: optimizing bi for each field [Zaragoza04]:
-        - Optimizing k1 and bi for each field (K optimizations 2 Dim).
-        - With these b(i) and alpha(i) = 1: optimizing k1 (1 optimization 1 Dim).
-        - With these b(i) and k1 : optimizing alpha(i) (1 optimization (K-1) Dim).
-        alpha(i) refers to the different fields (title, abstract, body), so alpha, beta and gamma values
+        Returns the combinations of alpha, beta and gamma of the BM25F grid searches.
         """
-        # Loop for optimizing k1 with fixed b(i) and alpha(i) = 1
-        import_collection = False
-        export_collection = True
-
         # Loop for optimizing alpha(i) with fixed b=0.75 and k1=1.2
         alphas = np.arange(1, 2, 0.5)
         betas = np.arange(1, 2, 0.5)
         gammas = np.arange(1, 2, 0.5)
 
-        combinations = itertools.product(alphas, betas, gammas)
-        for alpha, beta, gamma in combinations:
+        combinations = []
+        for alpha, beta, gamma in itertools.product(alphas, betas, gammas):
             alpha = round(alpha, 2)
             beta = round(beta, 2)
             gamma = round(gamma, 2)
@@ -101,23 +94,24 @@ class ParametersTuning:
             if (alpha == beta == gamma) and (alpha != 1):
                 continue
 
-            collection = Collection(self.COLLECTION_FILE,
-                                    import_collection=import_collection,
-                                    export_collection=export_collection,
-                                    export_statistics=self.args.statistics,
-                                    bm25fw_weighting=True,
-                                    export_weighted_idx=self.args.export_weighted_idx,
-                                    is_collection_pre_processed=self.args.pre_processed,
-                                    parser_granularity=[".//bdy", ".//title", ".//categories"],
-                                    )
+            combinations.append((alpha, beta, gamma))
 
-            import_collection = True
-            export_collection = False
+        return combinations
 
-            collection.weighting_strategy = BM25FwWeighting(k1=1.2, b=0.75, alpha=alpha, beta=beta, gamma=gamma)
-            collection.weighted_index = collection.weighting_strategy.calculate_weight(collection)
+    def bm25fw_grid_search(self):
+        """
+        We want to find the best values for alpha, beta and gamma.
+        BM25F variant: optimizing bi for each field [Zaragoza04]:
+        - Optimizing k1 and bi for each field (K optimizations 2 Dim).
+        - With these b(i) and alpha(i) = 1: optimizing k1 (1 optimization 1 Dim).
+        - With these b(i) and k1 : optimizing alpha(i) (1 optimization (K-1) Dim).
+        alpha(i) refers to the different fields (title, abstract, body), so alpha, beta and gamma values
+        """
+        collection = self.tuning_collection(bm25fw_weighting=True, parser_granularity=[".//bdy", ".//title", ".//categories"])
 
-            evaluate_run(collection, self.args.granularity, self.args.pre_processed)
+        strategies = [BM25FwWeighting(k1=1.2, b=0.75, alpha=alpha, beta=beta, gamma=gamma)
+                      for alpha, beta, gamma in self.combinations()]
+        self.run_pool.evaluate_runs(collection, strategies, self.args.granularity, self.args.pre_processed)
 
     def bm25fr_grid_search(self):
         """
@@ -128,38 +122,8 @@ class ParametersTuning:
         - With these b(i) and k1 : optimizing alpha(i) (1 optimization (K-1) Dim).
         alpha(i) refers to the different fields (title, abstract, body), so alpha, beta and gamma values
         """
-        # Loop for optimizing k1 with fixed b(i) and alpha(i) = 1
-        import_collection = False
-        export_collection = True
+        collection = self.tuning_collection(bm25fr_weighting=True, parser_granularity=[".//bdy", ".//title", ".//categories"])
 
-        # Loop for optimizing alpha(i) with fixed b=0.75 and k1=1.2
-        alphas = np.arange(1, 2, 0.5)
-        betas = np.arange(1, 2, 0.5)
-        gammas = np.arange(1, 2, 0.5)
-
-        combinations = itertools.product(alphas, betas, gammas)
-        for alpha, beta, gamma in combinations:
-            alpha = round(alpha, 2)
-            beta = round(beta, 2)
-            gamma = round(gamma, 2)
-            
-            if (alpha == beta == gamma) and (alpha != 1):
-                continue
-
-            collection = Collection(self.COLLECTION_FILE,
-                                    import_collection=import_collection,
-                                    export_collection=export_collection,
-                                    export_statistics=self.args.statistics,
-                                    bm25fr_weighting=True,
-                                    export_weighted_idx=self.args.export_weighted_idx,
-                                    is_collection_pre_processed=self.args.pre_processed,
-                                    parser_granularity=[".//bdy", ".//title", ".//categories"],
-                                    )
-
-            import_collection = True
-            export_collection = False
-
-            collection.weighting_strategy = BM25FrWeighting(k1=1.2, b=0.75, alpha=alpha, beta=beta, gamma=gamma)
-            collection.weighted_index = collection.weighting_strategy.calculate_weight(collection)
-            
-            evaluate_run(collection, self.args.granularity, self.args.pre_processed)
+        strategies = [BM25FrWeighting(k1=1.2, b=0.75, alpha=alpha, beta=beta, gamma=gamma)
+                      for alpha, beta, gamma in self.combinations()]
+        self.run_pool.evaluate_runs(collection, strategies, self.args.granularity, self.args.pre_processed)
@@ -7,11 +7,13 @@ from manager.text_processor import CustomTextProcessorNoStop
 from manager.text_processor import ReferenceTextProcessor
 from manager.text_processor import ReferenceRearrangedTextProcessor
 from manager.text_processor import CustomTextProcessor
+from manager.stem_cache import PORTER_STEM_CACHE
 
 from manager.run_manager.run_generator.baseline import Baseline
 from manager.run_manager.run_generator.grid_search import ParametersTuning
 import manager.run_manager.utils.utils as utils
 
+from colorama import Fore, Style
 import os
 
 class RunManager:
@@ -24,13 +26,19 @@ class RunManager:
         if self.args.pre_processed:
             # XML-Coll-withSem_stop670_porter
             self.COLLECTION_FILE = '../lib/processed_data/XML-Coll-withSem_stop670_porter.zip'
-            self.text_processor = CustomTextProcessor()
+            self.text_processor = CustomTextProcessor(fused=self.args.fused_tokenizer)
         else:
             # XML-Coll-withSem
             self.COLLECTION_FILE = '../lib/data/practice_05/XML-Coll-withSem.zip'
-            self.text_processor = CustomTextProcessor()
+            self.text_processor = CustomTextProcessor(fused=self.args.fused_tokenizer)
+
+        if self.args.collection:
+            self.COLLECTION_FILE = self.args.collection
 
     def run(self):        
+        if self.args.stem_cache:
+            PORTER_STEM_CACHE.load(self.args.stem_cache)
+
         if self.args.baseline:
             Baseline(self.COLLECTION_FILE, self.args).run_baseline()
         elif self.args.bm25_optimization:
@@ -38,6 +46,11 @@ class RunManager:
         else:
             self.run_custom()
 
+        print(Fore.YELLOW + f"> Stem cache: {PORTER_STEM_CACHE.hits} hits, {PORTER_STEM_CACHE.misses} misses "
+              f"({PORTER_STEM_CACHE.hit_ratio():.1%}), {PORTER_STEM_CACHE.evictions} evictions" + Style.RESET_ALL)
+        if self.args.stem_cache:
+            PORTER_STEM_CACHE.save(self.args.stem_cache)
+
     def run_custom(self):
         collection = Collection(self.COLLECTION_FILE,
                                 import_collection=self.args.import_inverted_index,
@@ -51,6 +64,16 @@ class RunManager:
                                 bm25fr_weighting=self.args.bm25fr,
                                 export_weighted_idx=self.args.export_weighted_idx,
                                 is_collection_pre_processed=self.args.pre_processed,
+                                n_workers=self.args.workers,
+                                tokenizer_workers=self.args.tokenizer_workers,
+                                token_cache=self.args.token_cache,
+                                lazy_scoring=self.args.lazy_scoring,
+                                streaming_ingestion=self.args.streaming,
+                                postings_codec=self.args.codec,
+                                memory_budget=self.args.memory_budget,
+                                segments=self.args.segments,
+                                deleted_documents=self.args.delete,
+                                query_file=self.args.query_file,
                                 parser_granularity=(
                                     [".//bdy", ".//title", ".//categories"] if (self.args.bm25fw or self.args.bm25fr) else self.args.granularity),
                                 text_processor=self.text_processor
@@ -0,0 +1,145 @@
+from models.collection import Collection
+
+from manager.run_manager.utils.utils import RUN_OUTPUT_FOLDER
+from manager.run_manager.utils.utils import evaluate_runs, _reserve_run_ids, _release_run_ids
+
+import multiprocessing
+import tempfile
+import shutil
+import math
+import os
+
+"""
+    This class runs the configurations of the baseline and of the grid search in worker processes.
+    The index and the statistics of a collection are written once to a snapshot, binary index files (see
+    index_file.py) that the workers import memory-mapped: the workers share one read-only copy of them through
+    the page cache instead of each building its own. The run ids are reserved by the dispatching process in the
+    order of the submissions, so the runs are named as if they were evaluated one after the other.
+    With one worker (or a segmented index, which has no single index file) the runs are evaluated here.
+"""
+
+
+def _evaluate_runs_task(snapshot: dict, weighting_strategies: list, granularity: list, is_collection_preprocessed: bool,
+                        run_ids: list) -> None:
+    """
+    Evaluates runs in a worker process, over the collection imported from a snapshot, see RunPool.snapshot.
+    """
+    collection = Collection(snapshot['filename'],
+                            import_collection=True,
+                            index_file=snapshot['index_file'],
+                            statistics_file=snapshot['statistics_file'],
+                            parser_granularity=snapshot['parser_granularity'],
+                            text_processor=snapshot['text_processor'],
+                            is_collection_pre_processed=snapshot['is_preprocessed'],
+                            query_file=snapshot['query_file'],
+                            lazy_scoring=True,
+                            )
+    # The weights are computed for the whole chunk by evaluate_runs, the collection is not weighted
+    collection.set_weighting_strategy(weighting_strategies[0])
+    evaluate_runs(collection, weighting_strategies, granularity, is_collection_preprocessed, run_ids)
+
+
+class RunPool:
+    def __init__(self, n_workers: int = 1) -> None:
+        """
+        Initializes the RunPool class, to use with a with statement: the runs are written when it exits.
+
+        Args:
+            n_workers (int, optional): The number of worker processes evaluating the runs. Defaults to 1.
+        """
+        self.n_workers = n_workers
+        self.pool = None
+        self.pending = []               # The (result, run ids) of the submitted runs
+        self.directory = None           # The directory of the snapshots
+        self.snapshots = 0              # The number of snapshots written
+        self.collection = None          # The collection of the last snapshot
+        self.snapshot_configuration = None
+
+    @property
+    def is_parallel(self) -> bool:
+        return self.n_workers > 1
+
+    def evaluate_runs(self, collection, weighting_strategies: list, granularity: list, is_collection_preprocessed: bool) -> None:
+        """
+        Evaluates the runs of weighting strategies of the same scheme (see utils.evaluate_runs), the strategies
+        are split between the workers.
+        """
+        if not self.is_parallel or collection.inverted_index.segments_directory is not None:
+            evaluate_runs(collection, weighting_strategies, granularity, is_collection_preprocessed)
+            return
+
+        snapshot = self.snapshot(collection)
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(self.n_workers)
+
+        run_ids = _reserve_run_ids(len(weighting_strategies), RUN_OUTPUT_FOLDER)
+        chunk_size = math.ceil(len(weighting_strategies) / self.n_workers)
+        for start in range(0, len(weighting_strategies), chunk_size):
+            chunk_ids = run_ids[start:start + chunk_size]
+            result = self.pool.apply_async(_evaluate_runs_task, (snapshot, weighting_strategies[start:start + chunk_size],
+                                                                 granularity, is_collection_preprocessed, chunk_ids))
+            self.pending.append((result, chunk_ids))
+
+    def snapshot(self, collection) -> dict:
+        """
+        Writes the index and the statistics of a collection to the snapshot directory (once per collection),
+        returns the configuration importing them.
+        """
+        if collection is self.collection:
+            return self.snapshot_configuration
+
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp(prefix='runs_')
+
+        inverted_index = collection.inverted_index
+        index_file = os.path.join(self.directory, f'{collection.label}_{self.snapshots}.idx')
+        statistics_file = os.path.join(self.directory, f'{collection.label}_{self.snapshots}.stats')
+        self.snapshots += 1
+        inverted_index.export_inverted_index(index_file, 'raw')
+        collection.statistics.write_statistics_file(statistics_file)
+
+        self.collection = collection
+        self.snapshot_configuration = {
+            'filename': collection.filename,
+            'index_file': index_file,
+            'statistics_file': statistics_file,
+            'parser_granularity': inverted_index.parser_granularity,
+            'text_processor': collection.text_processor,
+            'is_preprocessed': inverted_index.is_preprocessed,
+            'query_file': inverted_index.QUERY_FILE,
+        }
+        return self.snapshot_configuration
+
+    def wait(self) -> None:
+        """
+        Waits for the submitted runs, the errors of the workers are raised here.
+        """
+        while self.pending:
+            result, run_ids = self.pending.pop(0)
+            try:
+                result.get()
+            finally:
+                _release_run_ids(run_ids, RUN_OUTPUT_FOLDER)
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+        for _, run_ids in self.pending:
+            _release_run_ids(run_ids, RUN_OUTPUT_FOLDER)
+        self.pending = []
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
+        self.collection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        try:
+            if exc_type is None:
+                self.wait()
+        finally:
+            self.close()
@@ -1,7 +1,9 @@
 import os
+import re
 from manager.query_manager import QueryManager
 
 RUN_OUTPUT_FOLDER = "../docs/resources/runs/"
+RUN_FILE_ID = re.compile(r'^[^_.]+_(\d+)_')  # The run id of a run file name, see _construct_run_name
 if not os.path.exists(RUN_OUTPUT_FOLDER):
     os.makedirs(RUN_OUTPUT_FOLDER)
 
@@ -28,28 +30,117 @@ def _write_results(query_results, run_file_path):
 
 
 def _get_run_id(folder_path=RUN_OUTPUT_FOLDER):
-    files = [f for f in os.listdir(folder_path) if os.path.isfile(os.path.join(folder_path, f))]
+    # The hidden files are the claims of the run ids, see _reserve_run_ids
+    files = [f for f in os.listdir(folder_path) if os.path.isfile(os.path.join(folder_path, f)) and not f.startswith('.')]
     return len(files) + 1
 
 
-def evaluate_run(collection, granularity, is_collection_preprocessed):
+def _used_run_ids(folder_path=RUN_OUTPUT_FOLDER):
+    used = set()
+    for f in os.listdir(folder_path):
+        match = RUN_FILE_ID.match(f)
+        if match:
+            used.add(int(match.group(1)))
+
+    return used
+
+
+def _run_id_claim(run_id, folder_path=RUN_OUTPUT_FOLDER):
+    return os.path.join(folder_path, f'.{run_id}.lock')
+
+
+def _reserve_run_ids(count, folder_path=RUN_OUTPUT_FOLDER):
     """
-    Runs the baseline. The baseline generates 12 runs : 3 (weighting schemes) * 2 (stop-list) * 2 (stemmer)
+    Reserves the ids of count runs, safe under concurrency: an id is claimed by creating its claim file
+    exclusively, so the runs written at the same time by several processes get distinct ids. The ids follow
+    _get_run_id, the ids of the existing runs and the ids claimed by the other processes are skipped.
+    The claims are removed by _release_run_ids once the runs are written.
     """
-    run_id = _get_run_id(RUN_OUTPUT_FOLDER)
-    scheme = collection.weighting_strategy.get_weighting_scheme_name()
-    parameters = collection.weighting_strategy.get_weighting_scheme_parameters()
-    
+    run_ids = []
+    run_id = _get_run_id(folder_path)
+    while len(run_ids) < count:
+        try:
+            os.close(os.open(_run_id_claim(run_id, folder_path), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            run_id += 1
+            continue
+
+        # The run of the id may have been written (and its claim removed) by another process in the meantime
+        if run_id in _used_run_ids(folder_path):
+            os.remove(_run_id_claim(run_id, folder_path))
+        else:
+            run_ids.append(run_id)
+        run_id += 1
+
+    return run_ids
+
+
+def _release_run_ids(run_ids, folder_path=RUN_OUTPUT_FOLDER):
+    for run_id in run_ids:
+        try:
+            os.remove(_run_id_claim(run_id, folder_path))
+        except FileNotFoundError:
+            pass
+
+
+def _run_text_processor(collection, is_collection_preprocessed):
     text_processor = collection.text_processor.get_text_processor_name() + "_fly"
     
     if is_collection_preprocessed:
         text_processor = "_".join(collection.label.split("_")[1:])
 
-    run_file_path = _construct_run_name(run_id, scheme, granularity=granularity, text_processor=text_processor, parameters=parameters)
+    return text_processor
+
+
+def evaluate_run(collection, granularity, is_collection_preprocessed):
+    """
+    Runs the baseline. The baseline generates 12 runs : 3 (weighting schemes) * 2 (stop-list) * 2 (stemmer)
+    """
+    run_ids = _reserve_run_ids(1, RUN_OUTPUT_FOLDER)
+    try:
+        scheme = collection.weighting_strategy.get_weighting_scheme_name()
+        parameters = collection.weighting_strategy.get_weighting_scheme_parameters()
+        text_processor = _run_text_processor(collection, is_collection_preprocessed)
+
+        run_file_path = _construct_run_name(run_ids[0], scheme, granularity=granularity, text_processor=text_processor, parameters=parameters)
+        query_manager = QueryManager(collection)
+
+        parsed_queries = query_manager.parse_query_file()
+
+        for query_id, query in parsed_queries:
+            query_results = query_manager.launch_query(query_id, query)
+            _write_results(query_results, run_file_path)
+    finally:
+        _release_run_ids(run_ids, RUN_OUTPUT_FOLDER)
+
+
+def evaluate_runs(collection, weighting_strategies, granularity, is_collection_preprocessed, run_ids=None):
+    """
+    Runs the queries for a grid of weighting strategies of the same scheme, one run per strategy.
+    The index and the statistics of the collection are loaded once, the weights of the terms of the queries
+    are computed for the whole grid at once (see WeightingStrategy.weight_terms_grid), then all the runs are written.
+    The run ids are reserved here unless they are given, ex: reserved by the process dispatching the runs (see RunPool).
+    """
+    if run_ids is None:
+        reserved_ids = _reserve_run_ids(len(weighting_strategies), RUN_OUTPUT_FOLDER)
+        try:
+            return evaluate_runs(collection, weighting_strategies, granularity, is_collection_preprocessed, reserved_ids)
+        finally:
+            _release_run_ids(reserved_ids, RUN_OUTPUT_FOLDER)
+
+    scheme = weighting_strategies[0].get_weighting_scheme_name()
+    text_processor = _run_text_processor(collection, is_collection_preprocessed)
+
+    run_file_paths = [_construct_run_name(run_id, scheme, granularity=granularity, text_processor=text_processor,
+                                          parameters=weighting_strategy.get_weighting_scheme_parameters())
+                      for run_id, weighting_strategy in zip(run_ids, weighting_strategies)]
     query_manager = QueryManager(collection)
 
     parsed_queries = query_manager.parse_query_file()
+    terms = {collection.inverted_index.terms.get(term) for _, query in parsed_queries for term in query_manager.process_query(query)}
+    weights = weighting_strategies[0].weight_terms_grid(collection, terms, weighting_strategies)
 
     for query_id, query in parsed_queries:
-        query_results = query_manager.launch_query(query_id, query)
-        _write_results(query_results, run_file_path)
+        grid_results = query_manager.launch_query_grid(query_id, query, weights, len(weighting_strategies))
+        for run_file_path, query_results in zip(run_file_paths, grid_results):
+            _write_results(query_results, run_file_path)
@@ -0,0 +1,137 @@
+from collections import OrderedDict
+
+import json
+import os
+
+"""
+This class memoizes the stems of a stemmer.
+A collection has far less distinct tokens than token occurrences, the stem of a token is computed
+once and then read from the cache. The cache is bounded: when it is full, the least recently used
+stem ('lru') or the oldest stem ('fifo') is evicted. It can be saved to a file and warmed from it
+in the next runs.
+"""
+STEM_CACHE_SIZE = 500000
+EVICTION_POLICIES = ('lru', 'fifo')
+
+
+def porter_stemmer():
+    from nltk.stem import PorterStemmer
+    return PorterStemmer()
+
+
+class LazyStemmer:
+    def __init__(self, stemmer_factory) -> None:
+        """
+        Initializes the LazyStemmer class: the stemmer is created when it stems its first token,
+        so its library is only imported when a stem is missing from the cache.
+
+        Args:
+            stemmer_factory: The function returning the stemmer, ex: porter_stemmer.
+        """
+        self.stemmer_factory = stemmer_factory
+        self.stemmer = None
+
+    def stem(self, token: str) -> str:
+        if self.stemmer is None:
+            self.stemmer = self.stemmer_factory()
+
+        return self.stemmer.stem(token)
+
+
+class StemCache:
+    def __init__(self, stemmer, max_size: int = STEM_CACHE_SIZE, eviction: str = 'lru') -> None:
+        """
+        Initializes the StemCache class.
+
+        Args:
+            stemmer: The stemmer, with a stem(token) method.
+            max_size (int, optional): The maximum number of cached stems, None for no bound. Defaults to STEM_CACHE_SIZE.
+            eviction (str, optional): The eviction policy, see EVICTION_POLICIES. Defaults to 'lru'.
+
+        Raises:
+            ValueError: If the eviction policy is unknown.
+        """
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy '{eviction}', expected one of {EVICTION_POLICIES}")
+
+        self.stemmer = stemmer
+        self.max_size = max_size
+        self.eviction = eviction
+        self.stems = OrderedDict()  # The stem of each token, from the oldest (or least recently used) one
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stem(self, token: str) -> str:
+        """
+        Returns the stem of a token.
+        """
+        return self.stem_tokens([token])[0]
+
+    def stem_tokens(self, tokens: list) -> list:
+        """
+        Returns the stems of tokens, the missing stems are computed and cached.
+        """
+        stems = self.stems
+        is_lru = self.eviction == 'lru'
+
+        result = []
+        misses = 0
+        for token in tokens:
+            stem = stems.get(token)
+            if stem is None:
+                misses += 1
+                stem = self.stemmer.stem(token)
+                self._add(token, stem)
+            elif is_lru:
+                stems.move_to_end(token)
+            result.append(stem)
+
+        self.misses += misses
+        self.hits += len(result) - misses
+        return result
+
+    def _add(self, token: str, stem: str) -> None:
+        self.stems[token] = stem
+        if self.max_size is not None and len(self.stems) > self.max_size:
+            self.stems.popitem(last=False)
+            self.evictions += 1
+
+    def hit_ratio(self) -> float:
+        """
+        Returns the ratio of the tokens whose stem was cached.
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0
+
+    def reset_counters(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def save(self, filename: str) -> None:
+        """
+        Saves the cached stems to a JSON file, from the oldest (or least recently used) one.
+        """
+        with open(filename + '.tmp', 'w') as file:
+            json.dump(list(self.stems.items()), file)
+        os.replace(filename + '.tmp', filename)
+
+    def load(self, filename: str) -> None:
+        """
+        Warms the cache with the stems saved to a JSON file, nothing is loaded if the file does not exist.
+        """
+        if not os.path.exists(filename):
+            return
+
+        with open(filename, 'r') as file:
+            for token, stem in json.load(file):
+                self._add(token, stem)
+
+    def __len__(self) -> int:
+        return len(self.stems)
+
+
+# The cache shared by the text processors using the Porter stemmer
+PORTER_STEM_CACHE = StemCache(LazyStemmer(porter_stemmer))
@@ -1,28 +1,50 @@
-from nltk.corpus import stopwords
-from nltk.stem import PorterStemmer, SnowballStemmer
+from manager.stem_cache import PORTER_STEM_CACHE
 
-from nltk.tokenize import word_tokenize
-from spacy.lang.en import English
-from spacy.lang.en.stop_words import STOP_WORDS
-
-from colorama import Fore
-
-import time
+import multiprocessing.pool
+import hashlib
 import re
-import tabulate
 
 """
 This class is responsible for processing the text.
 The class provides methods to tokenize, normalize, stem, and remove stop words.
+nltk is imported when a text is first tokenized (or a token first stemmed), not with this module.
 """
 STOP_WORDS_FILE = '../lib/data/practice_04/stop-words-english4.txt'
 LOW_FREQ_WORDS_FILE = '../lib/processed_data/words_to_remove.txt'
 
+BATCH_CHUNK_SIZE = 64     # Number of texts sent at once to a worker of a text processing pool
+
+# The fused tokenizer (see CustomTextProcessor.fused_pre_processing) removes the punctuation and the numbers,
+# then the single characters and the unicode characters, in two passes instead of four
+DELETED_CHARACTERS = re.compile(r'[^\w\s]|\d')
+DELETED_WORDS = re.compile(r'\b\w\b|[^\x00-\x7F]+')
+# The contractions split by word_tokenize in a text of letters
+CONTRACTIONS = {
+    'cannot': ['can', 'not'],
+    'gimme': ['gim', 'me'],
+    'gonna': ['gon', 'na'],
+    'gotta': ['got', 'ta'],
+    'lemme': ['lem', 'me'],
+    'wanna': ['wan', 'na'],
+}
+
+
+def words_hash(words) -> str:
+    """
+    Returns the SHA-256 of a set of words, None if there is no set.
+    """
+    if words is None:
+        return None
+
+    return hashlib.sha256('\n'.join(sorted(words)).encode('utf-8')).hexdigest()
+
+
 class TextProcessor:
     def tokenize(self, text: str) -> list:
         """
         Tokenizes the text.
         """
+        from nltk.tokenize import word_tokenize
         return word_tokenize(text)
 
     def normalize(self, tokens: list) -> list:
@@ -101,6 +123,51 @@ class TextProcessor:
 
         return tokens
 
+    def pre_processing_batch(self, texts, pool: multiprocessing.pool.Pool = None, chunk_size: int = BATCH_CHUNK_SIZE) -> list:
+        """
+        Performs pre-processing on several texts.
+        With a pool (see processing_pool), the texts are sent to its workers by chunks.
+
+        Args:
+            texts: The iterable of the texts.
+            pool (multiprocessing.pool.Pool, optional): The text processing pool. Defaults to None, the texts are processed here.
+            chunk_size (int, optional): The number of texts sent at once to a worker. Defaults to BATCH_CHUNK_SIZE.
+
+        Returns:
+            list: The tokens of each text, in the order of the texts.
+        """
+        if pool is None:
+            return [self.pre_processing(text) for text in texts]
+
+        texts = list(texts)
+        chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+        return [tokens for chunk_tokens in pool.imap(_pre_process_chunk, chunks) for tokens in chunk_tokens]
+
+    def processing_pool(self, n_workers: int) -> multiprocessing.pool.Pool:
+        """
+        Returns a pool of worker processes for pre_processing_batch.
+        The text processor (its stemmer, stop words...) is sent once to each worker, not with the texts.
+
+        Args:
+            n_workers (int): The number of worker processes.
+
+        Returns:
+            multiprocessing.pool.Pool: The pool, to close once the texts are processed (ex: with a with statement).
+        """
+        return multiprocessing.Pool(n_workers, initializer=_init_text_processing_worker, initargs=(self,))
+
+    def fingerprint(self) -> dict:
+        """
+        Returns the fingerprint of the text processor: its class and the hashes of its stop words and
+        low frequency words. The text processors with the same fingerprint give the same tokens,
+        ex: with or without the fused tokenizer.
+        """
+        return {
+            'class': type(self).__name__,
+            'stop_words': words_hash(getattr(self, 'stop_words', None)),
+            'words_to_remove': words_hash(getattr(self, 'words_to_remove', None)),
+        }
+
     def load_stopwords_from_file(self, file_path: str):
         with open(file_path, 'r') as file:
             stopwords = set(word.strip() for word in file)
@@ -113,7 +180,7 @@ class TextProcessor:
 
 class ReferenceRearrangedTextProcessor(TextProcessor):
     def __init__(self) -> None:
-        self.stemmer = PorterStemmer()
+        self.stem_cache = PORTER_STEM_CACHE
         self.stop_words = self.load_stopwords_from_file(STOP_WORDS_FILE)
         
     def pre_processing(self, text: str) -> list:
@@ -136,9 +203,9 @@ class ReferenceRearrangedTextProcessor(TextProcessor):
     
     def stem(self, tokens: list) -> list:
         """
-        Stems the tokens using PorterStemmer.
+        Stems the tokens using PorterStemmer, the stems are cached (see StemCache).
         """
-        return [self.stemmer.stem(token) for token in tokens]
+        return self.stem_cache.stem_tokens(tokens)
 
     def get_text_processor_name(self):
         """
@@ -149,7 +216,7 @@ class ReferenceRearrangedTextProcessor(TextProcessor):
 
 class ReferenceTextProcessor(TextProcessor):
     def __init__(self) -> None:
-        self.stemmer = PorterStemmer()
+        self.stem_cache = PORTER_STEM_CACHE
         self.stop_words = self.load_stopwords_from_file(STOP_WORDS_FILE)
         
     def pre_processing(self, text: str) -> list:
@@ -202,9 +269,9 @@ class ReferenceTextProcessor(TextProcessor):
 
     def stem(self, tokens: list) -> list:
         """
-        Stems the tokens using PorterStemmer.
+        Stems the tokens using PorterStemmer, the stems are cached (see StemCache).
         """
-        return [self.stemmer.stem(token) for token in tokens]
+        return self.stem_cache.stem_tokens(tokens)
 
     def get_text_processor_name(self):
         """
@@ -214,16 +281,52 @@ class ReferenceTextProcessor(TextProcessor):
 
 
 class CustomTextProcessor(TextProcessor):
-    def __init__(self) -> None:
-        self.stemmer = PorterStemmer()
+    def __init__(self, fused: bool = False) -> None:
+        """
+        Initializes the CustomTextProcessor class.
+
+        Args:
+            fused (bool, optional): Flag indicating whether to use the fused tokenizer, see fused_pre_processing. Defaults to False.
+        """
+        self.stem_cache = PORTER_STEM_CACHE
         self.stop_words = self.load_stopwords_from_file(STOP_WORDS_FILE)
         self.words_to_remove = self.load_low_freq_words_from_file(LOW_FREQ_WORDS_FILE)
+        self.fused = fused
+
+    def pre_processing(self, text: str) -> list:
+        """
+        Performs pre-processing on the text.
+        """
+        if self.fused:
+            return self.fused_pre_processing(text)
+
+        return super().pre_processing(text)
+
+    def fused_pre_processing(self, text: str) -> list:
+        """
+        Performs the pre-processing in a single scan of the tokens, with the same tokens as pre_processing.
+        Once the punctuation, the numbers, the single characters and the unicode characters are removed,
+        the text only has ASCII letters, underscores and spaces: word_tokenize splits it on the spaces and the contractions.
+        """
+        text = DELETED_WORDS.sub('', DELETED_CHARACTERS.sub('', text)).lower()
+
+        stop_words = self.stop_words
+        tokens = []
+        for token in text.split():
+            if token in CONTRACTIONS:
+                tokens.extend(part for part in CONTRACTIONS[token] if part not in stop_words)
+            elif token not in stop_words:
+                tokens.append(token)
+
+        words_to_remove = self.words_to_remove
+        return [token for token in self.stem(tokens)
+                if 2 < len(token) < 30 and token.isalpha() and token not in words_to_remove]
 
     def stem(self, tokens: list) -> list:
         """
-        Stems the tokens using PorterStemmer.
+        Stems the tokens using PorterStemmer, the stems are cached (see StemCache).
         """
-        return [self.stemmer.stem(token) for token in tokens]
+        return self.stem_cache.stem_tokens(tokens)
 
     def remove_outliers(self, tokens: list) -> list:
         """
@@ -286,7 +389,7 @@ class CustomTextProcessorNoStem(TextProcessor):
 
 class CustomTextProcessorNoStop(TextProcessor):
     def __init__(self) -> None:
-        self.stemmer = PorterStemmer()
+        self.stem_cache = PORTER_STEM_CACHE
 
     def pre_processing(self, text: str) -> list:
         """
@@ -319,9 +422,9 @@ class CustomTextProcessorNoStop(TextProcessor):
 
     def stem(self, tokens: list) -> list:
         """
-        Stems the tokens using PorterStemmer.
+        Stems the tokens using PorterStemmer, the stems are cached (see StemCache).
         """
-        return [self.stemmer.stem(token) for token in tokens]
+        return self.stem_cache.stem_tokens(tokens)
 
     def get_text_processor_name(self):
         """
@@ -332,7 +435,6 @@ class CustomTextProcessorNoStop(TextProcessor):
 
 class CustomTextProcessorNoStopNoStem(TextProcessor):
     def __init__(self) -> None:
-        self.stemmer = PorterStemmer()
         self.stop_words = self.load_stopwords_from_file(STOP_WORDS_FILE)
 
 
@@ -370,3 +472,33 @@ class CustomTextProcessorNoStopNoStem(TextProcessor):
         Returns the name of the text processor.
         """
         return "nostop_nostem"
+
+
+_default_text_processor = None
+
+
+def default_text_processor() -> CustomTextProcessor:
+    """
+    Returns the text processor shared by the collections created without one, it is created on first use.
+    """
+    global _default_text_processor
+    if _default_text_processor is None:
+        _default_text_processor = CustomTextProcessor()
+
+    return _default_text_processor
+
+
+# The text processor of each worker process of a text processing pool, set once by the pool initializer
+_worker_text_processor = None
+
+
+def _init_text_processing_worker(text_processor: TextProcessor) -> None:
+    global _worker_text_processor
+    _worker_text_processor = text_processor
+
+
+def _pre_process_chunk(texts: list) -> list:
+    """
+    Pre-processes a chunk of texts in a worker process.
+    """
+    return [_worker_text_processor.pre_processing(text) for text in texts]
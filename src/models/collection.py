@@ -1,5 +1,5 @@
 from manager.text_processor import TextProcessor
-from manager.text_processor import CustomTextProcessor
+from manager.text_processor import default_text_processor
 
 from weighting_strategies.ltn_weighting import LTNWeighting
 from weighting_strategies.ltc_weighting import LTCWeighting
@@ -11,8 +11,10 @@ from weighting_strategies.weighting_strategy import WeightingStrategy
 
 from models.statistics import Statistics
 from models.inverted_index import InvertedIndex
+from models.lazy_weighted_index import LazyWeightedIndex
 
 import json
+import os
 import re
 
 from colorama import Fore, Style
@@ -38,110 +40,171 @@ class Collection:
                  bm25fr_weighting: bool = False,
                  export_weighted_idx: bool = False,
                  parser_granularity: list = ['.//article'],
-                 text_processor: TextProcessor = CustomTextProcessor(),
-                 is_collection_pre_processed: bool = False
+                 text_processor: TextProcessor = None,
+                 is_collection_pre_processed: bool = False,
+                 n_workers: int = 1,
+                 streaming_ingestion: bool = False,
+                 postings_codec: str = 'raw',
+                 memory_budget: int = None,
+                 segments: str = None,
+                 deleted_documents: list = None,
+                 query_file: str = None,
+                 forward_index: bool = False,
+                 tokenizer_workers: int = 1,
+                 token_cache: str = None,
+                 lazy_scoring: bool = False,
+                 index_file: str = None,
+                 statistics_file: str = None
                  ):
 
         if parser_granularity is None:
             parser_granularity = ['.//article']
+        if text_processor is None:
+            text_processor = default_text_processor()
 
         self.text_processor = text_processor
         self.filename = filename
+        self.lazy_scoring = lazy_scoring
 
-        self.inverted_index = InvertedIndex(self.filename, self.text_processor, parser_granularity, is_preprocessed=is_collection_pre_processed,  is_bm25fr=bm25fr_weighting)
+        self.inverted_index = InvertedIndex(self.filename, self.text_processor, parser_granularity, is_preprocessed=is_collection_pre_processed,  is_bm25fr=bm25fr_weighting,
+                                            n_workers=n_workers, is_streaming=streaming_ingestion, memory_budget=memory_budget,
+                                            query_file=query_file, forward_index=forward_index, tokenizer_workers=tokenizer_workers,
+                                            token_cache=token_cache)
         self.label = filename.split('/')[-1].split('.')[0]
+        granularity_str = '_'.join(parser_granularity).replace('.//', '')
+        # The index file imported or exported, ex: a snapshot shared by the workers of a grid search
+        self.index_filename = index_file if index_file is not None else f'../res/{self.label}_{granularity_str}.idx'
 
         # A dictionary with the term as key and a dictionary of document numbers and term frequencies as value
         # ex: {'term': {'doc1': 2, 'doc2': 1}}
         self.collection_frequencies = {}
-        if (import_collection):
-            granularity_str = '_'.join(parser_granularity).replace('.//', '')
-            print(Fore.GREEN + f'Importing collection : {self.label}_{granularity_str}' + Style.RESET_ALL)
-            self.inverted_index.import_inverted_index(f'../res/{self.label}_{granularity_str}.json')
+        if segments is not None:
+            # Incremental index: the new documents are indexed into a new segment of the directory,
+            # the segments of each text processor and granularity are kept apart
+            segments = os.path.join(segments, f'{type(text_processor).__name__}_{granularity_str}' + ('_bm25fr' if bm25fr_weighting else ''))
+            if deleted_documents and os.path.isdir(segments):
+                self.inverted_index.delete_documents(deleted_documents, segments)
+            if import_collection:
+                print(Fore.GREEN + f'Importing segments : {segments}' + Style.RESET_ALL)
+                self.inverted_index.import_segments(segments)
+            else:
+                print(Fore.GREEN + f'Indexing new documents of {self.label} into : {segments}' + Style.RESET_ALL)
+                self.inverted_index.add_segment(segments, postings_codec)
+        elif (import_collection):
+            print(Fore.GREEN + f'Importing collection : {self.index_filename}' + Style.RESET_ALL)
+            self.inverted_index.import_inverted_index(self.index_filename)
+        elif memory_budget is not None:
+            # The index is built in blocks merged into the index file, which is then imported
+            print(Fore.GREEN + f'Indexing collection : {self.label}' + Style.RESET_ALL)
+            self.inverted_index.construct_inverted_index_external(self.index_filename, postings_codec)
         else:
             print(Fore.GREEN + f'Indexing collection : {self.label}' + Style.RESET_ALL)
             self.inverted_index.construct_inverted_index()
             if export_collection:
                 print(Fore.GREEN + f'Exporting collection... : {self.label}' + Style.RESET_ALL)
-                granularity_str = '_'.join(parser_granularity).replace('.//', '')
-                self.inverted_index.export_inverted_index(f'../res/{self.label}_{granularity_str}.json')
+                self.inverted_index.export_inverted_index(self.index_filename, postings_codec)
 
         print(Fore.GREEN + f'Calculating Statistics... :' + Style.RESET_ALL)
-        self.collection_size = len(self.inverted_index.parsed_documents)
-        self.statistics = Statistics(self.inverted_index, export_statistics)
+        self.collection_size = len(self.inverted_index.docnos)
+        self.statistics = Statistics(self.inverted_index, export_statistics, statistics_file)
 
+        self.weighting_strategy = None
         if (ltn_weighting):
             self.print_title("LTN weighting")
-            self.weighting_strategy = LTNWeighting()
-            self.weighted_index = self.weighting_strategy.calculate_weight(self)
+            self.set_weighting_strategy(LTNWeighting())
         elif (ltc_weighting):
             self.print_title("LTC weighting")
-            self.weighting_strategy = LTCWeighting()
-            self.weighted_index = self.weighting_strategy.calculate_weight(self)
+            self.set_weighting_strategy(LTCWeighting())
         elif (lnu_weighting):
             self.print_title("LNU weighting")
-            self.weighting_strategy = LNUWeighting()
-            self.weighted_index = self.weighting_strategy.calculate_weight(self)
+            self.set_weighting_strategy(LNUWeighting())
         elif (bm25_weighting):
             self.print_title("BM25 weighting")
-            self.weighting_strategy = BM25Weighting()
-            self.weighted_index = self.weighting_strategy.calculate_weight(self)
+            self.set_weighting_strategy(BM25Weighting())
         elif (bm25fw_weighting):
             self.print_title("BM25Fw weighting")
-            self.weighting_strategy = BM25FwWeighting()
-            self.weighted_index = self.weighting_strategy.calculate_weight(self)
+            self.set_weighting_strategy(BM25FwWeighting())
         elif (bm25fr_weighting):
             self.print_title("BM25Fr weighting")
-            self.weighting_strategy = BM25FrWeighting()
-            self.weighted_index = self.weighting_strategy.calculate_weight(self)
+            self.set_weighting_strategy(BM25FrWeighting())
         if (export_weighted_idx):
-            WeightingStrategy().export_weighted_index(self.weighted_index, f'../res/{self.label}_weighted.json')
+            WeightingStrategy().export_weighted_index(self.weighted_index, f'../res/{self.label}_weighted.json',
+                                                      self.inverted_index)
+
+    def set_weighting_strategy(self, weighting_strategy: WeightingStrategy) -> None:
+        """
+        Weights the inverted index with a weighting strategy. With the query-time scoring, only the terms
+        of the queries are weighted when they are run, see LazyWeightedIndex.
+        """
+        self.weighting_strategy = weighting_strategy
+        if self.lazy_scoring:
+            self.weighted_index = LazyWeightedIndex(self, weighting_strategy)
+        else:
+            self.weighted_index = weighting_strategy.calculate_weight(self)
+
+    def delete_documents(self, docnos: list) -> None:
+        """
+        Deletes documents from the segments of the collection (see InvertedIndex.delete_documents).
+        The segments are imported again, so the statistics and the weights no longer count the deleted documents.
+
+        Args:
+            docnos (list): The docnos to delete.
 
-    def document_frequency(self, term: str, tag_cibled: str) -> int:
+        Raises:
+            ValueError: If the collection was not indexed into segments.
         """
-        Returns the document frequency of a term.
-        The document frequency is the sum of the frequencies of the term in all documents.
-        # ! We compute the df based on the xpath and not on the entire document
-        # - TO COMPUTE THE df based on the xpath use this formula:
-        # - df = len(self.inverted_index.IDX.get(term, {}).get(xpath, {}))
+        directory = self.inverted_index.segments_directory
+        if directory is None:
+            raise ValueError(f"The collection {self.label} has no segments, use the --segments option")
+
+        self.inverted_index.delete_documents(docnos, directory)
+        self.inverted_index.import_segments(directory)
+        self.collection_size = len(self.inverted_index.docnos)
+        self.statistics = Statistics(self.inverted_index)
+        if self.weighting_strategy is not None:
+            self.set_weighting_strategy(self.weighting_strategy)
+
+    def document_frequency(self, term: int, tag_cibled: str) -> int:
         """
-        return self.inverted_index.DF.get(term, {}).get(tag_cibled, 0)
+        Returns the document frequency of a term id: the number of documents having the term
+        in an element of the tag. It is counted while indexing and read in O(1).
+        """
+        return self.inverted_index.DF.frequency(term, tag_cibled)
     
-    def term_frequency(self, docno: str, term: str, x_path: str) -> int:
+    def term_frequency(self, docno: int, term: int, x_path: int) -> int:
         """
-        Returns the term frequency of a term in a document at a specific XPath.
+        Returns the term frequency of a term in a document at a specific XPath, given their ids.
         """
-        if term in self.inverted_index.TF and x_path in self.inverted_index.TF[term]:
-            doc_freqs = self.inverted_index.TF[term][x_path]
-            return doc_freqs.get(docno, 0)
-        else:
-            return 0
+        return self.inverted_index.TF.frequency(term, x_path, docno)
 
-    def document_length(self, docno: str, granularity: str) -> int:
+    def document_length(self, docno: int, granularity: str) -> int:
         """
-        Returns the length of a document.
+        Returns the length of a document id.
         The length of a document is the sum of the frequencies of all terms in the document
         based on the granularity.
         """
-        return self.statistics.document_lengths[docno][granularity]
+        return self.statistics.document_length(docno, granularity)
+
+    def xpath_tag(self, x_path: int) -> str:
+        """
+        Returns the tag of an XPath id, ex: 'p' for '/article[1]/bdy[1]/p[2]'.
+        """
+        return self.inverted_index.xpath_tags[x_path]
 
     def transform_index(self):
         """
         We transform the index to only contain the article node.
         """
         transformed_index = {}
-        new_granularity = '/article[1]'
+        new_granularity = self.inverted_index.add_xpath('/article[1]')
 
         transformed_index = {}
         for term, postings in self.inverted_index.IDX.items():
             transformed_index[term] = {}
-            for _, docno_list in postings.items():
-                if new_granularity not in transformed_index[term]:
-                    transformed_index[term][new_granularity] = []
-
-                for docno in docno_list:
-                    if docno not in transformed_index[term][new_granularity]:
-                        transformed_index[term][new_granularity].append(docno)
+            if postings:
+                # The documents of the term once, in the order of their first occurrence
+                transformed_index[term][new_granularity] = list(dict.fromkeys(
+                    docno for docno_list in postings.values() for docno in docno_list))
 
         self.inverted_index.IDX = transformed_index
 
@@ -161,10 +224,11 @@ class Collection:
         Displays the inverted index with a title indicating the document name.
         """
         self.print_title(f"\nInverted Index of '{self.filename}\n'")
-        for term, docnos in self.inverted_index.IDX.items():
+        for term, postings in self.inverted_index.IDX.items():
             docno_list = ', '.join(
-                [f'{Fore.GREEN}{docno}{Style.RESET_ALL}' for docno in docnos])
-            print(f"{term}: {docno_list}")
+                [f'{Fore.GREEN}{self.inverted_index.docnos.key(docno)}{Style.RESET_ALL}'
+                 for docno_list in postings.values() for docno in docno_list])
+            print(f"{self.inverted_index.terms.key(term)}: {docno_list}")
         print()
 
     def display_term_frequencies(self) -> None:
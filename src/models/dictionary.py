@@ -0,0 +1,72 @@
+"""
+This class maps the strings of the index (terms, docnos, XPaths) to dense integer ids.
+The inverted index, the term frequencies and the statistics are keyed by these ids,
+the strings are only stored once here and translated back when the results are written.
+"""
+
+
+class Dictionary:
+    def __init__(self, keys: list = None) -> None:
+        """
+        Initializes the Dictionary class.
+
+        Args:
+            keys (list, optional): The keys of the dictionary, ordered by id. Defaults to None.
+        """
+        self.keys = []  # The keys ordered by id, ex: ['olive', 'oil']
+        self.ids = {}   # The id of each key, ex: {'olive': 0, 'oil': 1}
+
+        for key in keys or []:
+            self.add(key)
+
+    def add(self, key: str) -> int:
+        """
+        Returns the id of a key, the key is added to the dictionary if it is unknown.
+
+        Args:
+            key (str): The key to add.
+
+        Returns:
+            int: The id of the key.
+        """
+        key_id = self.ids.get(key)
+        if key_id is None:
+            key_id = len(self.keys)
+            self.ids[key] = key_id
+            self.keys.append(key)
+
+        return key_id
+
+    def get(self, key: str, default=None):
+        """
+        Returns the id of a key without adding it.
+
+        Args:
+            key (str): The key to look up.
+            default (optional): The value returned when the key is unknown. Defaults to None.
+
+        Returns:
+            int: The id of the key or the default value.
+        """
+        return self.ids.get(key, default)
+
+    def key(self, key_id: int) -> str:
+        """
+        Returns the key of an id.
+
+        Args:
+            key_id (int): The id to translate.
+
+        Returns:
+            str: The key of the id.
+        """
+        return self.keys[key_id]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.ids
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __iter__(self):
+        return iter(self.keys)
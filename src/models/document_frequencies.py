@@ -0,0 +1,172 @@
+from array import array
+import re
+
+import numpy as np
+
+from models.dictionary import Dictionary
+from models.postings import DOC_BITS, DOC_MASK
+
+"""
+    This class stores the document frequency of each (term, tag): the number of documents having the term
+    in an element of the tag. The document frequencies are counted while the postings are appended, the
+    tag of an element is given by its id (see xpath_tag), then they are read in O(1) by term id.
+    An index file stores one array of document frequencies per tag, they are read without copying them.
+"""
+
+
+def xpath_tag(xpath: str) -> str:
+    """
+    Returns the tag of an XPath, ex: 'p' for '/article[1]/bdy[1]/p[2]'.
+    """
+    return re.sub(r'\[\d+\]', '', xpath).split("/")[-1]
+
+
+def postings_document_frequencies(terms: np.ndarray, keys: np.ndarray, xpath_tags: list, number_of_tags: int,
+                                  vocabulary_size: int) -> np.ndarray:
+    """
+    Returns the document frequencies of postings.
+
+    Args:
+        terms (np.ndarray): The term id of each posting.
+        keys (np.ndarray): The key (XPath id, doc id) of each posting, see Postings.
+        xpath_tags (list): The tag id of each XPath id.
+        number_of_tags (int): The number of tag ids.
+        vocabulary_size (int): The number of term ids.
+
+    Returns:
+        np.ndarray: The document frequency of each (tag id, term id).
+    """
+    if not len(terms):
+        return np.zeros((number_of_tags, vocabulary_size), dtype=np.int64)
+
+    keys = np.asarray(keys, dtype=np.uint64)
+    tags = np.asarray(xpath_tags, dtype=np.int64)[(keys >> np.uint64(DOC_BITS)).astype(np.int64)]
+    docs = (keys & np.uint64(DOC_MASK)).astype(np.int64)
+
+    # The distinct (tag, term, document) of the postings
+    cells = tags * vocabulary_size + np.asarray(terms, dtype=np.int64)
+    number_of_documents = int(docs.max()) + 1
+    cells = np.unique(cells * number_of_documents + docs) // number_of_documents
+
+    return np.bincount(cells, minlength=number_of_tags * vocabulary_size).reshape(number_of_tags, vocabulary_size)
+
+
+class DocumentFrequencies:
+    def __init__(self, tags: Dictionary = None) -> None:
+        """
+        Initializes the DocumentFrequencies class.
+
+        Args:
+            tags (Dictionary, optional): The tag ids, shared with the parser. Defaults to a new dictionary.
+        """
+        self.tags = tags if tags is not None else Dictionary()
+        self.counts = []    # The document frequency of each term id, per tag id
+
+        self.current_docno = None
+        self.current_terms = {}     # {tag_id: {term_id}} of the current document
+
+    def tag_counts(self, tag: int, vocabulary_size: int) -> array:
+        """
+        Returns the document frequencies of a tag id, extended to the vocabulary size.
+        """
+        while len(self.counts) <= tag:
+            self.counts.append(array('I'))
+
+        counts = self.counts[tag]
+        if len(counts) < vocabulary_size:
+            counts.frombytes(bytes(counts.itemsize * (vocabulary_size - len(counts))))
+
+        return counts
+
+    def add(self, terms, docno: int, tag: int, vocabulary_size: int) -> None:
+        """
+        Counts the terms of an element. The documents are indexed one after the other, a term is
+        counted once per document and tag.
+
+        Args:
+            terms: The distinct term ids of the element, a set or the keys of a dict.
+            docno (int): The document id.
+            tag (int): The tag id of the element.
+            vocabulary_size (int): The number of term ids.
+        """
+        if docno != self.current_docno:
+            self.current_docno = docno
+            self.current_terms = {}
+
+        document_terms = self.current_terms.setdefault(tag, set())
+        new_terms = terms - document_terms
+        if not new_terms:
+            return
+
+        document_terms.update(new_terms)
+        counts = self.tag_counts(tag, vocabulary_size)
+        for term in new_terms:
+            counts[term] += 1
+
+    def frequency(self, term: int, tag: str) -> int:
+        """
+        Returns the document frequency of a term id in the elements of a tag.
+        """
+        tag = self.tags.get(tag)
+        if tag is None or tag >= len(self.counts) or term is None:
+            return 0
+
+        counts = self.counts[tag]
+        return counts[term] if term < len(counts) else 0
+
+    def by_tag(self) -> dict:
+        """
+        Returns the document frequencies by tag, ex: {'p': array('I', [2, 1])}.
+        """
+        return {self.tags.key(tag): counts for tag, counts in enumerate(self.counts)}
+
+    def merge(self, document_frequencies: dict, term_map, vocabulary_size: int) -> None:
+        """
+        Adds the document frequencies of documents indexed apart, ex: by a worker or in a segment.
+
+        Args:
+            document_frequencies (dict): The document frequencies by tag, see by_tag.
+            term_map: The term id of each term id of the document frequencies.
+            vocabulary_size (int): The number of term ids.
+        """
+        term_map = np.asarray(term_map, dtype=np.int64)
+        for tag, counts in document_frequencies.items():
+            counts = np.asarray(counts, dtype=np.int64)
+            tag = self.tags.add(tag)
+
+            merged_counts = np.frombuffer(self.tag_counts(tag, vocabulary_size), dtype=np.uint32).astype(np.int64)
+            merged_counts[term_map[:len(counts)]] += counts
+            self.counts[tag] = array('I', merged_counts.astype(np.uint32).tobytes())
+
+    def import_counts(self, document_frequencies: dict) -> None:
+        """
+        Sets the document frequencies of an imported index, the arrays are not copied.
+        """
+        for tag, counts in document_frequencies.items():
+            tag = self.tags.add(tag)
+            self.tag_counts(tag, 0)
+            self.counts[tag] = counts
+
+    def sections(self, vocabulary_size: int) -> dict:
+        """
+        Returns the sections of the document frequencies of an index file: the tags and the
+        document frequencies of each tag, one after the other.
+        """
+        counts = np.zeros((len(self.counts), vocabulary_size), dtype=np.uint32)
+        for tag, tag_counts in enumerate(self.counts):
+            tag_counts = np.asarray(tag_counts, dtype=np.uint32)[:vocabulary_size]
+            counts[tag, :len(tag_counts)] = tag_counts
+
+        return {
+            'df_tags': self.tags.keys[:len(self.counts)],
+            'df_counts': counts,
+        }
+
+
+def read_document_frequencies(index_file, vocabulary_size: int) -> dict:
+    """
+    Returns the document frequencies by tag of an index file, memoryviews of the file.
+    """
+    tags = index_file.strings('df_tags')
+    counts = index_file.array('df_counts', 'I')
+    return {tag: counts[i * vocabulary_size:(i + 1) * vocabulary_size] for i, tag in enumerate(tags)}
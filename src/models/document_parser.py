@@ -1,76 +1,413 @@
-from collections import defaultdict
+from collections import defaultdict, Counter
 import xml.etree.ElementTree as ET
+import multiprocessing
 import zipfile
+import gzip
 import time
 import io
 import re
 
 from models.xml_parser.xml_parser import XmlParser
-from tqdm import tqdm
+from models.dictionary import Dictionary
+from models.postings import Postings
+from models.lazy_inverted_index import LazyInvertedIndex
+from models.document_frequencies import DocumentFrequencies, xpath_tag
+from models.document_table import DocumentTable
+from models.forward_index import ForwardIndex
+from models.spimi import write_block
+from models.token_cache import TokenStream, token_cache_key, token_cache_file, read_token_stream, write_token_stream
+import numpy as np
+
+# Granularities handled by the streaming ingestion: a plain descendant tag, ex: './/p'
+SIMPLE_GRANULARITY = re.compile(r'\.//[^/\[\]()@*]+')
 
 
 class DocumentParser (XmlParser):
     def parse_query_vocabulary(self):
+        # The terms unknown to the collection have no postings
         with open(self.QUERY_FILE, 'r') as file:
             for line in file.readlines():
                 query = self.text_processor.pre_processing(line)
-                self.query_vocabulary.update(query)
+                self.query_vocabulary.update(term for term in map(self.terms.get, query) if term is not None)
 
-    def parse_documents(self) -> None:
+    def add_xpath(self, xpath: str) -> int:
+        """
+        Returns the id of an XPath and registers the tag (and its id) of the new XPaths.
+        """
+        xpath_id = self.xpaths.add(xpath)
+        if xpath_id == len(self.xpath_tags):
+            self.xpath_tags.append(xpath_tag(xpath))
+            self.xpath_tag_ids.append(self.tags.add(self.xpath_tags[-1]))
+
+        return xpath_id
+
+    def reset_processing_times(self) -> None:
         self.parsed_documents_time_processing = 0
         self.inverted_index_time_processing = 0
         self.extract_text_time_processing = 0
         self.xml_to_json_time_processing = 0
         self.xpath_time_processing = 0
         self.clean_time_processing = 0
+        self.merge_time_processing = 0
         self.tf_time_processing = 0
+        self.df_time_processing = 0
+        self.token_cache_time_processing = 0
 
-        self.parse_query_vocabulary()
+    def parse_documents(self) -> None:
+        self.reset_processing_times()
+        self.documents = DocumentTable()
+        if self.forward_index is not None:
+            self.forward_index = ForwardIndex()
+
+        cache_key = cached_tokens = None
+        if self.token_cache is not None:
+            start_time = time.time()
+            cache_key = token_cache_key(self.filename, self.text_processor.fingerprint(), self.parser_granularity,
+                                        self.is_bm25fr, self.is_preprocessed, self.excluded_members)
+            cached_tokens = read_token_stream(token_cache_file(self.token_cache, cache_key), cache_key)
+            self.token_cache_time_processing += time.time() - start_time
+
+        # The elements are recorded while the collection is parsed when they are not cached yet
+        self.token_stream = TokenStream() if cache_key is not None and cached_tokens is None else None
+
+        if cached_tokens is not None:
+            self.index_token_stream(cached_tokens)
+        elif self.filename.endswith('.zip') and self.n_workers > 1:
+            self.parse_documents_in_parallel()
+        elif self.tokenizer_workers > 1 and not self.is_preprocessed:
+            # The documents are parsed here and their elements are pre-processed by a pool, see index_element
+            with self.text_processor.processing_pool(self.tokenizer_workers) as pool:
+                self.tokenizer_pool = pool
+                try:
+                    self.parse_collection()
+                    self.flush_pending_elements()
+                finally:
+                    self.tokenizer_pool = None
+                    self.pending_elements = []
+        else:
+            self.parse_collection()
+
+        if self.token_stream is not None:
+            start_time = time.time()
+            write_token_stream(token_cache_file(self.token_cache, cache_key), cache_key, self.token_stream,
+                               self.terms.keys, self.docnos.keys, self.xpaths.keys)
+            self.token_stream = None
+            self.token_cache_time_processing += time.time() - start_time
+
+        self.inverted_index_time_processing -= self.tf_time_processing + self.df_time_processing
+
+        if self.memory_budget is not None:
+            # The postings are merged from the blocks by InvertedIndex.construct_inverted_index_external
+            self.flush_postings_block()
+            return
+
+        start_time = time.time()
+        self.term_frequencies.finalize()
+        self.tf_time_processing += time.time() - start_time
+
+        self.build_inverted_index()
+
+    def parse_collection(self) -> None:
+        """
+        Parses the documents of the collection one after the other.
+        """
+        from tqdm import tqdm
         if self.filename.endswith('.zip'):
             with zipfile.ZipFile(self.filename, 'r') as zip_file:
-                xml_file_name = zip_file.namelist()
+                xml_file_name = self.collection_members()
                 for file in tqdm(xml_file_name, desc="Processing files"):
                     with zip_file.open(file) as xml_file:
-                        self.parse_xml_to_json(file, xml_file)
-                        
-        elif self.filename.endswith('.xml'):
+                        self.parse_xml_file(file, xml_file)
+                    self.flush_postings_block_if_full()
+
+        elif self.filename.endswith('.xml') and self.collection_members():
             with open(self.filename, 'rb') as xml_file:
-                self.parse_xml_to_json(self.filename, xml_file)
+                self.parse_xml_file(self.filename, xml_file)
+
+        elif self.filename.endswith('.gz') and self.collection_members():
+            # The text collections are decompressed and split into documents while they are read
+            with gzip.open(self.filename, 'rb') as text_file:
+                for docno, text in tqdm(self.iter_text_documents(text_file), desc="Processing documents"):
+                    self.parse_text_document(docno, text)
+                    self.flush_postings_block_if_full()
+
+    def index_token_stream(self, index_file) -> None:
+        """
+        Indexes the elements of a cached tokenized corpus (see models/token_cache.py), in their order.
+        Its terms, docnos and XPaths are added first in the order of their ids, so they get the same ids
+        as when the collection is parsed.
+        """
+        start_time = time.time()
+        terms = np.array([self.terms.add(term) for term in index_file.strings('terms')], dtype=np.uint32)
+        docnos = [self.docnos.add(docno) for docno in index_file.strings('docnos')]
+        xpaths = [self.add_xpath(xpath) for xpath in index_file.strings('xpaths')]
+        tokens = terms[np.frombuffer(index_file.raw('tokens'), dtype=np.uint32)]
+        elements = np.frombuffer(index_file.raw('elements'), dtype=np.uint32).reshape(-1, 3).tolist()
+        self.token_cache_time_processing += time.time() - start_time
+
+        from tqdm import tqdm
+        offset = 0
+        current_docno = None
+        for docno, xpath, length in tqdm(elements, desc="Indexing cached elements"):
+            if docno != current_docno:
+                self.flush_postings_block_if_full()
+                current_docno = docno
+
+            self.index_term_ids(docnos[docno], xpaths[xpath], tokens[offset:offset + length].tolist())
+            offset += length
+
+    def collection_members(self) -> list:
+        """
+        Returns the members of the collection to parse: the XML files of the zip, or the XML file
+        (or the text collection) itself, except the excluded members (already indexed in a segment).
+        """
+        if self.filename.endswith('.zip'):
+            with zipfile.ZipFile(self.filename, 'r') as zip_file:
+                members = zip_file.namelist()
+        else:
+            members = [self.filename.split('/')[-1]]
+
+        return [member for member in members if member not in self.excluded_members]
+
+    def flush_postings_block_if_full(self) -> None:
+        if self.memory_budget is not None and self.term_frequencies.buffered_bytes() >= self.memory_budget * 1024 * 1024:
+            self.flush_postings_block()
+
+    def flush_postings_block(self) -> None:
+        """
+        Sorts the buffered postings and writes them to a block of the blocks directory (SPIMI).
+        """
+        start_time = time.time()
+        number_of_postings = len(self.term_frequencies.buffer_terms)
+        if number_of_postings:
+            sorted_postings = self.term_frequencies.sorted_buffers(self.flushed_postings)
+            self.blocks.append(write_block(self.blocks_directory, *sorted_postings))
+            self.flushed_postings += number_of_postings
+            self.term_frequencies.clear_buffers()
+
+        self.tf_time_processing += time.time() - start_time
+
+    def build_inverted_index(self) -> None:
+        """
+        Builds the inverted index of the full vocabulary over the finalized term frequencies postings.
+        The postings of a term are loaded when it is accessed, the query vocabulary is loaded right away.
+        """
+        start_time = time.time()
+        self.query_vocabulary = set()
+        self.parse_query_vocabulary()
+        self.inverted_index = LazyInvertedIndex(self.term_frequencies)
+        self.inverted_index.load(self.query_vocabulary)
+
+        self.inverted_index_time_processing += time.time() - start_time
+
+    def parse_documents_in_parallel(self) -> None:
+        """
+        Parses the zip members with a pool of worker processes.
+        The members are split into contiguous shards, each worker builds a partial index of its shards
+        and the partial indexes are merged back in the members order, so the result is identical
+        to a serial build. The docnos of the members of different shards must be distinct, see merge_partial_index.
+        """
+        from tqdm import tqdm
+        xml_file_name = self.collection_members()
+
+        shard_size = max(1, len(xml_file_name) // (self.n_workers * self.SHARDS_PER_WORKER))
+        shards = [xml_file_name[i:i + shard_size] for i in range(0, len(xml_file_name), shard_size)]
+
+        worker_configuration = (type(self), self.filename, self.text_processor, self.parser_granularity,
+                                self.is_bm25fr, self.is_preprocessed, self.is_streaming, self.forward_index is not None,
+                                self.token_stream is not None, self.terms.keys)
+
+        with multiprocessing.Pool(self.n_workers, initializer=_init_worker, initargs=worker_configuration) as pool:
+            with tqdm(total=len(xml_file_name), desc="Processing files") as progress_bar:
+                for shard, partial_index in zip(shards, pool.imap(_parse_shard, shards)):
+                    self.merge_partial_index(partial_index)
+                    self.flush_postings_block_if_full()
+                    progress_bar.update(len(shard))
+
+    def export_partial_index(self) -> dict:
+        """
+        Returns the partial index built by a worker, with plain dicts so it can be pickled.
+        The ids of the partial index are local to the worker, the keys of its dictionaries are
+        exported to translate them when merging.
+        """
+        return {
+            "terms": self.terms.keys,
+            "docnos": self.docnos.keys,
+            "xpaths": self.xpaths.keys,
+            "term_frequencies": self.term_frequencies.buffers(),
+            "document_frequencies": self.document_frequencies.by_tag(),
+            "documents": self.documents.table(),
+            "forward_index": self.forward_index.documents if self.forward_index is not None else None,
+            "token_stream": self.token_stream,
+            "processing_times": {
+                name: value for name, value in vars(self).items() if name.endswith('_time_processing')
+            },
+        }
+
+    def merge_partial_index(self, partial_index: dict) -> None:
+        """
+        Merges a partial index built by a worker into the index.
+        The shards are merged in the members order, so the ids are given in the same order as
+        in a serial build. The document frequencies and the document-length table of the shards are
+        appended, so a document must be held by a single shard.
+
+        Raises:
+            ValueError: If a document of the partial index is already in the index, ex: the same docno
+                in two zip members parsed by different workers.
+        """
+        start = time.time()
+        duplicates = [docno for docno in partial_index["docnos"] if docno in self.docnos]
+        if duplicates:
+            raise ValueError(f"The documents {duplicates[:10]} are in several shards of '{self.filename}', "
+                             "their document frequencies would be counted twice: index the collection with one worker")
+
+        terms = [self.terms.add(term) for term in partial_index["terms"]]
+        docnos = [self.docnos.add(docno) for docno in partial_index["docnos"]]
+        xpaths = [self.add_xpath(xpath) for xpath in partial_index["xpaths"]]
 
-        self.inverted_index_time_processing -= self.tf_time_processing
-    
-    def parse_article(self, tree, docno, parent_map):
+        # The postings are appended in the members order, the inverted index is built from them at the end
+        partial_terms, partial_docnos, partial_xpaths, partial_tfs = (
+            np.frombuffer(buffer, dtype=np.uint32) for buffer in partial_index["term_frequencies"])
+        self.term_frequencies.extend(np.array(terms, dtype=np.uint32)[partial_terms],
+                                     np.array(docnos, dtype=np.uint32)[partial_docnos],
+                                     np.array(xpaths, dtype=np.uint32)[partial_xpaths],
+                                     partial_tfs)
+
+        # The documents of the shards are distinct (checked above), their document frequencies add up
+        self.document_frequencies.merge(partial_index["document_frequencies"], terms, len(self.terms))
+
+        self.documents.merge(partial_index["documents"], docnos, terms)
+        if self.forward_index is not None:
+            self.forward_index.merge(partial_index["forward_index"], docnos, terms)
+        if self.token_stream is not None:
+            self.token_stream.merge(partial_index["token_stream"], docnos, xpaths, terms)
+
+        for name, value in partial_index["processing_times"].items():
+            setattr(self, name, getattr(self, name) + value)
+
+        self.merge_time_processing += time.time() - start
+
+    def parse_article(self, tree, docno, xpaths):
         start = time.time()
         root_tag_text = self.extract_text(tree.getroot())
         end = time.time()
         self.extract_text_time_processing += end - start
 
         if root_tag_text is not None and (self.ARTICLE in self.parser_granularity or self.is_bm25fr):
-            self.process_and_update(tree.getroot(), docno, parent_map, root_tag_text)
+            self.process_and_update(tree.getroot(), docno, xpaths, root_tag_text)
 
-    def process_and_update(self, element, docno, parent_map, text):
+    def process_and_update(self, element, docno, xpaths, text):
         start = time.time()
-        xpath = self.get_xpath(element, parent_map)
+        xpath = xpaths[element]
         end = time.time()
         self.xpath_time_processing += end - start
 
+        self.index_element(docno, xpath, text)
+
+    def index_element(self, docno, xpath, text):
+        if self.tokenizer_pool is not None:
+            # The elements are pre-processed by batches, in order
+            self.pending_elements.append((docno, xpath, text))
+            if len(self.pending_elements) >= self.TOKENIZER_BATCH_SIZE:
+                self.flush_pending_elements()
+            return
+
         start = time.time()
         if self.is_preprocessed:
             tokens = text.split()
         else:
             tokens = self.text_processor.pre_processing(text)
+        self.clean_time_processing += time.time() - start
+
+        self.index_tokens(docno, xpath, tokens)
+
+    def flush_pending_elements(self) -> None:
+        """
+        Pre-processes the pending elements with the tokenizer pool, then indexes them in order.
+        """
+        if not self.pending_elements:
+            return
+
+        start = time.time()
+        texts = [text for _, _, text in self.pending_elements]
+        element_tokens = self.text_processor.pre_processing_batch(texts, self.tokenizer_pool)
+        self.clean_time_processing += time.time() - start
+
+        pending_elements, self.pending_elements = self.pending_elements, []
+        for (docno, xpath, _), tokens in zip(pending_elements, element_tokens):
+            self.index_tokens(docno, xpath, tokens)
+
+    def index_tokens(self, docno, xpath, tokens):
+        start = time.time()
+        tokens = [self.terms.add(token) for token in tokens]
         end = time.time()
         self.clean_time_processing += end - start
 
-        tag = re.sub(r'\[\d+\]', '', xpath).split("/")[-1]
+        self.index_term_ids(self.docnos.add(docno), self.add_xpath(xpath), tokens)
+
+    def index_term_ids(self, docno, xpath, tokens):
+        if self.token_stream is not None:
+            self.token_stream.add(docno, xpath, tokens)
+
+        tag = self.xpath_tags[xpath]
         # ! If you want to use a df with a cibled xpath, pass the xpath as tag
-        self.update_parsed_documents(docno, tag, tokens)
+        self.update_documents(docno, tag, tokens)
 
         if self.is_bm25fr and tag == self.ARTICLE[3:]:
             return
 
         self.update_inverted_index(tokens, docno, xpath)
 
+    def parse_text_document(self, docno: str, text: str) -> None:
+        """
+        Indexes a document of a text collection. The text is the article, the other granularities
+        have no elements in a text document.
+        """
+        start = time.time()
+        if self.ARTICLE in self.parser_granularity or self.is_bm25fr:
+            self.index_element(docno, '/article[1]', text)
+
+        self.xml_to_json_time_processing += time.time() - start
+
+    def parse_xml_file(self, filename: str, xml_file: io.TextIOWrapper) -> None:
+        """
+        Parses an XML file with the streaming ingestion when it is enabled and every granularity
+        is a plain descendant tag ('.//tag'), otherwise with the element tree.
+        """
+        if self.is_streaming and all(SIMPLE_GRANULARITY.fullmatch(granularity) for granularity in self.parser_granularity):
+            self.parse_xml_stream(filename, xml_file)
+        else:
+            self.parse_xml_to_json(filename, xml_file)
+
+    def parse_xml_stream(self, filename: str, xml_file: io.TextIOWrapper) -> None:
+        """
+        Parses an XML file without building its element tree.
+        The elements are emitted when they close, they are then indexed in the same order as
+        parse_xml_to_json does (article first, then each granularity in document order).
+        """
+        start = time.time()
+        docno = filename.split('/')[-1].split('.')[0]
+
+        include_root = self.ARTICLE in self.parser_granularity or self.is_bm25fr
+        granularity_ranks = defaultdict(list)
+        for rank, parser_granularity in enumerate(self.parser_granularity):
+            if parser_granularity != self.ARTICLE:
+                granularity_ranks[parser_granularity[3:]].append(rank)
+
+        elements = []
+        for position, tag, xpath, text in self.iterparse_elements(xml_file, granularity_ranks.keys(), include_root):
+            if position == 0:
+                elements.append((-1, position, xpath, text))
+            else:
+                elements.extend((rank, position, xpath, text) for rank in granularity_ranks[tag])
+
+        elements.sort(key=lambda element: element[:2])
+        for _, _, xpath, text in elements:
+            self.index_element(docno, xpath, text)
+
+        end = time.time()
+        self.xml_to_json_time_processing += end - start
+
     def parse_xml_to_json(self, filename: str, xml_file: io.TextIOWrapper) -> None:
         start = time.time()
         docno = filename.split('/')[-1].split('.')[0]
@@ -78,60 +415,97 @@ class DocumentParser (XmlParser):
         xml_content = xml_file.read().decode('utf-8')
         tree = ET.ElementTree(ET.fromstring(re.sub('&[^;]+;', ' ', xml_content)))
 
-        parent_map = self.parent_map(tree)
-        self.parse_article(tree, docno, parent_map)
+        start_xpath = time.time()
+        xpaths = self.xpath_map(tree)
+        self.xpath_time_processing += time.time() - start_xpath
+
+        self.parse_article(tree, docno, xpaths)
 
         for parser_granularity in self.parser_granularity:
             if parser_granularity == self.ARTICLE:
                 continue
             for balise in tree.findall(parser_granularity):
-                self.process_tag(balise, docno, parent_map)
+                self.process_tag(balise, docno, xpaths)
         end = time.time()
         self.xml_to_json_time_processing += end - start
 
-    def process_tag(self, balise, docno, parent_map):
+    def process_tag(self, balise, docno, xpaths):
         start = time.time()
         text = self.extract_text(balise)
         end = time.time()
         self.extract_text_time_processing += end - start
         if text is not None:
-            self.process_and_update(balise, docno, parent_map, text)
+            self.process_and_update(balise, docno, xpaths, text)
 
-    def update_parsed_documents(self, docno, parser_granularity, tokens):
+    def update_documents(self, docno, parser_granularity, tokens):
+        # Only the lengths of the elements are kept, the tokens are kept by the optional forward index
         start = time.time()
-        if docno not in self.parsed_documents:
-            self.parsed_documents[docno] = {parser_granularity: {'terms': tokens, 'N': 1}}
-        else:
-            if parser_granularity not in self.parsed_documents[docno]:
-                self.parsed_documents[docno][parser_granularity] = {'terms': tokens, 'N': 1}
-            else:
-                self.parsed_documents[docno][parser_granularity]['N'] += 1
-                self.parsed_documents[docno][parser_granularity]['terms'].extend(tokens)
+        self.documents.add(docno, parser_granularity, tokens)
+        if self.forward_index is not None:
+            self.forward_index.add(docno, parser_granularity, tokens)
 
         end = time.time()
         self.parsed_documents_time_processing += end - start
 
-    def update_term_frequencies(self, term, docno, granularity):
+    def update_term_frequencies(self, tokens, docno, granularity):
         start_time = time.time()
-        self.term_frequencies.setdefault(term, defaultdict(lambda: defaultdict(int)))[granularity][docno] += 1
+        add_posting = self.term_frequencies.add
+        term_counts = Counter(tokens)
+        for term, frequency in term_counts.items():
+            add_posting(term, docno, granularity, frequency)
         end_time = time.time()
         self.tf_time_processing += end_time - start_time
 
+        self.document_frequencies.add(term_counts.keys(), docno, self.xpath_tag_ids[granularity], len(self.terms))
+        self.df_time_processing += time.time() - end_time
+
     def update_inverted_index(self, tokens, docno, xpath):
+        # The postings of the query vocabulary are built from the term frequencies by build_inverted_index
         start_time = time.time()
-        for term in tokens:
-            if term in self.query_vocabulary:
-                if term in self.inverted_index:
-                    entries = self.inverted_index[term]
-                    if xpath in entries:
-                        if docno not in entries[xpath]:
-                            entries[xpath].append(docno)
-                    else:
-                        entries[xpath] = [docno]
-                else:
-                    self.inverted_index[term] = {xpath: [docno]}
-
-            self.update_term_frequencies(term, docno, xpath)
-
+        self.update_term_frequencies(tokens, docno, xpath)
         end_time = time.time()
-        self.inverted_index_time_processing += end_time - start_time
\ No newline at end of file
+        self.inverted_index_time_processing += end_time - start_time
+
+
+# The parser of each worker process and the terms known before parsing,
+# set once by the pool initializer
+_worker_parser = None
+_worker_terms = []
+
+
+def _init_worker(parser_class, filename, text_processor, parser_granularity, is_bm25fr, is_preprocessed, is_streaming,
+                 forward_index, token_stream, terms) -> None:
+    global _worker_parser, _worker_terms
+    _worker_parser = parser_class(filename, text_processor, parser_granularity, is_bm25fr=is_bm25fr,
+                                  is_preprocessed=is_preprocessed, is_streaming=is_streaming, forward_index=forward_index)
+    _worker_parser.token_stream = TokenStream() if token_stream else None
+    _worker_terms = terms
+
+
+def _parse_shard(xml_file_names: list) -> dict:
+    """
+    Parses a shard of zip members in a worker process and returns the partial index.
+    """
+    parser = _worker_parser
+    parser.inverted_index = {}
+    parser.term_frequencies = Postings()
+    parser.documents = DocumentTable()
+    if parser.forward_index is not None:
+        parser.forward_index = ForwardIndex()
+    if parser.token_stream is not None:
+        parser.token_stream = TokenStream()
+    parser.terms = Dictionary(_worker_terms)
+    parser.docnos = Dictionary()
+    parser.xpaths = Dictionary()
+    parser.xpath_tags = []
+    parser.tags = Dictionary()
+    parser.xpath_tag_ids = []
+    parser.document_frequencies = DocumentFrequencies(parser.tags)
+    parser.reset_processing_times()
+
+    with zipfile.ZipFile(parser.filename, 'r') as zip_file:
+        for file in xml_file_names:
+            with zip_file.open(file) as xml_file:
+                parser.parse_xml_file(file, xml_file)
+
+    return parser.export_partial_index()
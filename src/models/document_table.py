@@ -0,0 +1,109 @@
+from array import array
+
+from models.dictionary import Dictionary
+
+"""
+    This class gathers the document-length table while the documents are indexed:
+    one record (doc id, tag id, length, count) per tag of each document, the number of distinct terms
+    of each document and the term ids of the collection vocabulary.
+    The documents are indexed one after the other, the elements of the current document are
+    accumulated and written to the arrays when the next document starts.
+"""
+
+# The arrays of the document-length table and their typecodes
+DOCUMENT_TABLE_ARRAYS = {
+    'element_docs': 'I',      # The document id of each (document, tag) record
+    'element_tags': 'I',      # The tag id of each record
+    'element_lengths': 'Q',   # The number of terms of the elements of the tag in the document
+    'element_counts': 'I',    # The number of elements of the tag in the document
+    'distinct_terms': 'I',    # The number of distinct terms of each document id
+    'vocabulary': 'I',        # The sorted term ids of the collection vocabulary
+}
+
+
+class DocumentTable:
+    def __init__(self) -> None:
+        """
+        Initializes the DocumentTable class.
+        """
+        self.arrays = {name: array(typecode) for name, typecode in DOCUMENT_TABLE_ARRAYS.items()}
+        self.tags = Dictionary()
+        self.collection_vocabulary = set()
+
+        self.current_docno = None
+        self.current_elements = {}          # {tag_id: [length, count]} of the current document
+        self.current_vocabulary = set()     # The term ids of the current document
+
+    def add(self, docno: int, tag: str, tokens: list, count: int = 1) -> None:
+        """
+        Adds the tokens of elements of a document.
+
+        Args:
+            docno (int): The document id.
+            tag (str): The tag of the elements.
+            tokens (list): The term ids of the elements.
+            count (int, optional): The number of elements. Defaults to 1.
+        """
+        if docno != self.current_docno:
+            self.flush_document()
+            self.current_docno = docno
+
+        element = self.current_elements.setdefault(self.tags.add(tag), [0, 0])
+        element[0] += len(tokens)
+        element[1] += count
+        self.current_vocabulary.update(tokens)
+
+    def flush_document(self) -> None:
+        """
+        Writes the records of the current document to the arrays.
+        """
+        if self.current_docno is None:
+            return
+
+        for tag, (length, count) in self.current_elements.items():
+            self.arrays['element_docs'].append(self.current_docno)
+            self.arrays['element_tags'].append(tag)
+            self.arrays['element_lengths'].append(length)
+            self.arrays['element_counts'].append(count)
+
+        self.arrays['distinct_terms'].append(len(self.current_vocabulary))
+        self.collection_vocabulary.update(self.current_vocabulary)
+
+        self.current_docno = None
+        self.current_elements = {}
+        self.current_vocabulary = set()
+
+    def merge(self, table: dict, doc_map: list, term_map: list) -> None:
+        """
+        Appends the document-length table of documents indexed apart, ex: by a worker.
+        The documents are appended in the order of their ids.
+
+        Args:
+            table (dict): The document-length table, see table.
+            doc_map (list): The document id of each document id of the table.
+            term_map (list): The term id of each term id of the table.
+        """
+        self.flush_document()
+
+        tag_map = [self.tags.add(tag) for tag in table['tags']]
+        self.arrays['element_docs'].extend(doc_map[docno] for docno in table['element_docs'])
+        self.arrays['element_tags'].extend(tag_map[tag] for tag in table['element_tags'])
+        self.arrays['element_lengths'].extend(table['element_lengths'])
+        self.arrays['element_counts'].extend(table['element_counts'])
+        self.arrays['distinct_terms'].extend(table['distinct_terms'])
+        self.collection_vocabulary.update(term_map[term] for term in table['vocabulary'])
+
+    def table(self) -> dict:
+        """
+        Returns the document-length table.
+
+        Returns:
+            dict: The arrays of DOCUMENT_TABLE_ARRAYS, 'tags' and 'vocabulary_size'.
+        """
+        self.flush_document()
+
+        table = dict(self.arrays)
+        table['vocabulary'] = array('I', sorted(self.collection_vocabulary))
+        table['tags'] = self.tags.keys
+        table['vocabulary_size'] = len(self.collection_vocabulary)
+        return table
@@ -0,0 +1,54 @@
+from array import array
+
+import numpy as np
+
+"""
+    This class is the forward index of the collection: the term ids of the elements of each document,
+    by tag, in the order they were indexed. The statistics only need the document-length table
+    (see DocumentTable), the forward index is built on demand for the consumers of the tokens.
+"""
+
+
+class ForwardIndex:
+    def __init__(self) -> None:
+        """
+        Initializes the ForwardIndex class.
+        """
+        self.documents = {}     # The term ids of each document and tag {doc_id: {tag: array('I')}}
+
+    def add(self, docno: int, tag: str, tokens: list) -> None:
+        """
+        Appends the tokens of an element of a document.
+
+        Args:
+            docno (int): The document id.
+            tag (str): The tag of the element.
+            tokens (list): The term ids of the element.
+        """
+        self.documents.setdefault(docno, {}).setdefault(tag, array('I')).extend(tokens)
+
+    def terms(self, docno: int, tag: str) -> array:
+        """
+        Returns the term ids of the elements of a tag in a document, empty if it has none.
+        """
+        return self.documents.get(docno, {}).get(tag, array('I'))
+
+    def merge(self, documents: dict, doc_map: list, term_map: list) -> None:
+        """
+        Appends the documents of a forward index built apart, ex: by a worker.
+
+        Args:
+            documents (dict): The term ids of each document and tag, see documents.
+            doc_map (list): The document id of each document id of the documents.
+            term_map (list): The term id of each term id of the documents.
+        """
+        term_map = np.asarray(term_map, dtype=np.uint32)
+        for docno, tags in documents.items():
+            for tag, terms in tags.items():
+                self.add(doc_map[docno], tag, term_map[np.frombuffer(terms, dtype=np.uint32)].tolist())
+
+    def __contains__(self, docno: int) -> bool:
+        return docno in self.documents
+
+    def __len__(self) -> int:
+        return len(self.documents)
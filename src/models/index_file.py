@@ -0,0 +1,119 @@
+from pathlib import Path
+from array import array
+import numpy as np
+import shutil
+import struct
+import mmap
+import json
+
+"""
+    This module reads and writes the binary index format.
+    The file starts with a header and a table of named sections (offset, length), followed by
+    the sections themselves, each aligned on 8 bytes:
+    - the metadata (JSON),
+    - the term dictionary, the docnos, the XPaths and the tags (UTF-8 strings separated by '\\n'),
+    - the postings arrays (see Postings),
+    - the document-length table: one record (doc id, tag id, length, count) per document tag,
+      the number of distinct terms of each document and the term ids of the vocabulary,
+    - the document frequencies: the tags and the document frequency of each term id, per tag.
+    The file is opened with mmap, the arrays are exposed as memoryviews so the postings of a term are
+    only read from the disk when the term is accessed.
+"""
+
+MAGIC = b'XIRINDEX'
+VERSION = 1
+HEADER = struct.Struct('<8sII')     # magic, version, number of sections
+SECTION = struct.Struct('<16sQQ')   # name, offset, length
+ALIGNMENT = 8
+
+
+def _section_bytes(values):
+    """
+    Returns the bytes of a section: an array, a list of strings or a dict (stored as JSON).
+    A section held by a file is returned as its Path, it is copied when the index file is written.
+    """
+    if isinstance(values, Path):
+        return values
+    if isinstance(values, (array, np.ndarray)):
+        return values.tobytes()
+    if isinstance(values, dict):
+        return json.dumps(values).encode('utf-8')
+
+    return '\n'.join(values).encode('utf-8')
+
+
+def write_index_file(filename: str, sections: dict) -> None:
+    """
+    Writes the sections to a binary index file.
+
+    Args:
+        filename (str): The filename of the index file.
+        sections (dict): The sections by name: arrays, lists of strings, dicts or paths of files.
+    """
+    data = [_section_bytes(values) for values in sections.values()]
+
+    offset = HEADER.size + SECTION.size * len(sections)
+    section_table = []
+    for name, section_data in zip(sections.keys(), data):
+        length = section_data.stat().st_size if isinstance(section_data, Path) else len(section_data)
+        offset += -offset % ALIGNMENT
+        section_table.append(SECTION.pack(name.encode('ascii'), offset, length))
+        offset += length
+
+    with open(filename, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(sections)))
+        file.write(b''.join(section_table))
+        for section_data in data:
+            file.write(b'\0' * (-file.tell() % ALIGNMENT))
+            if isinstance(section_data, Path):
+                with open(section_data, 'rb') as section_file:
+                    shutil.copyfileobj(section_file, file)
+            else:
+                file.write(section_data)
+
+
+class IndexFile:
+    def __init__(self, filename: str) -> None:
+        """
+        Opens a binary index file with mmap.
+
+        Args:
+            filename (str): The filename of the index file.
+
+        Raises:
+            ValueError: If the file is not an index file or its version is not supported.
+        """
+        with open(filename, 'rb') as file:
+            self.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.buffer = memoryview(self.mmap)
+
+        magic, version, number_of_sections = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f"'{filename}' is not an index file")
+        if version != VERSION:
+            raise ValueError(f"'{filename}' has the version {version}, expected {VERSION}")
+
+        self.sections = {}  # {name: (offset, length)}
+        for i in range(number_of_sections):
+            name, offset, length = SECTION.unpack_from(self.buffer, HEADER.size + i * SECTION.size)
+            self.sections[name.rstrip(b'\0').decode('ascii')] = (offset, length)
+
+    def raw(self, name: str) -> memoryview:
+        offset, length = self.sections[name]
+        return self.buffer[offset:offset + length]
+
+    def array(self, name: str, typecode: str) -> memoryview:
+        """
+        Returns an array section without copying it.
+        """
+        return self.raw(name).cast(typecode)
+
+    def strings(self, name: str) -> list:
+        """
+        Returns a list of strings section.
+        """
+        data = bytes(self.raw(name)).decode('utf-8')
+        return data.split('\n') if data else []
+
+    def metadata(self) -> dict:
+        return json.loads(bytes(self.raw('metadata')))
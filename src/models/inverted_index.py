@@ -1,16 +1,24 @@
-from collections import defaultdict
-
 from colorama import Fore, Style
-import tabulate
+import tempfile
 import time
-import json
-import re
+import os
 
 from models.document_parser import DocumentParser
+from models.dictionary import Dictionary
+from models.document_table import DocumentTable
+from models.document_frequencies import DocumentFrequencies
+from models.forward_index import ForwardIndex
+from models.postings import Postings
+from models.segments import (Segment, SegmentedPostings, write_segment, merge_document_tables, merge_document_frequencies,
+                             read_manifest, indexed_members, reserve_segment, add_segment, delete_documents,
+                             remove_unreferenced_segments, merge_in_background)
+from models.spimi import merge_blocks
 
 
 class InvertedIndex(DocumentParser):
-    def __init__(self, filename: str, text_processor, parser_granularity: list, is_bm25fr: bool = False, is_preprocessed=False):
+    def __init__(self, filename: str, text_processor, parser_granularity: list, is_bm25fr: bool = False, is_preprocessed=False, n_workers: int = 1,
+                 is_streaming: bool = False, memory_budget: int = None, query_file: str = None, forward_index: bool = False,
+                 tokenizer_workers: int = 1, token_cache: str = None):
         """
         Initializes the InvertedIndex class.
 
@@ -19,9 +27,18 @@ class InvertedIndex(DocumentParser):
             text_processor: The text processor object.
             parser_granularity (list): The granularity of the parser.
             is_bm25fr (bool, optional): Flag indicating whether to use BM25FR scoring. Defaults to False.
+            n_workers (int, optional): Number of worker processes used to parse zip collections. Defaults to 1.
+            is_streaming (bool, optional): Flag indicating whether to stream the XML files instead of building their trees. Defaults to False.
+            memory_budget (int, optional): Memory budget of the postings in megabytes, see construct_inverted_index_external. Defaults to None.
+            query_file (str, optional): The file of the queries whose terms are loaded in the inverted index. Defaults to the 7 topics of practice 4.
+            forward_index (bool, optional): Flag indicating whether to keep the term ids of each document, see ForwardIndex. Defaults to False.
+            tokenizer_workers (int, optional): Number of worker processes pre-processing the elements of a serial parsing. Defaults to 1.
+            token_cache (str, optional): The directory of the tokenized-corpus cache, see models/token_cache.py. Defaults to None (no cache).
         """
         self.ARTICLE = './/article'
-        self.QUERY_FILE = '../lib/data/practice_04/topics_M2DSC_7Q.txt'
+        self.QUERY_FILE = query_file or '../lib/data/practice_04/topics_M2DSC_7Q.txt'
+        self.SHARDS_PER_WORKER = 4  # Number of shards of zip members given to each worker
+        self.TOKENIZER_BATCH_SIZE = 1024    # Number of elements pre-processed at once by the tokenizer workers
 
         self.query_vocabulary = set()
 
@@ -29,26 +46,57 @@ class InvertedIndex(DocumentParser):
         self.filename = filename
         self.text_processor = text_processor
         self.is_preprocessed = is_preprocessed
+        self.n_workers = n_workers
+        self.is_streaming = is_streaming
+        self.memory_budget = memory_budget
+        self.tokenizer_workers = tokenizer_workers
+        self.tokenizer_pool = None
+        self.pending_elements = []  # The elements waiting for the tokenizer workers (docno, xpath, text)
+        self.token_cache = token_cache
+        self.token_stream = None    # The elements recorded for the tokenized-corpus cache, see TokenStream
 
         if (parser_granularity is None):
             self.parser_granularity = [self.ARTICLE]
         else:
             self.parser_granularity = parser_granularity
 
-        self.IDX = {}   # The inverted index
-        self.TF = {}    # The term frequencies
-        self.DF = {}    # The document frequencies
+        # The dictionaries mapping the terms, docnos and XPaths to their ids
+        # The index structures below are keyed by these ids
+        self.terms = Dictionary()
+        self.docnos = Dictionary()
+        self.xpaths = Dictionary()
+        self.xpath_tags = []    # The tag of each XPath id, ex: ['article', 'p']
+        self.tags = Dictionary()
+        self.xpath_tag_ids = []     # The tag id of each XPath id, resolved once when the XPath is added
+
+        self.IDX = {}   # The inverted index {term_id: {xpath_id: [doc_id]}}, see LazyInvertedIndex
+        self.TF = Postings()    # The term frequencies, see Postings.frequency
+        self.DF = DocumentFrequencies(self.tags)    # The document frequencies, see DocumentFrequencies.frequency
+
+        # The lengths of the elements of each document, see DocumentTable
+        # The term ids of the documents are only kept by the optional forward index (not stored in the index files)
+        self.documents = DocumentTable()
+        self.forward_index = ForwardIndex() if forward_index else None
+        self.document_table_data = None     # The document-length table of an imported index
+        self.index_file = None              # The memory-mapped file of an imported index
+
+        # The indexing with a memory budget flushes the postings to blocks
+        self.blocks_directory = None
+        self.blocks = []
+        self.flushed_postings = 0
 
-        # A dictionary with the document number as key and the content as value
-        # ex: {'doc1': [This, is, the, content, of, the, document]}
-        self.parsed_documents = {}
-        self.inverted_index = defaultdict(list)
-        self.term_frequencies = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
-        self.document_frequencies = defaultdict(lambda: defaultdict(int))
+        # The zip members held by the segments of an incremental index, they are not parsed again
+        self.excluded_members = set()
+        self.segments_directory = None
+        self.deleted_documents = set()     # The ids of the documents deleted since the segments were imported
+
+        self.inverted_index = {}
+        self.term_frequencies = Postings()
+        self.document_frequencies = DocumentFrequencies(self.tags)
 
-        self.document_frequency_time = 0
         self.indexing_time = 0
         self.total_time = 0
+        self.reset_processing_times()
 
     def construct_inverted_index(self) -> dict:
         """
@@ -61,10 +109,6 @@ class InvertedIndex(DocumentParser):
         print(Fore.CYAN + "> Granularity:", self.parser_granularity, Style.RESET_ALL) 
         self.parse_documents()
 
-        start = time.time()
-        self.compute_document_frequency()
-        self.document_frequency_time = time.time() - start
-        
         self.total_time = time.time() - self.total_time 
 
         self.indexing_time = self.inverted_index_time_processing
@@ -72,81 +116,207 @@ class InvertedIndex(DocumentParser):
         self.TF = self.term_frequencies
         self.DF = self.document_frequencies
 
+        self.print_processing_times()
+
+    def construct_inverted_index_external(self, filename: str, postings_codec: str = 'raw') -> None:
+        """
+        Constructs the inverted index with a bounded memory (single-pass in-memory indexing).
+        The buffered postings are flushed to sorted blocks when they exceed the memory budget and only the
+        document lengths are kept. The blocks are then merged into the index file, which is imported.
+
+        Args:
+            filename (str): The filename of the index file.
+            postings_codec (str, optional): The codec of the postings, see POSTINGS_CODECS. Defaults to 'raw'.
+        """
+        self.total_time = time.time()
+        print(Fore.CYAN + "> Granularity:", self.parser_granularity, f"(memory budget: {self.memory_budget} MB)", Style.RESET_ALL)
+
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(filename) or '.') as blocks_directory:
+            self.blocks_directory = blocks_directory
+            self.blocks = []
+            self.flushed_postings = 0
+            self.parse_documents()
+
+            start = time.time()
+            postings_sections = merge_blocks(self.blocks, blocks_directory, len(self.terms), postings_codec, self.memory_budget)
+            self.export_inverted_index(filename, postings_codec, postings_sections)
+            self.merge_time_processing += time.time() - start
+
+        self.import_inverted_index(filename)
+        self.total_time = time.time() - self.total_time
+        self.indexing_time = self.inverted_index_time_processing + self.merge_time_processing
+
+        self.print_processing_times()
+
+    def print_processing_times(self) -> None:
+        import tabulate
         print(tabulate.tabulate([
             ['Parsed documents', self.parsed_documents_time_processing],
             ['Inverted index', self.inverted_index_time_processing],
-            ['Documents frequency', self.document_frequency_time],
+            ['Partial indexes merge', self.merge_time_processing],
+            ['Documents frequency', self.df_time_processing],
             ['Term Frequency', self.tf_time_processing],
             ['XPath retrieval', self.xpath_time_processing],
             ['Pre processing', self.clean_time_processing],
             ['Text extraction', self.extract_text_time_processing],
+            ['Token cache', self.token_cache_time_processing],
             ['Total Time', self.total_time]
         ]))
         
         print(Fore.YELLOW + "> Indexing time:", self.indexing_time, "seconds" + Style.RESET_ALL)
         print()
     
-    def compute_document_frequency(self) -> int:
-        for term, _ in self.inverted_index.items():
-            for granularity in self.parser_granularity:
-                tag = re.sub(r'\[\d+\]', '', granularity).split("/")[-1]
-                self.document_frequencies[term][tag] = self._document_frequency(term, tag)
-
-    def _document_frequency(self, term: str, tag_cibled: str) -> int:
+    def document_table(self) -> dict:
         """
-        Returns the document frequency of a term.
-        The document frequency is the sum of the frequencies of the term in all documents.
-        # ! We compute the df based on the xpath and not on the entire document
-        # - TO COMPUTE THE df based on the xpath use this formula:
-        # - df = len(self.inverted_index.IDX.get(term, {}).get(xpath, {}))
+        Returns the document-length table: the length and the number of elements of each (document, tag),
+        the number of distinct terms of each document, the tags and the size of the collection vocabulary.
+
+        Returns:
+            dict: The arrays of DOCUMENT_TABLE_ARRAYS, 'tags' and 'vocabulary_size'.
         """
-        docno_set = set()
-        for x_path, docno_list in self.inverted_index.get(term, {}).items():
-            tag = re.sub(r'\[\d+\]', '', x_path).split("/")[-1]
-            if tag == tag_cibled:
-                docno_set.update(docno_list)
+        if self.document_table_data is not None:
+            return self.document_table_data
 
-        return len(docno_set)
+        return self.documents.table()
 
-    def export_inverted_index(self, filename: str) -> None:
+    def export_inverted_index(self, filename: str, postings_codec: str = 'raw', postings_sections: dict = None) -> None:
         """
-        Exports the inverted index to a JSON file.
+        Exports the inverted index to a binary index file (see models/index_file.py).
+        The inverted index is not stored: it reads the postings of the term frequencies when the index
+        is imported, whatever the queries.
 
         Args:
-            filename (str): The filename of the JSON file.
+            filename (str): The filename of the index file.
+            postings_codec (str, optional): The codec of the postings, see POSTINGS_CODECS. Defaults to 'raw'.
+            postings_sections (dict, optional): The postings sections, ex: merged from blocks.
+                Defaults to the sections of the term frequencies.
         """
-        inverted_index_data = {
-            "inverted_index": self.IDX,
-            "term_frequencies": self.TF,
-            "document_frequencies": self.DF,
-            "parsed_documents": self.parsed_documents,
-        }
+        if postings_sections is None:
+            postings_sections = self.TF.export_postings(postings_codec)
 
-        with open(filename, "w") as file:
-            json.dump(inverted_index_data, file)
+        write_segment(filename, self.parser_granularity, self.terms.keys, self.docnos.keys, self.xpaths.keys,
+                      self.document_table(), self.document_frequencies, postings_sections, postings_codec)
 
     def import_inverted_index(self, filename: str) -> None:
         """
-        Imports the inverted index from a JSON file.
+        Imports the inverted index from a binary index file.
+        The file is memory-mapped, the postings of a term are only read when the term is accessed.
 
         Args:
-            filename (str): The filename of the JSON file.
+            filename (str): The filename of the index file.
+
+        Raises:
+            FileNotFoundError: If the index file does not exist, the queries would run on an empty index.
         """
+        start_time = time.time()
         try:
-            start_time = time.time()
-            with open(filename, "r") as file:
-                inverted_index_data = json.load(file)
+            segment = Segment(filename)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"File '{filename}' not found. "
+                                    "Please run the program without the '-i' option to generate the inverted index.") from None
+        self.index_file = segment.index_file
 
-            self.IDX = inverted_index_data["inverted_index"]
-            end_time = time.time()
+        self.terms = Dictionary(segment.terms)
+        self.docnos = Dictionary(segment.docnos)
+        for xpath in segment.xpaths:
+            self.add_xpath(xpath)
 
-            self.TF = inverted_index_data["term_frequencies"]
-            self.DF = inverted_index_data["document_frequencies"]
+        document_frequencies = DocumentFrequencies(self.tags)
+        document_frequencies.import_counts(segment.document_frequencies())
+        self.load_term_frequencies(segment.postings, segment.document_table, document_frequencies)
+        self.indexing_time = time.time() - start_time
 
-            self.parsed_documents = inverted_index_data["parsed_documents"]
-            self.indexing_time = end_time - start_time
-        except FileNotFoundError:
-            print(f"File '{filename}' not found.")
-            print("Please run the program without the '-i' option to generate the inverted index.")
-        except Exception as e:
-            print(f"An error occurred while importing the inverted index: {str(e)}")
+    def import_segments(self, directory: str) -> None:
+        """
+        Imports the segments of an incremental index (see models/segments.py).
+        The segments are memory-mapped and read together through global ids.
+
+        Args:
+            directory (str): The directory of the segments.
+        """
+        start_time = time.time()
+        manifest = read_manifest(directory)
+        segments = [Segment(os.path.join(directory, segment['filename']), segment.get('deleted', []))
+                    for segment in manifest['segments']]
+
+        self.segments_directory = directory
+        self.deleted_documents = set()
+        self.terms = Dictionary()
+        self.docnos = Dictionary()
+        self.xpaths = Dictionary()
+        self.xpath_tags = []
+        self.xpath_tag_ids = []
+        self.documents = DocumentTable()
+        if self.forward_index is not None:
+            # The documents get new ids from the segments
+            self.forward_index = ForwardIndex()
+
+        term_frequencies = SegmentedPostings(segments, self.terms, self.docnos, self.add_xpath)
+        self.load_term_frequencies(term_frequencies, merge_document_tables(term_frequencies, len(self.docnos)),
+                                   merge_document_frequencies(term_frequencies, len(self.terms), self.tags))
+        self.indexing_time = time.time() - start_time
+        print(Fore.YELLOW + f"> Imported {len(segments)} segments ({len(self.docnos)} documents)" + Style.RESET_ALL)
+
+    def add_segment(self, directory: str, postings_codec: str = 'raw') -> None:
+        """
+        Indexes the members of the collection that are not in the segments of a directory into a new segment,
+        then imports all the segments. The small segments are merged in the background.
+
+        Args:
+            directory (str): The directory of the segments, created if needed.
+            postings_codec (str, optional): The codec of the postings, see POSTINGS_CODECS. Defaults to 'raw'.
+        """
+        os.makedirs(directory, exist_ok=True)
+        remove_unreferenced_segments(directory)
+
+        collection = os.path.basename(self.filename)
+        self.excluded_members = indexed_members(read_manifest(directory), collection)
+        members = self.collection_members()
+        if members:
+            filename = reserve_segment(directory)
+            if self.memory_budget is not None:
+                self.construct_inverted_index_external(os.path.join(directory, filename), postings_codec)
+            else:
+                self.construct_inverted_index()
+                self.export_inverted_index(os.path.join(directory, filename), postings_codec)
+
+            add_segment(directory, filename, collection, members, self.docnos.keys, self.parser_granularity)
+            merge_in_background(directory)
+        else:
+            print(Fore.YELLOW + f"> No new documents in {collection}" + Style.RESET_ALL)
+
+        self.import_segments(directory)
+
+    def delete_documents(self, docnos: list, directory: str = None) -> None:
+        """
+        Deletes documents from the segments of an incremental index. The imported documents are skipped
+        by the queries right away, but the statistics (N, DF, avdl) are only updated when the segments are
+        imported again: use Collection.delete_documents, or delete them before importing the segments.
+
+        Args:
+            docnos (list): The docnos to delete.
+            directory (str, optional): The directory of the segments. Defaults to the imported segments.
+        """
+        directory = directory or self.segments_directory
+        deleted = delete_documents(directory, docnos)
+        self.deleted_documents.update(self.docnos.get(docno) for docno in deleted if docno in self.docnos)
+        print(Fore.YELLOW + f"> Deleted {len(deleted)} documents from {directory}" + Style.RESET_ALL)
+
+        # The segments with many deleted documents are compacted
+        merge_in_background(directory)
+
+    def load_term_frequencies(self, term_frequencies, document_table: dict, document_frequencies: DocumentFrequencies) -> None:
+        """
+        Loads imported term frequencies and document frequencies, then builds the inverted index over them.
+
+        Args:
+            term_frequencies: The term frequencies, see Postings.
+            document_table (dict): The document-length table, see document_table.
+            document_frequencies (DocumentFrequencies): The document frequencies.
+        """
+        self.TF = self.term_frequencies = term_frequencies
+        self.DF = self.document_frequencies = document_frequencies
+        self.document_table_data = document_table
+
+        self.build_inverted_index()
+        self.IDX = self.inverted_index
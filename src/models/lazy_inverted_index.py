@@ -0,0 +1,69 @@
+"""
+    This class is the inverted index {term_id: {xpath_id: [doc_id]}} of the full vocabulary.
+    The postings of a term are read from the term frequencies (memory-mapped when the index is imported)
+    the first time the term is accessed, so the memory used scales with the terms actually accessed.
+    Iterating the index yields the loaded terms, ex: the vocabulary of the queries (see load).
+"""
+
+
+class LazyInvertedIndex:
+    def __init__(self, term_frequencies) -> None:
+        """
+        Initializes the LazyInvertedIndex class.
+
+        Args:
+            term_frequencies: The term frequencies holding the postings, see Postings.
+        """
+        self.term_frequencies = term_frequencies
+        self.loaded_terms = {}  # The postings of the loaded terms {term_id: {xpath_id: [doc_id]}}
+
+    def load(self, terms) -> None:
+        """
+        Loads the postings of terms, in the order of their first occurrence in the collection.
+
+        Args:
+            terms: The term ids to load, the terms without postings are ignored.
+        """
+        terms = {term for term in terms if term not in self.loaded_terms}
+        if not terms:
+            return
+
+        for term in self.term_frequencies:
+            if term in terms:
+                self[term]
+
+    def __getitem__(self, term: int) -> dict:
+        postings = self.loaded_terms.get(term)
+        if postings is None:
+            if term is None or term not in self.term_frequencies:
+                raise KeyError(term)
+
+            postings = self.loaded_terms[term] = {
+                xpath: docnos for xpath, docnos, _ in self.term_frequencies.xpath_postings(term)
+            }
+
+        return postings
+
+    def get(self, term: int, default=None):
+        try:
+            return self[term]
+        except KeyError:
+            return default
+
+    def items(self):
+        return self.loaded_terms.items()
+
+    def keys(self):
+        return self.loaded_terms.keys()
+
+    def values(self):
+        return self.loaded_terms.values()
+
+    def __contains__(self, term: int) -> bool:
+        return term in self.loaded_terms or (term is not None and term in self.term_frequencies)
+
+    def __iter__(self):
+        return iter(self.loaded_terms)
+
+    def __len__(self) -> int:
+        return len(self.loaded_terms)
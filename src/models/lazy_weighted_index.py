@@ -0,0 +1,124 @@
+from collections import OrderedDict
+
+from manager.stem_cache import EVICTION_POLICIES
+from models.weighted_index import TermWeights
+
+"""
+    This class is the weighted index {term_id: TermWeights} (see weighted_index.py) of the
+    query-time scoring: the weights of a term are computed by the weighting strategy (see
+    WeightingStrategy.weight_terms) the first time the term is queried, instead of weighting the whole
+    inverted index when the collection is built. The weights of the queried terms are memoized, the cache is
+    bounded like the stem cache: when it is full, the least recently used term ('lru') or the oldest term
+    ('fifo') is evicted. The memoized weights are dropped when the parameters of the strategy change.
+"""
+
+WEIGHT_CACHE_SIZE = 10000
+
+
+class LazyWeightedIndex:
+    def __init__(self, collection, weighting_strategy, max_size: int = WEIGHT_CACHE_SIZE, eviction: str = 'lru') -> None:
+        """
+        Initializes the LazyWeightedIndex class.
+
+        Args:
+            collection (Collection): The collection, with its inverted index and statistics.
+            weighting_strategy (WeightingStrategy): The strategy weighting the terms.
+            max_size (int, optional): The maximum number of memoized terms, None for no bound. Defaults to WEIGHT_CACHE_SIZE.
+            eviction (str, optional): The eviction policy, see EVICTION_POLICIES. Defaults to 'lru'.
+
+        Raises:
+            ValueError: If the eviction policy is unknown.
+        """
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy '{eviction}', expected one of {EVICTION_POLICIES}")
+
+        self.collection = collection
+        self.weighting_strategy = weighting_strategy
+        self.max_size = max_size
+        self.eviction = eviction
+        self.weights = OrderedDict()    # The weights of each memoized term, from the oldest (or least recently used) one
+        self.parameters = weighting_strategy.get_weighting_scheme_parameters()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def load(self, terms) -> None:
+        """
+        Weights the terms which are not memoized yet at once.
+
+        Args:
+            terms: The term ids, the terms without postings are ignored.
+        """
+        self._check_parameters()
+        self._weight([term for term in dict.fromkeys(terms) if term not in self.weights and term in self])
+
+    def _weight(self, terms: list) -> dict:
+        """
+        Weights terms and memoizes their weights, returns the weights {term: TermWeights}.
+        """
+        if not terms:
+            return {}
+
+        self.misses += len(terms)
+        weighted_index = self.weighting_strategy.weight_terms(self.collection, terms)
+        weights = {term: weighted_index.get(term, TermWeights.empty()) for term in terms}
+        for term, term_weights in weights.items():
+            self._add(term, term_weights)
+
+        return weights
+
+    def _check_parameters(self) -> None:
+        parameters = self.weighting_strategy.get_weighting_scheme_parameters()
+        if parameters != self.parameters:
+            self.parameters = parameters
+            self.weights.clear()
+
+    def _add(self, term: int, weights: TermWeights) -> None:
+        self.weights[term] = weights
+        if self.max_size is not None and len(self.weights) > self.max_size:
+            self.weights.popitem(last=False)
+            self.evictions += 1
+
+    def __getitem__(self, term: int) -> TermWeights:
+        self._check_parameters()
+        weights = self.weights.get(term)
+        if weights is None:
+            if term not in self:
+                raise KeyError(term)
+
+            return self._weight([term])[term]
+
+        self.hits += 1
+        if self.eviction == 'lru':
+            self.weights.move_to_end(term)
+
+        return weights
+
+    def get(self, term: int, default=None):
+        try:
+            return self[term]
+        except KeyError:
+            return default
+
+    def __contains__(self, term: int) -> bool:
+        return term in self.collection.inverted_index.IDX
+
+    def keys(self):
+        """
+        Returns the loaded terms of the inverted index, ex: the vocabulary of the queries.
+        """
+        return list(self.collection.inverted_index.IDX.keys())
+
+    def items(self):
+        """
+        Returns the weights of the loaded terms of the inverted index, ex: to export them. The terms are
+        weighted at once and are not memoized.
+        """
+        return self.weighting_strategy.weight_terms(self.collection, self.keys()).items()
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self.collection.inverted_index.IDX)
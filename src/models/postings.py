@@ -0,0 +1,438 @@
+from array import array
+from bisect import bisect_left
+
+import numpy as np
+
+from models.postings_codecs import CODECS
+
+"""
+    This class stores the term frequencies of the index in contiguous arrays.
+    The postings (term id, doc id, XPath id, tf) are appended to flat buffers while parsing,
+    they are then sorted once by term so the postings of a term are a contiguous range.
+    An exported index can compress the postings of each term with a codec (see postings_codecs.py),
+    they are then decoded when the term is accessed.
+"""
+
+DOC_BITS = 32
+DOC_MASK = (1 << DOC_BITS) - 1
+SMALL_POSTINGS = 64     # Below this number of postings, a term is decoded without NumPy
+
+# The finalized arrays and their typecodes
+POSTINGS_ARRAYS = {
+    'offsets': 'Q',
+    'xpath_offsets': 'Q',
+    'xpath_order': 'I',
+    'term_order': 'I',
+}
+# The arrays holding the postings, uncompressed or encoded with a codec
+RAW_POSTINGS_ARRAYS = {
+    'keys': 'Q',
+    'tfs': 'I',
+}
+COMPRESSED_POSTINGS_ARRAYS = {
+    'data_offsets': 'Q',    # The encoded postings of the term id t are in [data_offsets[t], data_offsets[t + 1])
+    'postings_data': 'B',
+}
+
+
+def _to_array(typecode: str, values: np.ndarray) -> array:
+    """
+    Copies a NumPy array into an array of the given typecode.
+    """
+    result = array(typecode)
+    result.frombytes(values.astype(np.dtype(typecode)).tobytes())
+    return result
+
+
+def sort_postings(terms: np.ndarray, keys: np.ndarray, tfs: np.ndarray, positions: np.ndarray) -> tuple:
+    """
+    Sorts postings by (term, key). The postings of an element indexed twice are merged:
+    their frequencies are summed and the first position is kept.
+
+    Returns:
+        tuple: The terms, keys, term frequencies and positions of the sorted postings.
+    """
+    order = np.lexsort((keys, terms))
+    terms, keys = terms[order], keys[order]
+
+    posting_starts = np.flatnonzero(np.concatenate(([True], (terms[1:] != terms[:-1]) | (keys[1:] != keys[:-1]))))
+    return (terms[posting_starts], keys[posting_starts],
+            np.add.reduceat(tfs[order], posting_starts), np.minimum.reduceat(positions[order], posting_starts))
+
+
+def postings_structure(terms: np.ndarray, keys: np.ndarray, positions: np.ndarray, first_term: int, last_term: int) -> tuple:
+    """
+    Returns the structure of sorted postings of the terms in [first_term, last_term):
+    the number of postings and of XPaths of each term, the XPaths of each term in the order of their
+    first occurrence and the first position of each term.
+    """
+    number_of_terms = last_term - first_term
+    if len(terms) == 0:
+        return (np.zeros(number_of_terms, dtype=np.int64), np.zeros(number_of_terms, dtype=np.int64),
+                np.zeros(0, dtype=np.uint32), np.full(number_of_terms, np.iinfo(np.uint64).max, dtype=np.uint64))
+
+    local_terms = terms.astype(np.int64) - first_term
+    new_term = np.concatenate(([True], terms[1:] != terms[:-1]))
+    xpaths = keys >> np.uint64(DOC_BITS)
+    group_starts = np.flatnonzero(new_term | np.concatenate(([True], xpaths[1:] != xpaths[:-1])))
+    term_starts = np.flatnonzero(new_term)
+
+    # The XPaths of each term are ordered by first occurrence
+    group_terms = local_terms[group_starts]
+    group_order = np.lexsort((np.minimum.reduceat(positions, group_starts), group_terms))
+
+    first_positions = np.full(number_of_terms, np.iinfo(np.uint64).max, dtype=np.uint64)
+    first_positions[local_terms[term_starts]] = np.minimum.reduceat(positions, term_starts)
+
+    return (np.bincount(local_terms, minlength=number_of_terms), np.bincount(group_terms, minlength=number_of_terms),
+            xpaths[group_starts][group_order], first_positions)
+
+
+def term_order(term_counts: np.ndarray, first_positions: np.ndarray) -> np.ndarray:
+    """
+    Returns the ids of the terms having postings, in the order of their first occurrence.
+    """
+    order = np.argsort(first_positions, kind='stable')
+    return order[term_counts[order] > 0]
+
+
+def encode_term_postings(codec, keys: np.ndarray, tfs: np.ndarray) -> bytes:
+    """
+    Encodes the postings of a term: the gaps between the XPath ids, the gaps between the doc ids
+    (the doc id itself at the start of an XPath) and the term frequencies minus one.
+    """
+    if len(keys) <= SMALL_POSTINGS:
+        xpath_gaps, doc_gaps = [], []
+        previous_xpath = previous_docno = 0
+        for key in keys.tolist():
+            xpath, docno = key >> DOC_BITS, key & DOC_MASK
+            xpath_gaps.append(xpath - previous_xpath)
+            doc_gaps.append(docno if xpath != previous_xpath or not doc_gaps else docno - previous_docno)
+            previous_xpath, previous_docno = xpath, docno
+        return codec.encode(xpath_gaps + doc_gaps + [tf - 1 for tf in tfs.tolist()])
+
+    xpaths = keys >> np.uint64(DOC_BITS)
+    docs = keys & np.uint64(DOC_MASK)
+
+    xpath_gaps = np.diff(xpaths, prepend=np.uint64(0))
+    doc_gaps = np.diff(docs, prepend=np.uint64(0))
+    new_xpath = xpath_gaps != 0
+    new_xpath[:1] = True
+    doc_gaps[new_xpath] = docs[new_xpath]
+
+    return codec.encode(np.concatenate((xpath_gaps, doc_gaps, tfs.astype(np.uint64) - np.uint64(1))))
+
+
+def decode_term_postings(codec, data, count: int) -> tuple:
+    """
+    Decodes the postings of a term encoded by encode_term_postings.
+
+    Returns:
+        tuple: The keys and the term frequencies of the postings, as lists.
+    """
+    values = codec.decode(data, 3 * count)
+    if count <= SMALL_POSTINGS:
+        keys = []
+        xpath = docno = 0
+        for xpath_gap, doc_gap in zip(values[:count], values[count:2 * count]):
+            if xpath_gap or not keys:
+                xpath += xpath_gap
+                docno = doc_gap
+            else:
+                docno += doc_gap
+            keys.append((int(xpath) << DOC_BITS) | int(docno))
+        return keys, [int(tf) + 1 for tf in values[2 * count:]]
+
+    values = np.asarray(values, dtype=np.uint64)
+    xpath_gaps, doc_gaps, tfs = values[:count], values[count:2 * count], values[2 * count:] + np.uint64(1)
+
+    new_xpath = xpath_gaps != 0
+    new_xpath[:1] = True
+    xpath_starts = np.maximum.accumulate(np.where(new_xpath, np.arange(count), 0))
+    doc_sums = np.cumsum(doc_gaps)
+    docs = doc_sums - doc_sums[xpath_starts] + doc_gaps[xpath_starts]
+
+    keys = (np.cumsum(xpath_gaps) << np.uint64(DOC_BITS)) | docs
+    return keys.tolist(), tfs.tolist()
+
+
+class Postings:
+    def __init__(self) -> None:
+        """
+        Initializes the Postings class.
+        """
+        # The append-only buffers filled while parsing, one entry per (term, element)
+        self.buffer_terms = array('I')
+        self.buffer_docs = array('I')
+        self.buffer_xpaths = array('I')
+        self.buffer_tfs = array('I')
+
+        # The postings of the term id t are in [offsets[t], offsets[t + 1]), sorted by (XPath id, doc id)
+        self.offsets = array('Q', [0])
+        self.keys = array('Q')          # The posting keys: (xpath_id << 32) | doc_id
+        self.tfs = array('I')           # The term frequency of each posting
+
+        # The XPath ids of the term id t are in [xpath_offsets[t], xpath_offsets[t + 1]),
+        # in the order of their first occurrence
+        self.xpath_offsets = array('Q', [0])
+        self.xpath_order = array('I')
+        self.term_order = array('I')    # The term ids in the order of their first occurrence
+
+        # The codec of imported compressed postings and the last decoded term
+        self.codec = None
+        self.data_offsets = array('Q', [0])
+        self.postings_data = b''
+        self.decoded_term = None
+        self.decoded_postings = None
+
+    def add(self, term: int, docno: int, xpath: int, tf: int = 1) -> None:
+        """
+        Appends a posting to the buffers.
+
+        Args:
+            term (int): The term id.
+            docno (int): The document id.
+            xpath (int): The XPath id of the element.
+            tf (int, optional): The frequency of the term in the element. Defaults to 1.
+        """
+        self.buffer_terms.append(term)
+        self.buffer_docs.append(docno)
+        self.buffer_xpaths.append(xpath)
+        self.buffer_tfs.append(tf)
+
+    def buffers(self) -> tuple:
+        """
+        Returns the buffers of the postings appended since the last finalization.
+        """
+        return self.buffer_terms, self.buffer_docs, self.buffer_xpaths, self.buffer_tfs
+
+    def buffered_bytes(self) -> int:
+        """
+        Returns the memory used by the buffers, in bytes.
+        """
+        return sum(len(buffer) * buffer.itemsize for buffer in self.buffers())
+
+    def clear_buffers(self) -> None:
+        self.buffer_terms, self.buffer_docs, self.buffer_xpaths, self.buffer_tfs = array('I'), array('I'), array('I'), array('I')
+
+    def clear_decoded_postings(self) -> None:
+        """
+        Drops the last decoded term, its postings are decoded again when they are read, ex: to time the decoding.
+        """
+        self.decoded_term = None
+        self.decoded_postings = None
+
+    def extend(self, terms: np.ndarray, docnos: np.ndarray, xpaths: np.ndarray, tfs: np.ndarray) -> None:
+        """
+        Appends postings to the buffers, ex: the postings of a partial index.
+        """
+        self.buffer_terms.frombytes(terms.astype(np.uint32).tobytes())
+        self.buffer_docs.frombytes(docnos.astype(np.uint32).tobytes())
+        self.buffer_xpaths.frombytes(xpaths.astype(np.uint32).tobytes())
+        self.buffer_tfs.frombytes(tfs.astype(np.uint32).tobytes())
+
+    def finalize(self) -> None:
+        """
+        Sorts the buffers into the contiguous postings of each term.
+        The postings of an element indexed twice are merged by summing their frequencies.
+        """
+        if len(self.buffer_terms) == 0:
+            self.__init__()
+            return
+
+        self.build(*self.sorted_buffers())
+        self.clear_buffers()
+
+    def build(self, terms: np.ndarray, keys: np.ndarray, tfs: np.ndarray, positions: np.ndarray) -> None:
+        """
+        Builds the finalized arrays from postings sorted by sort_postings.
+        The positions order the occurrences: the terms and the XPaths of each term are kept in the order
+        of their first occurrence.
+        """
+        vocabulary_size = int(terms[-1]) + 1 if len(terms) else 0
+        term_counts, xpath_counts, xpath_order, first_positions = postings_structure(terms, keys, positions, 0, vocabulary_size)
+
+        self.offsets = _to_array('Q', np.concatenate(([0], np.cumsum(term_counts))))
+        self.keys = _to_array('Q', keys)
+        self.tfs = _to_array('I', tfs)
+        self.xpath_offsets = _to_array('Q', np.concatenate(([0], np.cumsum(xpath_counts))))
+        self.xpath_order = _to_array('I', xpath_order)
+        self.term_order = _to_array('I', term_order(term_counts, first_positions))
+
+    def sorted_buffers(self, first_position: int = 0) -> tuple:
+        """
+        Returns the postings of the buffers sorted by (term, key), see sort_postings.
+
+        Args:
+            first_position (int, optional): The position of the first posting of the buffers,
+                the positions order the occurrences across the buffers flushed to disk. Defaults to 0.
+        """
+        terms = np.frombuffer(self.buffer_terms, dtype=np.uint32)
+        docs = np.frombuffer(self.buffer_docs, dtype=np.uint32)
+        xpaths = np.frombuffer(self.buffer_xpaths, dtype=np.uint32)
+        tfs = np.frombuffer(self.buffer_tfs, dtype=np.uint32)
+
+        keys = (xpaths.astype(np.uint64) << np.uint64(DOC_BITS)) | docs
+        positions = np.arange(first_position, first_position + len(terms), dtype=np.uint64)
+        return sort_postings(terms, keys, tfs, positions)
+
+    def frequency(self, term: int, xpath: int, docno: int) -> int:
+        """
+        Returns the frequency of a term in a document at a specific XPath.
+
+        Args:
+            term (int): The term id.
+            xpath (int): The XPath id.
+            docno (int): The document id.
+
+        Returns:
+            int: The term frequency, 0 if the term does not occur in the element.
+        """
+        if term + 1 >= len(self.offsets):
+            return 0
+
+        keys, tfs, start, end = self.term_postings(term)
+        key = (xpath << DOC_BITS) | docno
+        position = bisect_left(keys, key, start, end)
+        if position < end and keys[position] == key:
+            return tfs[position]
+
+        return 0
+
+    def xpath_postings(self, term: int):
+        """
+        Yields the postings of a term grouped by XPath, in the order of their first occurrence.
+
+        Args:
+            term (int): The term id.
+
+        Yields:
+            tuple: The XPath id, the document ids and their term frequencies.
+        """
+        if term + 1 >= len(self.offsets):
+            return
+
+        keys, tfs, start, end = self.term_postings(term)
+        for xpath in self.xpath_order[self.xpath_offsets[term]:self.xpath_offsets[term + 1]]:
+            xpath_start = bisect_left(keys, xpath << DOC_BITS, start, end)
+            xpath_end = bisect_left(keys, (xpath + 1) << DOC_BITS, xpath_start, end)
+            yield xpath, [key & DOC_MASK for key in keys[xpath_start:xpath_end]], tfs[xpath_start:xpath_end]
+
+    def term_postings(self, term: int) -> tuple:
+        """
+        Returns the keys and the term frequencies holding the postings of a term, with their range.
+        Compressed postings are decoded, the last decoded term is kept.
+
+        Args:
+            term (int): The term id.
+
+        Returns:
+            tuple: The keys, the term frequencies, the start and the end of the postings of the term.
+        """
+        start, end = self.offsets[term], self.offsets[term + 1]
+        if self.codec is None:
+            return self.keys, self.tfs, start, end
+
+        if term != self.decoded_term:
+            data = self.postings_data[self.data_offsets[term]:self.data_offsets[term + 1]]
+            self.decoded_postings = decode_term_postings(self.codec, data, end - start)
+            self.decoded_term = term
+
+        keys, tfs = self.decoded_postings
+        return keys, tfs, 0, len(keys)
+
+    def all_postings(self) -> tuple:
+        """
+        Returns all the finalized postings, decoded if they are compressed.
+
+        Returns:
+            tuple: The term ids, the keys and the term frequencies of the postings, as NumPy arrays.
+        """
+        offsets = np.asarray(self.offsets, dtype=np.int64)
+        terms = np.repeat(np.arange(len(offsets) - 1, dtype=np.uint32), np.diff(offsets))
+        if self.codec is None:
+            return terms, np.asarray(self.keys, dtype=np.uint64), np.asarray(self.tfs, dtype=np.uint32)
+
+        keys, tfs = [], []
+        for term in range(len(offsets) - 1):
+            term_keys, term_tfs, _, _ = self.term_postings(term)
+            keys.extend(term_keys)
+            tfs.extend(term_tfs)
+
+        return terms, np.array(keys, dtype=np.uint64), np.array(tfs, dtype=np.uint32)
+
+    def first_occurrences(self, terms: np.ndarray, keys: np.ndarray, first_position: int = 0) -> np.ndarray:
+        """
+        Returns positions of the finalized postings ordering them as their first occurrences:
+        by the order of their term, then by the order of their XPath for the term (see build).
+
+        Args:
+            terms (np.ndarray): The term ids of the postings, see all_postings.
+            keys (np.ndarray): The keys of the postings.
+            first_position (int, optional): The position of the first term. Defaults to 0.
+        """
+        number_of_terms = len(self.offsets) - 1
+        term_ranks = np.zeros(number_of_terms, dtype=np.uint64)
+        term_ranks[np.asarray(self.term_order, dtype=np.int64)] = np.arange(len(self.term_order), dtype=np.uint64)
+
+        # The rank of each (term, XPath) among the XPaths of the term
+        xpath_offsets = np.asarray(self.xpath_offsets, dtype=np.int64)
+        xpath_counts = np.diff(xpath_offsets)
+        group_terms = np.repeat(np.arange(number_of_terms, dtype=np.int64), xpath_counts)
+        group_keys = (group_terms.astype(np.uint64) << np.uint64(DOC_BITS)) | np.asarray(self.xpath_order, dtype=np.uint64)
+        group_ranks = (np.arange(len(group_terms)) - xpath_offsets[group_terms]).astype(np.uint64)
+
+        sorter = np.argsort(group_keys)
+        posting_keys = (terms.astype(np.uint64) << np.uint64(DOC_BITS)) | (keys >> np.uint64(DOC_BITS))
+        posting_groups = sorter[np.searchsorted(group_keys, posting_keys, sorter=sorter)]
+
+        width = np.uint64(xpath_counts.max() + 1 if len(xpath_counts) else 1)
+        return np.uint64(first_position) + term_ranks[terms] * width + group_ranks[posting_groups]
+
+    def export_postings(self, codec: str = 'raw') -> dict:
+        """
+        Returns the finalized postings arrays by name, the postings of each term are encoded
+        with the codec unless it is 'raw'.
+
+        Args:
+            codec (str, optional): The name of the codec, see POSTINGS_CODECS. Defaults to 'raw'.
+        """
+        postings_data = {name: getattr(self, name) for name in POSTINGS_ARRAYS}
+        if codec == 'raw':
+            postings_data.update((name, getattr(self, name)) for name in RAW_POSTINGS_ARRAYS)
+            return postings_data
+
+        keys = np.frombuffer(self.keys, dtype=np.uint64)
+        tfs = np.frombuffer(self.tfs, dtype=np.uint32)
+        data_offsets = array('Q', [0])
+        encoded_postings = bytearray()
+        for term in range(len(self.offsets) - 1):
+            start, end = self.offsets[term], self.offsets[term + 1]
+            encoded_postings += encode_term_postings(CODECS[codec], keys[start:end], tfs[start:end])
+            data_offsets.append(len(encoded_postings))
+
+        postings_data['data_offsets'] = data_offsets
+        postings_data['postings_data'] = array('B', encoded_postings)
+        return postings_data
+
+    def import_postings(self, postings_data: dict, codec: str = 'raw') -> None:
+        """
+        Imports finalized postings exported by export_postings.
+        The arrays can be any sequence of integers, ex: the memoryviews of a memory-mapped index file,
+        the postings of a term are then only read (and decoded) when the term is accessed.
+        """
+        postings_arrays = RAW_POSTINGS_ARRAYS if codec == 'raw' else COMPRESSED_POSTINGS_ARRAYS
+        for name in list(POSTINGS_ARRAYS) + list(postings_arrays):
+            setattr(self, name, postings_data[name])
+
+        self.codec = None if codec == 'raw' else CODECS[codec]
+        self.decoded_term = None
+
+    def __contains__(self, term: int) -> bool:
+        return term + 1 < len(self.offsets) and self.offsets[term] < self.offsets[term + 1]
+
+    def __iter__(self):
+        return iter(self.term_order)
+
+    def __len__(self) -> int:
+        return len(self.term_order)
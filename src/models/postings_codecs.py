@@ -0,0 +1,149 @@
+import numpy as np
+
+"""
+    The codecs used to compress the postings of the binary index file.
+    A codec encodes a sequence of non-negative integers (the gaps and the frequencies of the postings
+    of a term, see Postings) into bytes and decodes them back.
+    The compressed postings are smaller but are decoded term by term when they are read, the raw postings
+    are read in place: the index files are written with the raw postings unless a codec is chosen.
+"""
+
+BLOCK_SIZE = 128    # Number of values of a block of the bit-packed codec
+SMALL_DATA = 256    # Below this number of bytes, the codecs decode without NumPy
+
+
+class PostingsCodec:
+    name = None
+
+    def encode(self, values) -> bytes:
+        """
+        Encodes a sequence of non-negative integers.
+        """
+        raise NotImplementedError("Subclasses must implement this method")
+
+    def decode(self, data, count: int):
+        """
+        Decodes the count integers encoded in data, as a list or a NumPy array.
+        """
+        raise NotImplementedError("Subclasses must implement this method")
+
+
+class VByteCodec(PostingsCodec):
+    """
+    Variable-byte codec: each integer is split into groups of 7 bits, least significant first,
+    one group per byte. The high bit marks the last byte of an integer.
+    """
+    name = 'vbyte'
+
+    def encode(self, values) -> bytes:
+        if len(values) < SMALL_DATA // 4:
+            data = bytearray()
+            for value in values:
+                value = int(value)
+                while value > 0x7F:
+                    data.append(value & 0x7F)
+                    value >>= 7
+                data.append(value | 0x80)
+            return bytes(data)
+
+        values = np.asarray(values, dtype=np.uint64)
+
+        number_of_bytes = np.ones(len(values), dtype=np.int64)
+        remaining = values >> np.uint64(7)
+        while remaining.any():
+            number_of_bytes += remaining > 0
+            remaining >>= np.uint64(7)
+
+        ends = np.cumsum(number_of_bytes)
+        starts = ends - number_of_bytes
+        data = np.zeros(int(ends[-1]), dtype=np.uint8)
+        for byte in range(int(number_of_bytes.max())):
+            selected = number_of_bytes > byte
+            data[starts[selected] + byte] = (values[selected] >> np.uint64(7 * byte)) & np.uint64(0x7F)
+
+        data[ends - 1] |= 0x80
+        return data.tobytes()
+
+    def decode(self, data, count: int):
+        if len(data) < SMALL_DATA:
+            # The NumPy calls cost more than a loop on the few bytes of a rare term
+            values = []
+            value = shift = 0
+            for byte in bytes(data):
+                value |= (byte & 0x7F) << shift
+                if byte & 0x80:
+                    values.append(value)
+                    value = shift = 0
+                else:
+                    shift += 7
+            return values
+
+        data = np.frombuffer(data, dtype=np.uint8)
+
+        ends = np.flatnonzero(data & 0x80)
+        starts = np.concatenate(([0], ends[:-1] + 1))
+        shifts = np.arange(len(data)) - np.repeat(starts, ends - starts + 1)
+
+        groups = (data & 0x7F).astype(np.uint64) << (shifts.astype(np.uint64) * np.uint64(7))
+        return np.add.reduceat(groups, starts)
+
+
+class BitPackCodec(PostingsCodec):
+    """
+    Block bit-packed codec: the integers are split into blocks of BLOCK_SIZE values, each block
+    stores its bit width on one byte followed by its values packed on that many bits.
+    """
+    name = 'bitpack'
+
+    def encode(self, values) -> bytes:
+        values = [int(value) for value in values]
+        blocks = []
+        for start in range(0, len(values), BLOCK_SIZE):
+            block = values[start:start + BLOCK_SIZE]
+            width = max(block).bit_length()
+            packed = 0
+            for i, value in enumerate(block):
+                packed |= value << (i * width)
+            blocks.append(bytes([width]))
+            blocks.append(packed.to_bytes((len(block) * width + 7) // 8, 'little'))
+
+        return b''.join(blocks)
+
+    def decode(self, data, count: int):
+        if len(data) < SMALL_DATA:
+            # A block is read as one integer, its values are then extracted with shifts
+            data = bytes(data)
+            values = []
+
+            position = 0
+            for start in range(0, count, BLOCK_SIZE):
+                block_size = min(BLOCK_SIZE, count - start)
+                width = data[position]
+                number_of_bytes = (block_size * width + 7) // 8
+                block = int.from_bytes(data[position + 1:position + 1 + number_of_bytes], 'little')
+                mask = (1 << width) - 1
+                values.extend((block >> (i * width)) & mask for i in range(block_size))
+                position += 1 + number_of_bytes
+
+            return values
+
+        # The bits of a block are unpacked at once, one row of width bits per value
+        data = np.frombuffer(data, dtype=np.uint8)
+        values = np.empty(count, dtype=np.uint64)
+
+        position = 0
+        for start in range(0, count, BLOCK_SIZE):
+            block_size = min(BLOCK_SIZE, count - start)
+            width = int(data[position])
+            number_of_bytes = (block_size * width + 7) // 8
+            bits = np.unpackbits(data[position + 1:position + 1 + number_of_bytes], bitorder='little')[:block_size * width]
+            powers = np.uint64(1) << np.arange(width, dtype=np.uint64)
+            values[start:start + block_size] = bits.reshape(block_size, width).astype(np.uint64) @ powers
+            position += 1 + number_of_bytes
+
+        return values
+
+
+# The codecs by name, 'raw' stores the postings arrays uncompressed
+CODECS = {codec.name: codec for codec in (VByteCodec(), BitPackCodec())}
+POSTINGS_CODECS = ['raw'] + list(CODECS)
@@ -0,0 +1,645 @@
+from array import array
+import contextlib
+import threading
+import json
+import math
+import os
+
+try:
+    import fcntl
+except ImportError:     # Windows
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+
+from models.dictionary import Dictionary
+from models.document_frequencies import (DocumentFrequencies, postings_document_frequencies, read_document_frequencies,
+                                         xpath_tag)
+from models.document_table import DOCUMENT_TABLE_ARRAYS
+from models.index_file import IndexFile, write_index_file
+from models.postings import (Postings, POSTINGS_ARRAYS, RAW_POSTINGS_ARRAYS, COMPRESSED_POSTINGS_ARRAYS,
+                             DOC_BITS, DOC_MASK, sort_postings)
+
+"""
+    The segments of an incremental index.
+    A segment is a binary index file (see index_file.py) holding the documents indexed at once, with its
+    own term, docno and XPath ids. The segments of a directory are listed in order by a manifest, new
+    documents are indexed into a new segment and the queries read all the segments through global ids,
+    given in the order of the segments so the index is the same as if the documents were indexed at once.
+    The deleted documents are marked by tombstones in the manifest: the postings of a deleted document are
+    skipped when the segments are read and removed when its segment is merged, the segments whose documents
+    are all deleted are dropped. A document indexed again replaces its previous versions.
+    The small segments are merged in the background (tiered merge policy, see select_merge).
+    The manifest is updated under a lock file of its directory, so several processes can index, delete
+    and merge the segments of the same directory.
+"""
+
+MANIFEST = 'segments.json'
+MANIFEST_LOCK = 'segments.lock'
+MERGE_FACTOR = 4                    # Number of segments of the same tier merged together
+MIN_SEGMENT_SIZE = 1024 * 1024      # The segments smaller than this size (in bytes) are in the first tier
+MAX_DELETED_RATIO = 0.2             # The segments with more deleted documents are compacted
+
+# Serializes the updates of the manifests by the threads of the process, the processes use the lock files
+_manifest_thread_lock = threading.Lock()
+_mergers = {}   # The running background merge of each directory
+
+
+@contextlib.contextmanager
+def manifest_lock(directory: str):
+    """
+    Serializes the updates of the manifest of a directory by the indexing and the background merges,
+    of this process and of the other processes: the lock file of the directory is locked exclusively.
+    """
+    with _manifest_thread_lock:
+        with open(os.path.join(directory, MANIFEST_LOCK), 'a+b') as file:
+            _lock_file(file)
+            try:
+                yield
+            finally:
+                _unlock_file(file)
+
+
+def _lock_file(file) -> None:
+    """
+    Locks a file exclusively, waits until it is unlocked by the other processes.
+    """
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+        return
+
+    file.seek(0)
+    while True:
+        try:
+            msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            pass    # LK_LOCK gives up after 10 seconds
+
+
+def _unlock_file(file) -> None:
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+    else:
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def write_segment(filename: str, parser_granularity: list, terms: list, docnos: list, xpaths: list,
+                  document_table: dict, document_frequencies: DocumentFrequencies, postings_sections: dict,
+                  postings_codec: str) -> None:
+    """
+    Writes an index to a binary index file.
+
+    Args:
+        filename (str): The filename of the index file.
+        parser_granularity (list): The granularity of the parser.
+        terms (list): The terms ordered by id, likewise for the docnos and the XPaths.
+        document_table (dict): The document-length table, see InvertedIndex.document_table.
+        document_frequencies (DocumentFrequencies): The document frequencies of the terms.
+        postings_sections (dict): The postings arrays, see Postings.export_postings.
+        postings_codec (str): The codec of the postings, see POSTINGS_CODECS.
+    """
+    sections = {
+        'metadata': {
+            'parser_granularity': parser_granularity,
+            'vocabulary_size': document_table['vocabulary_size'],
+            'postings_codec': postings_codec,
+        },
+        'terms': terms,
+        'docnos': docnos,
+        'xpaths': xpaths,
+        'tags': document_table['tags'],
+    }
+    sections.update(postings_sections)
+    sections.update((name, document_table[name]) for name in DOCUMENT_TABLE_ARRAYS)
+    sections.update(document_frequencies.sections(len(terms)))
+
+    write_index_file(filename, sections)
+
+
+class Segment:
+    def __init__(self, filename: str, deleted_docnos: list = ()) -> None:
+        """
+        Opens a binary index file, its arrays are memory-mapped.
+
+        Args:
+            filename (str): The filename of the index file.
+            deleted_docnos (list, optional): The deleted docnos of the segment. Defaults to ().
+        """
+        self.filename = filename
+        self.index_file = IndexFile(filename)
+        self.metadata = self.index_file.metadata()
+
+        self.terms = self.index_file.strings('terms')
+        self.docnos = self.index_file.strings('docnos')
+        self.xpaths = self.index_file.strings('xpaths')
+
+        postings_codec = self.metadata['postings_codec']
+        postings_arrays = dict(POSTINGS_ARRAYS)
+        postings_arrays.update(RAW_POSTINGS_ARRAYS if postings_codec == 'raw' else COMPRESSED_POSTINGS_ARRAYS)
+
+        self.postings = Postings()
+        self.postings.import_postings({
+            name: self.index_file.array(name, typecode) for name, typecode in postings_arrays.items()
+        }, postings_codec)
+
+        self.document_table = {
+            name: self.index_file.array(name, typecode) for name, typecode in DOCUMENT_TABLE_ARRAYS.items()
+        }
+        self.document_table['tags'] = self.index_file.strings('tags')
+        self.document_table['vocabulary_size'] = self.metadata['vocabulary_size']
+
+        # The live-docs flags: 1 for each live local doc id, 0 for the deleted ones
+        self.live_docs = bytearray(b'\x01') * len(self.docnos)
+        if deleted_docnos:
+            local_docnos = {docno: local_docno for local_docno, docno in enumerate(self.docnos)}
+            for docno in deleted_docnos:
+                self.live_docs[local_docnos[docno]] = 0
+
+    def document_frequencies(self) -> dict:
+        """
+        Returns the document frequencies by tag of the live documents, see DocumentFrequencies.by_tag.
+        The stored document frequencies are read without copying them when no document is deleted,
+        the postings of the deleted documents are otherwise subtracted from them.
+        """
+        if 'df_counts' not in self.index_file.sections:
+            # An index file written without the document frequencies
+            return self._postings_document_frequencies(is_live=1)
+
+        document_frequencies = read_document_frequencies(self.index_file, len(self.terms))
+        if 0 not in self.live_docs:
+            return document_frequencies
+
+        deleted = self._postings_document_frequencies(is_live=0)
+        return {tag: np.asarray(counts, dtype=np.int64) - deleted.get(tag, 0) for tag, counts in document_frequencies.items()}
+
+    def _postings_document_frequencies(self, is_live: int) -> dict:
+        """
+        Returns the document frequencies by tag of the postings of the live (or deleted) documents.
+        """
+        tags = Dictionary()
+        xpath_tags = [tags.add(xpath_tag(xpath)) for xpath in self.xpaths]
+
+        terms, keys, _ = self.postings.all_postings()
+        live_docs = np.frombuffer(self.live_docs, dtype=np.uint8)
+        selected = live_docs[(keys & np.uint64(DOC_MASK)).astype(np.int64)] == is_live
+        counts = postings_document_frequencies(terms[selected], keys[selected], xpath_tags, len(tags), len(self.terms))
+        return {tag: counts[tag_id] for tag_id, tag in enumerate(tags)}
+
+
+class SegmentedPostings:
+    def __init__(self, segments: list, terms: Dictionary, docnos: Dictionary, add_xpath) -> None:
+        """
+        Reads the term frequencies of several segments through global ids, see Postings.
+        The ids of the segments are added to the global dictionaries in the order of the segments,
+        the deleted documents have no global id (-1) and their postings are skipped.
+
+        Args:
+            segments (list): The segments, in order.
+            terms (Dictionary): The global terms, likewise for the docnos.
+            add_xpath: The function returning the global id of an XPath.
+        """
+        self.segments = segments
+
+        # The global id of each local id, per segment
+        self.term_maps = [[terms.add(term) for term in segment.terms] for segment in segments]
+        self.doc_maps = [[docnos.add(docno) if is_live else -1 for docno, is_live in zip(segment.docnos, segment.live_docs)]
+                         for segment in segments]
+        self.xpath_maps = [[add_xpath(xpath) for xpath in segment.xpaths] for segment in segments]
+
+        # The local id of each global id (-1 if the segment does not have it), per segment
+        self.local_terms = [_inverse(term_map, len(terms)) for term_map in self.term_maps]
+        number_of_xpaths = max((max(xpath_map) + 1 for xpath_map in self.xpath_maps if xpath_map), default=0)
+        self.local_xpaths = [_inverse(xpath_map, number_of_xpaths) for xpath_map in self.xpath_maps]
+
+        # The segment and the local id of each document
+        self.document_segments = [-1] * len(docnos)
+        self.local_docs = [-1] * len(docnos)
+        for segment, doc_map in enumerate(self.doc_maps):
+            for local_docno, docno in enumerate(doc_map):
+                if docno >= 0:
+                    self.document_segments[docno] = segment
+                    self.local_docs[docno] = local_docno
+
+        # The terms in the order of their first occurrence in the segments
+        self.term_order = list(dict.fromkeys(
+            term_map[term] for segment, term_map in zip(segments, self.term_maps) for term in segment.postings))
+
+    def frequency(self, term: int, xpath: int, docno: int) -> int:
+        """
+        Returns the frequency of a term in a document at a specific XPath, see Postings.frequency.
+        """
+        if docno >= len(self.document_segments) or self.document_segments[docno] < 0:
+            return 0
+
+        segment = self.document_segments[docno]
+        local_terms, local_xpaths = self.local_terms[segment], self.local_xpaths[segment]
+        if term >= len(local_terms) or xpath >= len(local_xpaths) or local_terms[term] < 0 or local_xpaths[xpath] < 0:
+            return 0
+
+        return self.segments[segment].postings.frequency(local_terms[term], local_xpaths[xpath], self.local_docs[docno])
+
+    def xpath_postings(self, term: int):
+        """
+        Yields the postings of a term grouped by XPath, see Postings.xpath_postings.
+        The XPaths are in the order of their first occurrence in the segments.
+        """
+        groups = {}
+        for segment, local_terms in enumerate(self.local_terms):
+            if term >= len(local_terms) or local_terms[term] < 0:
+                continue
+
+            doc_map, xpath_map = self.doc_maps[segment], self.xpath_maps[segment]
+            has_deleted_docs = 0 in self.segments[segment].live_docs
+            for xpath, docnos, tfs in self.segments[segment].postings.xpath_postings(local_terms[term]):
+                if has_deleted_docs:
+                    live_postings = [(doc_map[docno], tf) for docno, tf in zip(docnos, tfs) if doc_map[docno] >= 0]
+                    if not live_postings:
+                        continue
+                    docnos, tfs = zip(*live_postings)
+                else:
+                    docnos = [doc_map[docno] for docno in docnos]
+
+                group_docnos, group_tfs = groups.setdefault(xpath_map[xpath], ([], []))
+                group_docnos.extend(docnos)
+                group_tfs.extend(tfs)
+
+        for xpath, (docnos, tfs) in groups.items():
+            yield xpath, docnos, tfs
+
+    def __contains__(self, term: int) -> bool:
+        return any(term < len(local_terms) and local_terms[term] >= 0 and local_terms[term] in segment.postings
+                   for segment, local_terms in zip(self.segments, self.local_terms))
+
+    def __iter__(self):
+        return iter(self.term_order)
+
+    def __len__(self) -> int:
+        return len(self.term_order)
+
+
+def _inverse(id_map: list, size: int) -> list:
+    """
+    Returns the local id of each global id of a segment, -1 for the ids the segment does not have.
+    """
+    local_ids = [-1] * size
+    for local_id, global_id in enumerate(id_map):
+        local_ids[global_id] = local_id
+
+    return local_ids
+
+
+def merge_document_tables(segmented_postings: SegmentedPostings, number_of_documents: int) -> dict:
+    """
+    Returns the document-length table of the segments, keyed by the global ids.
+
+    Args:
+        segmented_postings (SegmentedPostings): The segments and their global ids.
+        number_of_documents (int): The number of global document ids.
+
+    Returns:
+        dict: The arrays of DOCUMENT_TABLE_ARRAYS, 'tags' and 'vocabulary_size'.
+    """
+    tags = Dictionary()
+    columns = {name: [] for name in DOCUMENT_TABLE_ARRAYS}
+    distinct_terms = np.zeros(number_of_documents, dtype=np.uint32)
+    vocabulary = [np.zeros(0, dtype=np.int64)]
+
+    for segment, doc_map, term_map in zip(segmented_postings.segments, segmented_postings.doc_maps, segmented_postings.term_maps):
+        table = segment.document_table
+        doc_map, term_map = np.array(doc_map, dtype=np.int64), np.array(term_map, dtype=np.int64)
+        tag_map = np.array([tags.add(tag) for tag in table['tags']], dtype=np.int64)
+
+        # The records of the deleted documents are skipped
+        element_docs = doc_map[np.asarray(table['element_docs'], dtype=np.int64)]
+        is_live = element_docs >= 0
+        columns['element_docs'].append(element_docs[is_live])
+        columns['element_tags'].append(tag_map[np.asarray(table['element_tags'], dtype=np.int64)][is_live])
+        columns['element_lengths'].append(np.asarray(table['element_lengths'], dtype=np.uint64)[is_live])
+        columns['element_counts'].append(np.asarray(table['element_counts'], dtype=np.uint32)[is_live])
+
+        live_docs = np.flatnonzero(doc_map[:len(table['distinct_terms'])] >= 0)
+        distinct_terms[doc_map[live_docs]] = np.asarray(table['distinct_terms'], dtype=np.uint32)[live_docs]
+        vocabulary.append(term_map[np.asarray(table['vocabulary'], dtype=np.int64)])
+
+    merged_table = {
+        name: array(typecode, np.concatenate(columns[name]).tolist() if columns[name] else [])
+        for name, typecode in DOCUMENT_TABLE_ARRAYS.items() if name.startswith('element_')
+    }
+    merged_table['distinct_terms'] = array('I', distinct_terms.tolist())
+    merged_table['vocabulary'] = array('I', np.unique(np.concatenate(vocabulary)).tolist())
+    merged_table['tags'] = tags.keys
+    merged_table['vocabulary_size'] = len(merged_table['vocabulary'])
+    return merged_table
+
+
+def merge_document_frequencies(segmented_postings: SegmentedPostings, vocabulary_size: int,
+                               tags: Dictionary = None) -> DocumentFrequencies:
+    """
+    Returns the document frequencies of the live documents of the segments, keyed by the global ids.
+
+    Args:
+        segmented_postings (SegmentedPostings): The segments and their global ids.
+        vocabulary_size (int): The number of global term ids.
+        tags (Dictionary, optional): The tag ids. Defaults to a new dictionary.
+
+    Returns:
+        DocumentFrequencies: The document frequencies of the segments.
+    """
+    document_frequencies = DocumentFrequencies(tags)
+    for segment, term_map in zip(segmented_postings.segments, segmented_postings.term_maps):
+        document_frequencies.merge(segment.document_frequencies(), term_map, vocabulary_size)
+
+    return document_frequencies
+
+
+def merge_segments(segments: list, filename: str, postings_codec: str) -> None:
+    """
+    Merges segments into a new segment file, with the ids they have when they are read together.
+    The deleted documents are removed.
+
+    Args:
+        segments (list): The segments to merge, in order.
+        filename (str): The filename of the merged segment.
+        postings_codec (str): The codec of the postings, see POSTINGS_CODECS.
+    """
+    terms, docnos, xpaths = Dictionary(), Dictionary(), Dictionary()
+    segmented_postings = SegmentedPostings(segments, terms, docnos, xpaths.add)
+
+    merged_postings = []
+    first_position = 0
+    for segment, term_map, doc_map, xpath_map in zip(segments, segmented_postings.term_maps,
+                                                     segmented_postings.doc_maps, segmented_postings.xpath_maps):
+        local_terms, local_keys, tfs = segment.postings.all_postings()
+        positions = segment.postings.first_occurrences(local_terms, local_keys, first_position)
+        first_position = int(positions.max()) + 1 if len(positions) else first_position
+
+        xpath_ids = np.array(xpath_map, dtype=np.uint64)[(local_keys >> np.uint64(DOC_BITS)).astype(np.int64)]
+        doc_ids = np.array(doc_map, dtype=np.int64)[(local_keys & np.uint64(DOC_MASK)).astype(np.int64)]
+        is_live = doc_ids >= 0
+        merged_postings.append((np.array(term_map, dtype=np.uint32)[local_terms.astype(np.int64)][is_live],
+                                (xpath_ids[is_live] << np.uint64(DOC_BITS)) | doc_ids[is_live].astype(np.uint64),
+                                tfs[is_live], positions[is_live]))
+
+    postings = Postings()
+    terms_postings = [np.concatenate(arrays) for arrays in zip(*merged_postings)]
+    if len(terms_postings[0]):
+        postings.build(*sort_postings(*terms_postings))
+
+    document_table = merge_document_tables(segmented_postings, len(docnos))
+    document_frequencies = merge_document_frequencies(segmented_postings, len(terms))
+    write_segment(filename, segments[0].metadata['parser_granularity'], terms.keys, docnos.keys, xpaths.keys,
+                  document_table, document_frequencies, postings.export_postings(postings_codec), postings_codec)
+
+
+def read_manifest(directory: str) -> dict:
+    """
+    Returns the manifest of the segments of a directory, empty if the directory has no segments.
+    The manifest lists the segments in order, each with its filename, size and the zip members it holds.
+    """
+    try:
+        with open(os.path.join(directory, MANIFEST), 'r') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {'parser_granularity': None, 'next_segment': 0, 'segments': []}
+
+
+def write_manifest(directory: str, manifest: dict) -> None:
+    """
+    Replaces the manifest of a directory, the readers see either the previous or the new manifest.
+    """
+    filename = os.path.join(directory, MANIFEST)
+    with open(filename + '.tmp', 'w') as file:
+        json.dump(manifest, file, indent=4)
+    os.replace(filename + '.tmp', filename)
+
+
+def indexed_members(manifest: dict, collection: str) -> set:
+    """
+    Returns the members of a collection held by the segments, or by the dropped segments whose documents were all deleted.
+    """
+    return {member for segment in manifest['segments'] for member in segment['members'].get(collection, [])} | \
+        set(manifest.get('dropped_members', {}).get(collection, []))
+
+
+def reserve_segment(directory: str) -> str:
+    """
+    Returns the filename of a new segment of a directory.
+    """
+    with manifest_lock(directory):
+        manifest = read_manifest(directory)
+        filename = f"segment_{manifest['next_segment']}.idx"
+        manifest['next_segment'] += 1
+        write_manifest(directory, manifest)
+
+    return filename
+
+
+def add_segment(directory: str, filename: str, collection: str, members: list, docnos: list, parser_granularity: list) -> None:
+    """
+    Appends a segment written in a directory to its manifest.
+    The documents of the segment replace their versions in the previous segments, which are deleted.
+
+    Raises:
+        ValueError: If the segments of the directory have another granularity.
+    """
+    with manifest_lock(directory):
+        manifest = read_manifest(directory)
+        if manifest['parser_granularity'] not in (None, parser_granularity):
+            raise ValueError(f"The segments of '{directory}' have the granularity {manifest['parser_granularity']}")
+
+        manifest['parser_granularity'] = parser_granularity
+        _mark_deleted(directory, manifest['segments'], docnos)
+        manifest['segments'].append({
+            'filename': filename,
+            'size': os.path.getsize(os.path.join(directory, filename)),
+            'documents': len(docnos),
+            'docnos': list(docnos),
+            'deleted': [],
+            'members': {collection: members},
+        })
+        write_manifest(directory, manifest)
+
+
+def delete_documents(directory: str, docnos: list) -> list:
+    """
+    Deletes documents from the segments of a directory: they are marked in the manifest and
+    removed when their segment is merged.
+
+    Returns:
+        list: The deleted docnos, the other docnos are not in the segments.
+    """
+    with manifest_lock(directory):
+        manifest = read_manifest(directory)
+        deleted = _mark_deleted(directory, manifest['segments'], docnos)
+        write_manifest(directory, manifest)
+
+    return deleted
+
+
+def _mark_deleted(directory: str, segments: list, docnos: list) -> list:
+    """
+    Adds the live docnos of each segment to its deleted docnos. The docnos of the segments are listed
+    by the manifest, the segments of the manifests written before are read.
+    """
+    docnos = set(docnos)
+    deleted = []
+    for segment in segments:
+        if 'docnos' not in segment:
+            segment['docnos'] = list(IndexFile(os.path.join(directory, segment['filename'])).strings('docnos'))
+        segment_docnos = set(segment['docnos'])
+        new_deleted = sorted((docnos & segment_docnos) - set(segment.get('deleted', [])))
+        if new_deleted:
+            segment['deleted'] = segment.get('deleted', []) + new_deleted
+            deleted.extend(new_deleted)
+
+    return deleted
+
+
+def is_deleted(segment: dict) -> bool:
+    """
+    Returns True if all the documents of a segment of the manifest are deleted.
+    """
+    return 'documents' in segment and len(segment.get('deleted', [])) >= segment['documents']
+
+
+def remove_unreferenced_segments(directory: str) -> None:
+    """
+    Removes the segment files that were merged, they are kept until then as they may still be read.
+    """
+    with manifest_lock(directory):
+        manifest = read_manifest(directory)
+        referenced = {segment['filename'] for segment in manifest['segments']}
+        for filename in os.listdir(directory):
+            if filename.startswith('segment_') and filename.endswith('.idx') and filename not in referenced:
+                try:
+                    os.remove(os.path.join(directory, filename))
+                except OSError:
+                    pass    # Still memory-mapped, ex: on Windows
+
+
+def select_merge(segments: list) -> tuple:
+    """
+    Returns the range of the segments to merge: the first MERGE_FACTOR consecutive segments of the same tier,
+    a tier holding the segments whose size is within a factor MERGE_FACTOR. Only consecutive segments are
+    merged so the order of the documents is kept. Otherwise, the first segment with more than
+    MAX_DELETED_RATIO deleted documents is compacted alone.
+
+    Returns:
+        tuple: The start and the end of the range, None if no segments need to be merged.
+    """
+    tiers = [int(math.log(max(segment['size'], MIN_SEGMENT_SIZE) / MIN_SEGMENT_SIZE, MERGE_FACTOR)) for segment in segments]
+    for start in range(len(tiers) - MERGE_FACTOR + 1):
+        if len(set(tiers[start:start + MERGE_FACTOR])) == 1:
+            return start, start + MERGE_FACTOR
+
+    for start, segment in enumerate(segments):
+        if len(segment.get('deleted', [])) > MAX_DELETED_RATIO * segment.get('documents', 0):
+            return start, start + 1
+
+    return None
+
+
+class SegmentMerger(threading.Thread):
+    def __init__(self, directory: str) -> None:
+        """
+        Merges the segments of a directory in the background until the merge policy is satisfied.
+        The merged segments use the postings codec of the last segment they merge.
+        The thread is not a daemon: the program waits for the running merge before exiting.
+
+        Args:
+            directory (str): The directory of the segments.
+        """
+        super().__init__(name=f'SegmentMerger({directory})')
+        self.directory = directory
+
+    def run(self) -> None:
+        while self.merge():
+            pass
+
+    def merge(self) -> bool:
+        """
+        Merges the segments selected by the merge policy. The segments whose documents are all deleted
+        are dropped instead of being merged into an empty segment.
+
+        Returns:
+            bool: False if no segments needed to be merged.
+        """
+        with manifest_lock(self.directory):
+            manifest = read_manifest(self.directory)
+            selected = select_merge(manifest['segments'])
+        if selected is None:
+            return False
+
+        start, end = selected
+        merged_entries = manifest['segments'][start:end]
+        if all(is_deleted(entry) for entry in merged_entries):
+            self.replace(merged_entries)
+            return True
+
+        merged_filename = reserve_segment(self.directory)
+        segments = [Segment(os.path.join(self.directory, entry['filename']), entry.get('deleted', [])) for entry in merged_entries]
+        merge_segments(segments, os.path.join(self.directory, merged_filename), segments[-1].metadata['postings_codec'])
+        self.replace(merged_entries, merged_filename)
+
+        return True
+
+    def replace(self, merged_entries: list, merged_filename: str = None) -> None:
+        """
+        Replaces merged segments by their merged segment in the manifest, or removes them without a merged segment.
+        """
+        members = {}
+        for entry in merged_entries:
+            for collection, collection_members in entry['members'].items():
+                members.setdefault(collection, []).extend(collection_members)
+
+        with manifest_lock(self.directory):
+            # The segments are only removed by the merges, another process may have merged them meanwhile
+            manifest = read_manifest(self.directory)
+            filenames = [segment['filename'] for segment in manifest['segments']]
+            merged_filenames = [entry['filename'] for entry in merged_entries]
+            start = filenames.index(merged_filenames[0]) if merged_filenames[0] in filenames else -1
+            if start < 0 or filenames[start:start + len(merged_entries)] != merged_filenames:
+                if merged_filename is not None:
+                    os.remove(os.path.join(self.directory, merged_filename))
+                return
+            current_entries = manifest['segments'][start:start + len(merged_entries)]
+
+            if merged_filename is None:
+                # The members of the dropped segments are kept by the manifest, so they are not indexed again
+                for collection, collection_members in members.items():
+                    manifest.setdefault('dropped_members', {}).setdefault(collection, []).extend(collection_members)
+                manifest['segments'][start:start + len(merged_entries)] = []
+                write_manifest(self.directory, manifest)
+                return
+
+            # The documents deleted while merging (appended to the deleted docnos) are deleted from the merged segment
+            deleted = [docno for entry, current_entry in zip(merged_entries, current_entries)
+                       for docno in current_entry.get('deleted', [])[len(entry.get('deleted', [])):]]
+            docnos = list(IndexFile(os.path.join(self.directory, merged_filename)).strings('docnos'))
+            manifest['segments'][start:start + len(merged_entries)] = [{
+                'filename': merged_filename,
+                'size': os.path.getsize(os.path.join(self.directory, merged_filename)),
+                'documents': len(docnos),
+                'docnos': docnos,
+                'deleted': deleted,
+                'members': members,
+            }]
+            write_manifest(self.directory, manifest)
+
+
+def merge_in_background(directory: str) -> SegmentMerger:
+    """
+    Starts the background merge of the segments of a directory, unless it is already running.
+
+    Returns:
+        SegmentMerger: The running merge.
+    """
+    merger = _mergers.get(directory)
+    if merger is None or not merger.is_alive():
+        merger = _mergers[directory] = SegmentMerger(directory)
+        merger.start()
+
+    return merger
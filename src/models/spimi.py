@@ -0,0 +1,138 @@
+from pathlib import Path
+
+import numpy as np
+
+from models.postings import sort_postings, postings_structure, term_order, encode_term_postings
+from models.postings_codecs import CODECS
+
+"""
+    The blocks of the single-pass in-memory indexing (SPIMI).
+    When the postings buffered while parsing exceed the memory budget, they are sorted by (term, key)
+    and written to a block: the offsets of each term, the keys, the term frequencies and the positions
+    of the postings (see Postings). The blocks are then merged by ranges of terms into the postings
+    sections of the index file.
+"""
+
+BLOCK_ARRAYS = ('offsets', 'keys', 'tfs', 'positions')
+MERGED_POSTING_BYTES = 64   # Memory used to merge one posting (the arrays and the sort)
+
+
+def write_block(directory: str, terms: np.ndarray, keys: np.ndarray, tfs: np.ndarray, positions: np.ndarray) -> str:
+    """
+    Writes sorted postings to a new block of the directory.
+
+    Returns:
+        str: The path of the block.
+    """
+    path = Path(directory) / f'block_{len(list(Path(directory).glob("block_*")))}'
+    path.mkdir()
+
+    offsets = np.concatenate(([0], np.cumsum(np.bincount(terms, minlength=int(terms[-1]) + 1 if len(terms) else 0))))
+    np.save(path / 'offsets.npy', offsets.astype(np.uint64))
+    np.save(path / 'keys.npy', keys)
+    np.save(path / 'tfs.npy', tfs.astype(np.uint32))
+    np.save(path / 'positions.npy', positions)
+
+    return str(path)
+
+
+def read_block(path: str) -> dict:
+    """
+    Opens the arrays of a block with mmap.
+    """
+    return {name: np.load(Path(path) / f'{name}.npy', mmap_mode='r') for name in BLOCK_ARRAYS}
+
+
+def _term_range(block: dict, first_term: int, last_term: int) -> tuple:
+    """
+    Returns the terms, keys, term frequencies and positions of the postings of a block in [first_term, last_term).
+    """
+    offsets = block['offsets']
+    last_term = min(last_term, len(offsets) - 1)
+    if first_term >= last_term:
+        return None
+
+    start, end = int(offsets[first_term]), int(offsets[last_term])
+    terms = np.repeat(np.arange(first_term, last_term, dtype=np.uint32), np.diff(offsets[first_term:last_term + 1]).astype(np.int64))
+    return terms, np.asarray(block['keys'][start:end]), np.asarray(block['tfs'][start:end]), np.asarray(block['positions'][start:end])
+
+
+def merge_blocks(block_paths: list, directory: str, vocabulary_size: int, postings_codec: str, memory_budget: int) -> dict:
+    """
+    Merges the blocks into the postings sections of the index file.
+    The terms are merged by ranges holding at most the postings fitting in the memory budget,
+    the large sections are written to files of the directory.
+
+    Args:
+        block_paths (list): The paths of the blocks, in the order they were written.
+        directory (str): The directory of the merged sections.
+        vocabulary_size (int): The number of term ids.
+        postings_codec (str): The codec of the postings, see POSTINGS_CODECS.
+        memory_budget (int): The memory budget in megabytes.
+
+    Returns:
+        dict: The postings sections by name, arrays or paths of the files holding them.
+    """
+    blocks = [read_block(path) for path in block_paths]
+
+    # The number of postings of each term in all the blocks (an upper bound of the merged postings)
+    block_counts = np.zeros(vocabulary_size + 1, dtype=np.int64)
+    for block in blocks:
+        block_counts[1:len(block['offsets'])] += np.diff(block['offsets']).astype(np.int64)
+    cumulated_counts = np.cumsum(block_counts)
+
+    postings_per_range = max(1, int(memory_budget * 1024 * 1024) // MERGED_POSTING_BYTES)
+    boundaries = [0]
+    while boundaries[-1] < vocabulary_size:
+        last_term = int(np.searchsorted(cumulated_counts, cumulated_counts[boundaries[-1]] + postings_per_range, side='right')) - 1
+        boundaries.append(min(vocabulary_size, max(last_term, boundaries[-1] + 1)))
+
+    term_counts = np.zeros(vocabulary_size, dtype=np.int64)
+    xpath_counts = np.zeros(vocabulary_size, dtype=np.int64)
+    first_positions = np.zeros(vocabulary_size, dtype=np.uint64)
+    data_offsets = [0]
+
+    paths = {name: Path(directory) / f'{name}.bin' for name in ('xpath_order', 'keys', 'tfs', 'postings_data')}
+    files = {name: open(path, 'wb') for name, path in paths.items()}
+    try:
+        for first_term, last_term in zip(boundaries[:-1], boundaries[1:]):
+            parts = [part for part in (_term_range(block, first_term, last_term) for block in blocks) if part is not None]
+            terms, keys, tfs, positions = (np.concatenate(arrays) for arrays in zip(*parts)) if parts else \
+                (np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.uint64))
+            if len(terms):
+                terms, keys, tfs, positions = sort_postings(terms, keys, tfs, positions)
+
+            counts, range_xpath_counts, xpath_order, range_first_positions = postings_structure(terms, keys, positions, first_term, last_term)
+            term_counts[first_term:last_term] = counts
+            xpath_counts[first_term:last_term] = range_xpath_counts
+            first_positions[first_term:last_term] = range_first_positions
+            files['xpath_order'].write(xpath_order.astype(np.uint32).tobytes())
+
+            if postings_codec == 'raw':
+                files['keys'].write(keys.astype(np.uint64).tobytes())
+                files['tfs'].write(tfs.astype(np.uint32).tobytes())
+                continue
+
+            term_offsets = np.concatenate(([0], np.cumsum(counts)))
+            for start, end in zip(term_offsets[:-1], term_offsets[1:]):
+                encoded_postings = encode_term_postings(CODECS[postings_codec], keys[start:end], tfs[start:end])
+                files['postings_data'].write(encoded_postings)
+                data_offsets.append(data_offsets[-1] + len(encoded_postings))
+    finally:
+        for file in files.values():
+            file.close()
+
+    sections = {
+        'offsets': np.concatenate(([0], np.cumsum(term_counts))).astype(np.uint64),
+        'xpath_offsets': np.concatenate(([0], np.cumsum(xpath_counts))).astype(np.uint64),
+        'xpath_order': paths['xpath_order'],
+        'term_order': term_order(term_counts, first_positions).astype(np.uint32),
+    }
+    if postings_codec == 'raw':
+        sections['keys'] = paths['keys']
+        sections['tfs'] = paths['tfs']
+    else:
+        sections['data_offsets'] = np.array(data_offsets, dtype=np.uint64)
+        sections['postings_data'] = paths['postings_data']
+
+    return sections
@@ -1,15 +1,38 @@
-import pandas as pd
+from models.index_file import IndexFile, write_index_file
+
+import numpy as np
 import json
 
+"""
+    This class computes the statistics of the collection from the document-length table, in a single
+    pass over its typed arrays (see DocumentTable):
+    - the length of each document for each tag, one row of doc-id-indexed lengths per tag id,
+    - the statistics of each tag (number of elements, total length, average length and number of
+      distinct terms), a structured array indexed by tag id (see TAG_STATISTICS),
+    - the number of distinct terms of each document and their average.
+    The avdl_df DataFrame is only built to export the statistics.
+    The statistics can be written to a binary index file (see index_file.py) and read back memory-mapped,
+    ex: by the worker processes of a grid search sharing one copy of them.
+"""
+
+TAG_STATISTICS = np.dtype([
+    ('N', np.int64),                # The number of elements of the tag
+    ('total_length', np.int64),     # The number of terms of the elements of the tag
+    ('avdl', np.float64),           # The average length of the elements of the tag
+    ('distinct_terms', np.int64),   # The number of distinct terms of the elements of the tag
+])
+
 
 class Statistics:
-    def __init__(self, inverted_index, export_statistics: bool = False) -> None:
+    def __init__(self, inverted_index, export_statistics: bool = False, statistics_file: str = None) -> None:
         """
         Initializes the Statistics class.
 
         Args:
             inverted_index (object): Object class containing data about IDX, TF ect..
             export_statistics (bool, optional): Flag to export statistics. Defaults to False.
+            statistics_file (str, optional): The statistics file read instead of computing the statistics,
+                see write_statistics_file. Defaults to None.
         """
         self.RESOURCES_FOLDER = '../docs/resources/'  # Resources folder to save the stats
 
@@ -18,104 +41,177 @@ class Statistics:
         self.collection_frequency_of_terms = 0     # Number of times a term appears in the collection
         self.indexing_time = 0                     # Time to index the collection
 
-        # Dataframe to store the average document length and document length of each XPath and document
-        self.avdl_df = pd.DataFrame(columns=['XPath', 'N', 'avdl', 'number_of_words'])
-        self.document_lengths = {}          # {docno: {XPath: dl}}
-        self.distinct_terms_in_document = {}  # {docno: distinct_terms}
+        self.tags = []                  # The tag of each tag id, ex: ['article', 'p']
+        self.tag_ids = {}               # The id of each tag
+        self.tag_statistics = np.zeros(0, dtype=TAG_STATISTICS)     # The statistics of each tag id
+        self.document_lengths = np.zeros((0, 0), dtype=np.float64)  # The length of each (tag id, document id)
+        self.distinct_terms_in_document = np.zeros(0, dtype=np.int64)  # The number of distinct terms of each document id
         self.avg_distinct_terms_in_document = 0  # Average distinct terms in the document
 
         self.export_statistics = export_statistics
         self.inverted_index = inverted_index
 
-        self.compute_statistics()
+        if statistics_file is not None:
+            self.read_statistics_file(statistics_file)
+        else:
+            self.compute_statistics()
         if self.export_statistics:
             self.export_stats()
 
-    def _compute_document_length(self, docno, x_path, number_of_words):
+    def compute_statistics(self):
         """
-        Computes the document length of the document.
-
-        Args:
-            docno (str): Document number.
-            x_path (str): XPath of the document.
-            number_of_words (int): Number of words in the document.
+        Computes the statistics for the parsed documents.
         """
-        if docno not in self.document_lengths:
-            self.document_lengths[docno] = {x_path: number_of_words}
-        else:
-            if x_path not in self.document_lengths[docno]:
-                self.document_lengths[docno][x_path] = number_of_words
+        document_table = self.inverted_index.document_table()
+        self.tags = list(document_table['tags'])
+        self.tag_ids = {tag: tag_id for tag_id, tag in enumerate(self.tags)}
+
+        docs = np.asarray(document_table['element_docs'], dtype=np.int64)
+        tags = np.asarray(document_table['element_tags'], dtype=np.int64)
+        lengths = np.asarray(document_table['element_lengths'], dtype=np.int64)
+        counts = np.asarray(document_table['element_counts'], dtype=np.int64)
+        self.distinct_terms_in_document = np.asarray(document_table['distinct_terms'], dtype=np.int64)
+
+        number_of_tags = len(self.tags)
+        number_of_documents = max(len(self.distinct_terms_in_document), int(docs.max()) + 1 if len(docs) else 0)
+
+        # The length of a tag is counted twice when the document already has a record of another tag,
+        # the lengths of the records of the same (document, tag) add up
+        first_documents = np.zeros(len(docs), dtype=bool)
+        first_documents[np.unique(docs, return_index=True)[1]] = True
+        first_tags = np.zeros(len(docs), dtype=bool)
+        first_tags[np.unique(tags * number_of_documents + docs, return_index=True)[1]] = True
+        self.document_lengths = np.zeros((number_of_tags, number_of_documents), dtype=np.float64)
+        np.add.at(self.document_lengths, (tags, docs), lengths * (1 + (first_tags & ~first_documents)))
+
+        self.tag_statistics = np.zeros(number_of_tags, dtype=TAG_STATISTICS)
+        self.tag_statistics['N'] = np.bincount(tags, weights=counts, minlength=number_of_tags)
+        self.tag_statistics['total_length'] = np.bincount(tags, weights=lengths, minlength=number_of_tags)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.tag_statistics['avdl'] = self.tag_statistics['total_length'] / self.tag_statistics['N']
+        self.tag_statistics['distinct_terms'] = [self._distinct_terms_in_tag(tag) for tag in self.tags]
+
+        self.collection_vocabulary_sizes = document_table['vocabulary_size']
+        if len(self.distinct_terms_in_document):
+            self.avg_distinct_terms_in_document = int(self.distinct_terms_in_document.sum()) / len(self.distinct_terms_in_document)
 
-            self.document_lengths[docno][x_path] += number_of_words
+        # self.collection_frequency_of_terms = sum(list(self.collection_frequencies.values()))
 
-    def _compute_average_document_length(self, x_path, n, number_of_words):
+    def write_statistics_file(self, filename: str) -> None:
+        """
+        Writes the statistics to a binary index file, see read_statistics_file.
+        """
+        write_index_file(filename, {
+            'metadata': {
+                'tags': self.tags,
+                'documents': self.document_lengths.shape[1],
+                'vocabulary_size': self.collection_vocabulary_sizes,
+                'avg_distinct_terms': self.avg_distinct_terms_in_document,
+            },
+            'tag_statistics': np.ascontiguousarray(self.tag_statistics),
+            'lengths': np.ascontiguousarray(self.document_lengths),
+            'distinct_terms': np.ascontiguousarray(self.distinct_terms_in_document, dtype=np.int64),
+        })
+
+    def read_statistics_file(self, filename: str) -> None:
+        """
+        Reads the statistics of a statistics file, see write_statistics_file.
+        The file is memory-mapped, the arrays are read-only views of it.
         """
-        Computes the average document length.
+        self.statistics_file = IndexFile(filename)
+        metadata = self.statistics_file.metadata()
+
+        self.tags = metadata['tags']
+        self.tag_ids = {tag: tag_id for tag_id, tag in enumerate(self.tags)}
+        self.tag_statistics = np.frombuffer(self.statistics_file.raw('tag_statistics'), dtype=TAG_STATISTICS)
+        self.document_lengths = np.frombuffer(self.statistics_file.raw('lengths'), dtype=np.float64).reshape(
+            len(self.tags), metadata['documents'])
+        self.distinct_terms_in_document = np.frombuffer(self.statistics_file.raw('distinct_terms'), dtype=np.int64)
+        self.collection_vocabulary_sizes = metadata['vocabulary_size']
+        self.avg_distinct_terms_in_document = metadata['avg_distinct_terms']
+
+    def _distinct_terms_in_tag(self, tag: str) -> int:
+        """
+        Returns the number of terms with a document frequency in the elements of a tag.
+        """
+        document_frequencies = self.inverted_index.DF
+        tag_id = document_frequencies.tags.get(tag)
+        if tag_id is None or tag_id >= len(document_frequencies.counts):
+            return 0
 
-        Args:
-            x_path (str): XPath of the document.
-            n (int): Number of documents.
-            number_of_words (int): Number of words in the document.
-        """
-        if x_path in self.avdl_df['XPath'].values:
-            self.avdl_df.loc[self.avdl_df['XPath'] == x_path, 'N'] += n
-            self.avdl_df.loc[
-                self.avdl_df['XPath'] == x_path, 'number_of_words'] += number_of_words
-        else:
-            self.avdl_df = pd.concat([self.avdl_df, pd.DataFrame({
-                'XPath': [x_path],
-                'N': [n],
-                'number_of_words': [number_of_words]
-            })], ignore_index=True)
+        return int(np.count_nonzero(np.asarray(document_frequencies.counts[tag_id])))
 
-    def _compute_collection_frequencies(self):
+    def N(self, tag: str) -> int:
         """
-        Calculate collection frequency of terms.
-        TOFIX : This function is not used and does not work.
+        Returns the number of elements of a tag.
         """
-        for term, entries in self.inverted_index.TF.items():
-            frequency = 0
-            for xpath, entry in entries.items():
-                frequency += sum(self.term_frequency(docno, term, xpath)
-                                 for docno, _ in entry.items())
+        return int(self.tag_statistics['N'][self.tag_ids[tag]])
 
-        self.collection_frequencies[term] = frequency
-
-    def compute_statistics(self):
+    def avdl(self, tag: str) -> float:
         """
-        Computes the statistics for the parsed documents.
+        Returns the average length of the elements of a tag.
         """
-        collection_vocabulary = set()
-        new_rows = []
+        return float(self.tag_statistics['avdl'][self.tag_ids[tag]])
 
-        for docno, data in self.inverted_index.parsed_documents.items():
-            document_vocabulary = set()
-            for x_path in data.keys():
-                number_of_words = len(data[x_path]["terms"])
-                N = data[x_path]["N"]
-                collection_vocabulary.update(data[x_path]["terms"])
-                document_vocabulary.update(data[x_path]["terms"])
+    def document_length(self, docno: int, tag: str):
+        """
+        Returns the length of a document id for a tag.
+        """
+        return float(self.document_lengths[self.tag_ids[tag], docno])
 
-                self._compute_document_length(docno, x_path, number_of_words)
-                self._compute_average_document_length(x_path, N, number_of_words)
+    def document_length_columns(self, tags: list) -> np.ndarray:
+        """
+        Returns the length of each document id for each tag, one row per tag (0 for an unknown tag).
+        """
+        lengths = np.zeros((len(tags), self.document_lengths.shape[1]), dtype=np.float64)
+        for row, tag in enumerate(tags):
+            if tag in self.tag_ids:
+                lengths[row] = self.document_lengths[self.tag_ids[tag]]
 
-            self.distinct_terms_in_document[docno] = len(document_vocabulary)
+        return lengths
 
-        if new_rows:
-            new_data = pd.DataFrame(new_rows)
-            self.dl_df = pd.concat([self.dl_df, new_data], ignore_index=True)
+    def set_document_lengths(self, tag: str, lengths: np.ndarray) -> None:
+        """
+        Replaces the lengths of the documents for a tag, ex: computed from combined term frequencies.
 
-        # compute the average document length
-        self.avdl_df['avdl'] = self.avdl_df['number_of_words'] / self.avdl_df['N']
-        self.collection_vocabulary_sizes = len(collection_vocabulary)
-        self.avg_distinct_terms_in_document = sum(self.distinct_terms_in_document.values()) / len(self.distinct_terms_in_document)
+        Args:
+            tag (str): The tag, added if it is unknown.
+            lengths (np.ndarray): The length of each document id.
+        """
+        if not self.document_lengths.flags.writeable:
+            # The lengths read from a statistics file are shared, they are copied
+            self.document_lengths = self.document_lengths.copy()
+
+        if tag not in self.tag_ids:
+            self.tag_ids[tag] = len(self.tags)
+            self.tags.append(tag)
+            self.tag_statistics = np.append(self.tag_statistics, np.zeros(1, dtype=TAG_STATISTICS))
+            self.document_lengths = np.vstack([self.document_lengths, np.zeros((1, self.document_lengths.shape[1]))])
+
+        row = self.document_lengths[self.tag_ids[tag]]
+        row[:] = 0
+        row[:len(lengths)] = lengths
+
+    @property
+    def avdl_df(self):
+        """
+        Returns the statistics of the tags as a DataFrame, in the order of their first record.
+        """
+        import pandas as pd
 
-        # self.collection_frequency_of_terms = sum(list(self.collection_frequencies.values()))
+        order = [tag_id for tag_id in range(len(self.tags)) if self.tag_statistics['N'][tag_id] > 0]
+        return pd.DataFrame({
+            'XPath': [self.tags[tag_id] for tag_id in order],
+            'N': self.tag_statistics['N'][order],
+            'avdl': self.tag_statistics['avdl'][order],
+            'number_of_words': self.tag_statistics['total_length'][order],
+        })
 
     def export_stats(self):
         """
         Exports the computed statistics to files.
         """
+        avdl_df = self.avdl_df
         stats = {
             'indexing_time': self.indexing_time,
             'avg_collection_lengths': None,
@@ -125,18 +221,28 @@ class Statistics:
             'avg_distinct_terms_in_document': self.avg_distinct_terms_in_document,
         }
 
-        avg_collection_lengths = self.avdl_df.loc[self.avdl_df['XPath'] == './/article']['avdl'].values
+        avg_collection_lengths = avdl_df.loc[avdl_df['XPath'] == './/article']['avdl'].values
         if len(avg_collection_lengths) > 0:
             stats['avg_collection_lengths'] = avg_collection_lengths[0]
 
         with open(self.RESOURCES_FOLDER + "statistics.json", 'w') as outfile:
             json.dump(stats, outfile, indent=4)
 
+        # The statistics are keyed by ids, the documents are translated back to docnos
+        docnos = self.inverted_index.docnos
+        document_lengths = {}
+        for tag_id, tag in enumerate(self.tags):
+            for docno in np.flatnonzero(self.document_lengths[tag_id]).tolist():
+                document_lengths.setdefault(docnos.key(docno), {})[tag] = int(self.document_lengths[tag_id, docno])
+        distinct_terms_in_document = {
+            docnos.key(docno): distinct_terms for docno, distinct_terms in enumerate(self.distinct_terms_in_document.tolist())
+        }
+
         with open(self.RESOURCES_FOLDER + 'dl.json', 'w') as outfile:
-            json.dump(self.document_lengths, outfile, indent=4)
+            json.dump(document_lengths, outfile, indent=4)
 
         with open(self.RESOURCES_FOLDER + 'distinct_terms_in_document.json', 'w') as outfile:
-            json.dump(self.distinct_terms_in_document, outfile, indent=4)
+            json.dump(distinct_terms_in_document, outfile, indent=4)
 
         # write the dataframe to a file
-        self.avdl_df.to_csv(self.RESOURCES_FOLDER + 'avdl.csv', index=False)
+        avdl_df.to_csv(self.RESOURCES_FOLDER + 'avdl.csv', index=False)
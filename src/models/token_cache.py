@@ -0,0 +1,158 @@
+from array import array
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from models.index_file import IndexFile, write_index_file
+
+"""
+    The tokenized-corpus cache. The elements of a collection are stored as streams of term ids, in the
+    order they were indexed, so an index of the same collection is built again without parsing the XML
+    files and pre-processing their texts.
+    A cache file is content-addressed: its name is the hash of the collection file, of the text processor
+    (see TextProcessor.fingerprint) and of the parser options, so it is not read anymore when one of them
+    changes. It is a binary index file (see index_file.py) with the terms, the docnos, the XPaths, one record
+    (doc id, XPath id, number of tokens) per element and the term ids of the elements one after the other.
+"""
+
+TOKEN_CACHE_VERSION = 1
+TOKEN_CACHE_EXTENSION = '.tok'
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_file_hashes = {}   # The hash of each collection file {(path, size, modification time): hash}
+
+
+def file_hash(filename: str) -> str:
+    """
+    Returns the SHA-256 of a file, it is hashed once per process while the file is not modified.
+    """
+    stat = os.stat(filename)
+    file_key = (os.path.abspath(filename), stat.st_size, stat.st_mtime_ns)
+    if file_key not in _file_hashes:
+        sha256 = hashlib.sha256()
+        with open(filename, 'rb') as file:
+            for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+                sha256.update(chunk)
+        _file_hashes[file_key] = sha256.hexdigest()
+
+    return _file_hashes[file_key]
+
+
+def token_cache_key(filename: str, text_processor_fingerprint: dict, parser_granularity: list, is_bm25fr: bool,
+                    is_preprocessed: bool, excluded_members) -> str:
+    """
+    Returns the key of the tokenized corpus of a collection.
+
+    Args:
+        filename (str): The filename of the collection.
+        text_processor_fingerprint (dict): The fingerprint of the text processor, see TextProcessor.fingerprint.
+        parser_granularity (list): The granularity of the parser.
+        is_bm25fr (bool): Flag indicating whether the articles are indexed for BM25FR.
+        is_preprocessed (bool): Flag indicating whether the collection is pre-processed.
+        excluded_members: The members of the collection that are not parsed, see DocumentParser.collection_members.
+
+    Returns:
+        str: The key, a SHA-256.
+    """
+    key = {
+        'version': TOKEN_CACHE_VERSION,
+        'collection': file_hash(filename),
+        'text_processor': text_processor_fingerprint,
+        'parser_granularity': list(parser_granularity),
+        'is_bm25fr': is_bm25fr,
+        'is_preprocessed': is_preprocessed,
+        'excluded_members': sorted(excluded_members),
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class TokenStream:
+    def __init__(self) -> None:
+        """
+        Initializes the TokenStream class.
+        """
+        self.elements = array('I')  # (doc id, XPath id, number of tokens) of each element
+        self.tokens = array('I')    # The term ids of the elements, one after the other
+
+    def add(self, docno: int, xpath: int, tokens: list) -> None:
+        """
+        Appends an element.
+
+        Args:
+            docno (int): The document id.
+            xpath (int): The XPath id of the element.
+            tokens (list): The term ids of the element.
+        """
+        self.elements.extend((docno, xpath, len(tokens)))
+        self.tokens.extend(tokens)
+
+    def merge(self, stream, doc_map: list, xpath_map: list, term_map: list) -> None:
+        """
+        Appends the elements of a stream recorded apart, ex: by a worker.
+
+        Args:
+            stream (TokenStream): The stream, with its own ids.
+            doc_map (list): The document id of each document id of the stream.
+            xpath_map (list): The XPath id of each XPath id of the stream.
+            term_map (list): The term id of each term id of the stream.
+        """
+        elements = np.frombuffer(stream.elements, dtype=np.uint32).reshape(-1, 3).copy()
+        elements[:, 0] = np.asarray(doc_map, dtype=np.uint32)[elements[:, 0]]
+        elements[:, 1] = np.asarray(xpath_map, dtype=np.uint32)[elements[:, 1]]
+        tokens = np.asarray(term_map, dtype=np.uint32)[np.frombuffer(stream.tokens, dtype=np.uint32)]
+
+        self.elements.frombytes(elements.tobytes())
+        self.tokens.frombytes(tokens.tobytes())
+
+    def __len__(self) -> int:
+        return len(self.elements) // 3
+
+
+def token_cache_file(directory: str, key: str) -> str:
+    return os.path.join(directory, key + TOKEN_CACHE_EXTENSION)
+
+
+def write_token_stream(filename: str, key: str, stream: TokenStream, terms: list, docnos: list, xpaths: list) -> None:
+    """
+    Writes a tokenized corpus to a cache file, the file is replaced at once.
+
+    Args:
+        filename (str): The filename of the cache file.
+        key (str): The key of the tokenized corpus, see token_cache_key.
+        stream (TokenStream): The elements of the collection.
+        terms (list): The terms ordered by id, likewise for the docnos and the XPaths.
+    """
+    os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+    write_index_file(filename + '.tmp', {
+        'metadata': {'key': key, 'elements': len(stream), 'tokens': len(stream.tokens)},
+        'terms': terms,
+        'docnos': docnos,
+        'xpaths': xpaths,
+        'elements': stream.elements,
+        'tokens': stream.tokens,
+    })
+    os.replace(filename + '.tmp', filename)
+
+
+def read_token_stream(filename: str, key: str) -> IndexFile:
+    """
+    Returns the cache file of a tokenized corpus, memory-mapped, or None if there is none.
+
+    Args:
+        filename (str): The filename of the cache file.
+        key (str): The key of the tokenized corpus, see token_cache_key.
+    """
+    if not os.path.exists(filename):
+        return None
+
+    try:
+        index_file = IndexFile(filename)
+        if index_file.metadata().get('key') == key:
+            return index_file
+    except (ValueError, KeyError):
+        pass
+
+    # The file is not a cache file of the key, it is written again
+    return None
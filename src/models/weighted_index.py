@@ -0,0 +1,154 @@
+import itertools
+
+import numpy as np
+
+"""
+    This class is the weighted index {term_id: [{"XPath": xpath_id, "docno": doc_id, "weight": weight}]} stored as
+    a struct of arrays: the postings of all the terms are three parallel columns (document ids, XPath ids and
+    weights), the postings of a term are a slice of them (see TermWeights). The weights are computed in float64 by
+    the weighting strategies and stored in float32 (WEIGHT_DTYPE), the scores of the queries are summed in float64.
+    The postings of a term are iterated with TermWeights.postings, the weighting strategies read the whole columns
+    (see WeightedIndex.columns). The dicts of the former weighted index are still yielded when the postings of a
+    term are iterated, ex: to export them.
+"""
+
+WEIGHT_DTYPE = np.float32
+
+
+class TermWeights:
+    __slots__ = ('docnos', 'x_paths', 'weights')
+
+    def __init__(self, docnos: np.ndarray, x_paths: np.ndarray, weights: np.ndarray) -> None:
+        """
+        Initializes the TermWeights class, the weighted postings of a term.
+
+        Args:
+            docnos (np.ndarray): The document id of each posting.
+            x_paths (np.ndarray): The XPath id of each posting.
+            weights (np.ndarray): The weight of each posting.
+        """
+        self.docnos = docnos
+        self.x_paths = x_paths
+        self.weights = weights
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=WEIGHT_DTYPE))
+
+    def postings(self):
+        """
+        Returns an iterator of the (docno, x_path, weight) of the postings, as Python numbers.
+        """
+        return zip(self.docnos.tolist(), self.x_paths.tolist(), self.weights.tolist())
+
+    def entries(self) -> list:
+        """
+        Returns the postings as dicts [{"XPath": x_path, "docno": docno, "weight": weight}].
+        """
+        return [{"XPath": x_path, "docno": docno, "weight": weight} for docno, x_path, weight in self.postings()]
+
+    def __iter__(self):
+        return iter(self.entries())
+
+    def __getitem__(self, position: int) -> dict:
+        return {"XPath": self.x_paths[position].item(), "docno": self.docnos[position].item(), "weight": self.weights[position].item()}
+
+    def __len__(self) -> int:
+        return len(self.docnos)
+
+
+class WeightedIndex:
+    def __init__(self, bounds: dict = None, docnos: np.ndarray = None, x_paths: np.ndarray = None,
+                 weights: np.ndarray = None) -> None:
+        """
+        Initializes the WeightedIndex class.
+
+        Args:
+            bounds (dict, optional): The first and last positions of the postings of each term {term: (start, end)},
+                in the order of the columns. Defaults to None, the index is empty.
+            docnos (np.ndarray, optional): The document id of each posting.
+            x_paths (np.ndarray, optional): The XPath id of each posting.
+            weights (np.ndarray, optional): The weight of each posting.
+        """
+        self.bounds = bounds if bounds is not None else {}
+        self.docnos = docnos if docnos is not None else np.zeros(0, dtype=np.int64)
+        self.x_paths = x_paths if x_paths is not None else np.zeros(0, dtype=np.int64)
+        self.weights = weights if weights is not None else np.zeros(0, dtype=WEIGHT_DTYPE)
+
+    @classmethod
+    def from_groups(cls, groups: list, weights, weighted_x_path: int = None, dtype=WEIGHT_DTYPE):
+        """
+        Returns the weighted index of groups of postings.
+
+        Args:
+            groups (list): The groups of postings [(term, x_path, docnos)], the groups of a term follow each other.
+            weights: The weights of the postings of the groups, in their order.
+            weighted_x_path (int, optional): The XPath id of the weighted postings. Defaults to the XPath of each posting.
+            dtype (np.dtype, optional): The type of the stored weights, ex: float64 for the weights combined
+                afterwards. Defaults to WEIGHT_DTYPE.
+        """
+        group_sizes = [len(docno_list) for _, _, docno_list in groups]
+        number_of_postings = sum(group_sizes)
+
+        bounds = {}
+        start = 0
+        for (term, _, _), size in zip(groups, group_sizes):
+            if size == 0:
+                continue
+            bounds[term] = (bounds[term][0] if term in bounds else start, start + size)
+            start += size
+
+        docnos = np.fromiter(itertools.chain.from_iterable(docno_list for _, _, docno_list in groups),
+                             dtype=np.int64, count=number_of_postings)
+        if weighted_x_path is None:
+            x_paths = np.repeat(np.array([x_path for _, x_path, _ in groups], dtype=np.int64), group_sizes)
+        else:
+            x_paths = np.full(number_of_postings, weighted_x_path, dtype=np.int64)
+
+        return cls(bounds, docnos, x_paths, np.asarray(weights, dtype=dtype))
+
+    def with_weights(self, weights, dtype=WEIGHT_DTYPE):
+        """
+        Returns a weighted index of the same postings with other weights, ex: normalized.
+        """
+        return WeightedIndex(self.bounds, self.docnos, self.x_paths, np.asarray(weights, dtype=dtype))
+
+    def columns(self) -> tuple:
+        """
+        Returns the term id, the document id, the XPath id and the weight of each posting (NumPy arrays),
+        the postings of a term follow each other in the order of the terms.
+        """
+        group_sizes = [end - start for start, end in self.bounds.values()]
+        terms = np.repeat(np.array(list(self.bounds), dtype=np.int64), group_sizes)
+        return terms, self.docnos, self.x_paths, self.weights
+
+    def to_dict(self) -> dict:
+        """
+        Returns the weighted index {term: [{"XPath": x_path, "docno": docno, "weight": weight}]}.
+        """
+        return {term: term_weights.entries() for term, term_weights in self.items()}
+
+    def __getitem__(self, term: int) -> TermWeights:
+        start, end = self.bounds[term]
+        return TermWeights(self.docnos[start:end], self.x_paths[start:end], self.weights[start:end])
+
+    def get(self, term: int, default=None):
+        if term not in self.bounds:
+            return default
+
+        return self[term]
+
+    def __contains__(self, term: int) -> bool:
+        return term in self.bounds
+
+    def keys(self):
+        return self.bounds.keys()
+
+    def items(self):
+        return ((term, self[term]) for term in self.bounds)
+
+    def __iter__(self):
+        return iter(self.bounds)
+
+    def __len__(self) -> int:
+        return len(self.bounds)
@@ -1,6 +1,77 @@
 import xml.etree.ElementTree as ET
 import html
-import ftfy
+import re
+
+ENTITY_PATTERN = re.compile(rb'&[^;]+;')
+CHUNK_SIZE = 64 * 1024
+
+# The documents of a text collection, ex: '<doc><docno>1000</docno> text </doc>'
+TEXT_DOCUMENT = re.compile(rb'<doc>\s*<docno>(.*?)</docno>(.*)', re.DOTALL)
+TEXT_DOCUMENT_END = b'</doc>'
+
+
+class StreamingTarget:
+    """
+    Parser target used to stream an XML document.
+    It keeps a running stack of the open elements with per-parent sibling counters, so the XPath
+    of an element is known when it starts, and collects the text of the elements to extract.
+    The text of an element is emitted as an event when the element closes, and the text runs are
+    released as soon as no extracted element is open anymore.
+    """
+    def __init__(self, tags, include_root: bool = False):
+        self.tags = tags
+        self.include_root = include_root
+
+        self.stack = []             # Open elements: (tag, sibling counters, xpath, first text run, position)
+        self.text_runs = []         # Text runs of the open extracted elements
+        self.current_run = []       # Data chunks of the text run being read
+        self.open_extracted = 0     # Number of open extracted elements
+        self.position = 0           # Position of the next element in document order
+        self.events = []            # Closed elements: (position, tag, xpath, text)
+
+    def start(self, tag, attrib):
+        # The text run ends with the tag, the flush is inlined as start/end are called for every element
+        if self.current_run:
+            self.text_runs.append(''.join(self.current_run))
+            self.current_run.clear()
+
+        if self.stack:
+            _, siblings, parent_xpath, _, _ = self.stack[-1]
+            index = siblings.get(tag, 0) + 1
+            siblings[tag] = index
+            xpath = f"{parent_xpath}/{tag}[{index}]"
+            is_extracted = tag in self.tags
+        else:
+            xpath = f"/{tag}[1]"
+            is_extracted = self.include_root
+
+        first_run = None
+        if is_extracted:
+            first_run = len(self.text_runs)
+            self.open_extracted += 1
+
+        self.stack.append((tag, {}, xpath, first_run, self.position))
+        self.position += 1
+
+    def data(self, data):
+        if self.open_extracted and data:
+            self.current_run.append(data)
+
+    def end(self, tag):
+        if self.current_run:
+            self.text_runs.append(''.join(self.current_run))
+            self.current_run.clear()
+
+        tag, _, xpath, first_run, position = self.stack.pop()
+        if first_run is not None:
+            self.events.append((position, tag, xpath, ' '.join(self.text_runs[first_run:])))
+            self.open_extracted -= 1
+            if not self.open_extracted:
+                self.text_runs = []
+
+    def close(self):
+        return None
+
 
 class XmlParser:
     def __init__(self, xml_file):
@@ -41,6 +112,34 @@ class XmlParser:
             element = parent_map.get(element)
         return '/' + '/'.join(path)
 
+    def xpath_map(self, tree):
+        """
+        Returns a dictionary mapping each XML element to its XPath.
+        The tree is traversed once with a stack of the elements to visit, the positional index of
+        a child is given by a per-parent counter of its tag, so each XPath is built in O(1)
+        from the XPath of its parent instead of climbing the parent map like get_xpath.
+
+        Args:
+            tree (xml.etree.ElementTree.ElementTree): The XML tree to be parsed.
+
+        Returns:
+            dict: A dictionary mapping each XML element to its XPath.
+        """
+        root = tree.getroot()
+        xpaths = {root: f"/{root.tag}[1]"}
+        stack = [root]
+        while stack:
+            parent = stack.pop()
+            parent_xpath = xpaths[parent]
+            siblings = {}
+            for child in parent:
+                index = siblings.get(child.tag, 0) + 1
+                siblings[child.tag] = index
+                xpaths[child] = f"{parent_xpath}/{child.tag}[{index}]"
+                stack.append(child)
+
+        return xpaths
+
     def parent_map(self, tree):
         """
         Returns a dictionary mapping each XML element to its parent element.
@@ -63,8 +162,99 @@ class XmlParser:
         Returns:
             str: The cleaned and unescaped text.
         """
+        import ftfy
         return html.unescape(html.unescape(ftfy.fix_text(text))).strip()
 
+    def iter_without_entities(self, xml_file, chunk_size: int = CHUNK_SIZE):
+        """
+        Reads the XML file by chunks and replaces the entities by a space, like
+        re.sub('&[^;]+;', ' ', content) would do on the whole content.
+        An entity can only end on a ';', so everything before the last ';' of a chunk is final,
+        the rest is kept for the next chunk from its first '&'.
+
+        Args:
+            xml_file (io.BufferedReader): The XML file opened in binary mode.
+            chunk_size (int): The number of bytes read at once.
+
+        Yields:
+            bytes: The chunks of the XML file without entities.
+        """
+        carry = b''
+        while True:
+            chunk = xml_file.read(chunk_size)
+            if not chunk:
+                break
+
+            buffer = carry + chunk
+            end = buffer.rfind(b';') + 1
+            head = ENTITY_PATTERN.sub(b' ', buffer[:end])
+            tail = buffer[end:]
+
+            ampersand = tail.find(b'&')
+            if ampersand == -1:
+                carry = b''
+                yield head + tail
+            else:
+                carry = tail[ampersand:]
+                yield head + tail[:ampersand]
+
+        if carry:
+            yield carry
+
+    def iter_text_documents(self, text_file, chunk_size: int = CHUNK_SIZE):
+        """
+        Reads a collection of text documents ('<doc><docno>id</docno> text </doc>') by chunks and
+        splits it into documents, only the document being read is kept in memory.
+        The entities of the text are replaced by a space, like for the XML files.
+
+        Args:
+            text_file (io.BufferedReader): The collection opened in binary mode, ex: with gzip.open.
+            chunk_size (int): The number of bytes read at once.
+
+        Yields:
+            tuple: (docno, text) for each document.
+        """
+        buffer = bytearray()
+        while True:
+            chunk = text_file.read(chunk_size)
+
+            # The end of a document can overlap the previous chunk
+            search_start = max(0, len(buffer) - len(TEXT_DOCUMENT_END) + 1)
+            buffer += chunk
+            end = buffer.find(TEXT_DOCUMENT_END, search_start)
+            while end != -1:
+                match = TEXT_DOCUMENT.search(buffer, 0, end)
+                if match is not None:
+                    yield match.group(1).strip().decode('utf-8'), ENTITY_PATTERN.sub(b' ', match.group(2)).decode('utf-8')
+                del buffer[:end + len(TEXT_DOCUMENT_END)]
+                end = buffer.find(TEXT_DOCUMENT_END)
+
+            if not chunk:
+                break
+
+    def iterparse_elements(self, xml_file, tags, include_root: bool = False):
+        """
+        Streams the XML file with an incremental parser, no element tree is built.
+
+        Args:
+            xml_file (io.BufferedReader): The XML file opened in binary mode.
+            tags (set): The tags of the descendant elements to extract.
+            include_root (bool): Whether to extract the root element.
+
+        Yields:
+            tuple: (position, tag, xpath, text) for each extracted element when it closes,
+            position being the index of the element in document order.
+        """
+        target = StreamingTarget(tags, include_root)
+        parser = ET.XMLParser(target=target)
+        for chunk in self.iter_without_entities(xml_file):
+            parser.feed(chunk)
+            yield from target.events
+            target.events.clear()
+
+        parser.close()
+        yield from target.events
+
     def extract_text(self, element):
         """
         Extracts the text content from an XML element.
@@ -0,0 +1,48 @@
+from models.collection import Collection
+from models.segments import SegmentMerger
+from manager.query_manager import QueryManager
+
+import threading
+import os
+
+import pytest
+
+"""
+    Tests the query-time scoring (--lazy-scoring) of an incremental index whose documents are deleted.
+    Run from the src folder: python -m pytest tests
+"""
+
+SRC_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_COLLECTION = '../lib/data/practice_05/Test.zip'
+
+
+@pytest.fixture
+def segments(tmp_path, monkeypatch):
+    monkeypatch.chdir(SRC_FOLDER)
+    yield str(tmp_path)
+    # The background merges of the segments are waited for before the directory is removed
+    for thread in threading.enumerate():
+        if isinstance(thread, SegmentMerger):
+            thread.join()
+
+
+def run(collection) -> list:
+    """
+    Returns the results of the queries of the collection.
+    """
+    query_manager = QueryManager(collection)
+    return [result for query_id, query in query_manager.parse_query_file()
+            for result in query_manager.launch_query(query_id, query)]
+
+
+def test_delete_documents_then_query_ltc(segments):
+    collection = Collection(TEST_COLLECTION, segments=segments, ltc_weighting=True, lazy_scoring=True)
+    deleted_docno = run(collection)[0][2]
+
+    collection.delete_documents([deleted_docno])
+    results = run(collection)
+
+    # The documents are renumbered: they are normalized by their own norms, as if they were weighted again
+    expected = run(Collection(TEST_COLLECTION, import_collection=True, segments=segments, ltc_weighting=True))
+    assert results == expected
+    assert deleted_docno not in {result[2] for result in results}
@@ -1,9 +1,8 @@
 from weighting_strategies.weighting_strategy import WeightingStrategy
 
+import numpy as np
 import math
 import time
-import re
-import json
 
 
 class BM25FrWeighting(WeightingStrategy):
@@ -18,115 +17,114 @@ class BM25FrWeighting(WeightingStrategy):
         self.ALPHA_GRANULARITY = 'title'
         self.BETA_GRANULARITY = 'categories'
         self.GAMMA_GRANULARITY = 'body'
+        self.FIELDS = [self.ALPHA_GRANULARITY, self.BETA_GRANULARITY, self.GAMMA_GRANULARITY]
 
         self.ARTICLE = 'article'
         self.ARTICLE_PATH = '/article[1]'
 
+        self.combined_tf_columns = None     # The factors and the combined term frequency columns grouped by term, see weight_terms
+
     def calculate_bm25_weight_with_combined_tf(self, collection, term_frequencies):
         """
-        Constructs the weighted inverted index using the BM25 weighting scheme.
+        Constructs the weighted inverted index using the BM25 weighting scheme with the combined
+        term frequencies, see bm25_weighted_index.
         """
-        weighted_index = {}
+        article_path = collection.inverted_index.add_xpath(self.ARTICLE_PATH)
+        return self.bm25_weighted_index(collection, self.k1, self.b, term_frequencies, article_path)
 
-        for term, postings in collection.inverted_index.IDX.items():
-            for x_path, docno_list in postings.items():
-                tag = re.sub(r'\[\d+\]', '', x_path).split("/")[-1]
-                N = collection.statistics.avdl_df.loc[collection.statistics.avdl_df['XPath'] == tag]['N'].values[0]
-                avdl = collection.statistics.avdl_df.loc[collection.statistics.avdl_df['XPath'] == tag]['avdl'].values[0]
+    def field(self, granularity):
+        """
+        Returns the field of a granularity: its position in FIELDS, len(FIELDS) for the other granularities.
+        """
+        return self.FIELDS.index(granularity) if granularity in self.FIELDS else len(self.FIELDS)
 
-                df = collection.document_frequency(term, tag)  # Document frequency
-                idf = math.log10((N - df + 0.5) / (df + 0.5))           # Inverse document frequency
+    def posting_columns(self, collection):
+        """
+        Gathers the postings of the term frequencies into columns, they are the same for all the factors.
 
-                for docno in docno_list:
-                    dl = collection.document_length(docno, tag)     # Document length
-                    tf = term_frequencies[term][x_path].get(docno, 0)  # Term frequency
+        Returns:
+            tuple: The field (see field) and the term frequency of each posting, the id of the (term, document)
+                of each posting, the order of the first occurrence of the (term, document) ids, and the term ids
+                and the document ids of the (term, document) in that order (NumPy arrays).
+        """
+        term_frequencies = collection.inverted_index.TF
+        fields = {}
+        group_terms, group_fields, group_sizes = [], [], []
+        docnos, frequencies = [], []
+        for term in term_frequencies:
+            for x_path, xpath_docnos, xpath_frequencies in term_frequencies.xpath_postings(term):
+                if x_path not in fields:
+                    fields[x_path] = self.field(collection.xpath_tag(x_path))
 
-                    # Calculate BM25 weight for the term in the document
-                    weight = (tf * (self.k1 + 1)) / \
-                        (self.k1 * ((1 - self.b) + self.b * (dl / avdl)) + tf)
-                    weight *= idf
+                group_terms.append(term)
+                group_fields.append(fields[x_path])
+                group_sizes.append(len(xpath_docnos))
+                docnos.extend(xpath_docnos)
+                frequencies.extend(xpath_frequencies)
 
-                    # Update the weighted index
-                    if term not in weighted_index:
-                        weighted_index[term] = []
+        if not docnos:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, np.zeros(0, dtype=np.float64), empty, empty, empty, empty
 
-                    weighted_index[term].append(
-                        {"XPath": self.ARTICLE_PATH, "docno": docno, "weight": weight})
+        terms = np.repeat(np.array(group_terms, dtype=np.int64), group_sizes)
+        docnos = np.array(docnos, dtype=np.int64)
 
-        return weighted_index
+        number_of_documents = int(docnos.max()) + 1
+        pairs, first_positions, pair_ids = np.unique(terms * number_of_documents + docnos, return_index=True, return_inverse=True)
+        order = np.argsort(first_positions, kind='stable')
+        return (np.repeat(np.array(group_fields, dtype=np.int64), group_sizes), np.array(frequencies, dtype=np.float64),
+                pair_ids, order, pairs[order] // number_of_documents, pairs[order] % number_of_documents)
 
-    def compute_combined_tf(self, collection):
-        """
-        Computes the combined term frequency for each term in each document.
+    def compute_combined_tf_columns(self, collection, posting_columns=None):
         """
-        term_frequencies = {}
-        for term, postings in collection.inverted_index.TF.items():
-            term_frequencies[term] = self.compute_combined_tf_for_term(term, postings, collection)
+        Computes the combined term frequency of each term in each document.
+        The term frequencies are multiplied by the factor of their granularity (the other granularities count
+        for 0), then summed by (term, document) in the order of the postings, so the sums are the same as when
+        they are added one by one.
 
-        return term_frequencies
+        Args:
+            collection: The collection, with its inverted index and statistics.
+            posting_columns (tuple, optional): The postings of the term frequencies, see posting_columns. Defaults to
+                the postings of the collection.
 
-    def compute_combined_tf_for_term(self, term, postings, collection):
+        Returns:
+            tuple: The term ids, the document ids and the combined term frequencies (NumPy arrays),
+                in the order of the first occurrence of each (term, document).
         """
-        Computes the combined term frequency for a specific term in different granularities.
-        """
-        term_freq_for_term = {}
-        for x_path, entry in postings.items():
-            tag = re.sub(r'\[\d+\]', '', x_path).split("/")[-1]
-            term_freq_for_term[x_path] = self.compute_tf_for_granularity(tag, entry)
-
-        combined_term_frequency = self.combine_term_frequency(term_freq_for_term)
-        return combined_term_frequency
-
-    def compute_tf_for_granularity(self, granularity, entry):
-        """
-        Computes the term frequency for a term in a specific granularity.
-        """
-        tf = 0
-        term_freq = {}
-        for docno, freq in entry.items():
-            if granularity == self.ALPHA_GRANULARITY:
-                tf = self.alpha * freq
-            elif granularity == self.BETA_GRANULARITY:
-                tf = self.beta * freq
-            elif granularity == self.GAMMA_GRANULARITY:
-                tf = self.gamma * freq
+        if posting_columns is None:
+            posting_columns = self.posting_columns(collection)
+        fields, frequencies, pair_ids, order, pair_terms, pair_docnos = posting_columns
 
-            term_freq[docno] = tf
+        # np.add.at adds the term frequencies of a (term, document) in their order
+        tfs = np.array([self.alpha, self.beta, self.gamma, 0], dtype=np.float64)[fields] * frequencies
+        combined_tfs = np.zeros(len(order), dtype=np.float64)
+        np.add.at(combined_tfs, pair_ids, tfs)
 
-        return term_freq
+        return pair_terms, pair_docnos, combined_tfs[order]
 
-    def combine_term_frequency(self, term_freq_for_term):
+    def compute_combined_tf(self, collection, columns, terms):
         """
-        Combines term frequency for different granularities into a single term frequency.
+        Returns the combined term frequencies {term: {article_path: {docno: tf}}} of terms, see compute_combined_tf_columns.
         """
-        combined_tf = {}
-        for _, term_freq in term_freq_for_term.items():
-            for docno, tf in term_freq.items():
-                if self.ARTICLE_PATH not in combined_tf:
-                    combined_tf[self.ARTICLE_PATH] = {}
+        article_path = collection.inverted_index.add_xpath(self.ARTICLE_PATH)
+        term_column, docno_column, tf_column = columns
+        selected = np.isin(term_column, np.fromiter(terms, dtype=np.int64))
 
-                if docno not in combined_tf[self.ARTICLE_PATH]:
-                    combined_tf[self.ARTICLE_PATH][docno] = tf
-                else:
-                    combined_tf[self.ARTICLE_PATH][docno] += tf
+        term_frequencies = {}
+        for term, docno, tf in zip(term_column[selected].tolist(), docno_column[selected].tolist(), tf_column[selected].tolist()):
+            term_frequencies.setdefault(term, {article_path: {}})[article_path][docno] = tf
 
-        return combined_tf
+        return term_frequencies
 
-    def update_dl(self, collection, term_frequencies):
+    def update_dl(self, collection, columns):
         """
         We need to compute the document length for each document based on 
         the combined term frequency.
         """
-        updated_dl = {}
-        for _, postings in term_frequencies.items():
-            for granularity, entry in postings.items():
-                if granularity == self.ARTICLE_PATH:
-                    for docno, freq in entry.items():
-                        if docno not in updated_dl:
-                            updated_dl[docno] = {self.ARTICLE: 0}
-                        updated_dl[docno][self.ARTICLE] += freq
-
-        collection.statistics.document_lengths = updated_dl
+        _, docno_column, tf_column = columns
+        lengths = np.zeros(int(docno_column.max()) + 1 if len(docno_column) else 0, dtype=np.float64)
+        np.add.at(lengths, docno_column, tf_column)
+        collection.statistics.set_document_lengths(self.ARTICLE, lengths)
 
     def calculate_weight(self, collection):
         """
@@ -143,16 +141,101 @@ class BM25FrWeighting(WeightingStrategy):
         start_time = time.time()
         weighted_index = {}
 
-        term_frequencies = self.compute_combined_tf(collection)
+        columns = self.compute_combined_tf_columns(collection)
 
-        self.update_dl(collection, term_frequencies)
+        self.update_dl(collection, columns)
         collection.transform_index()
 
+        term_frequencies = self.compute_combined_tf(collection, columns, collection.inverted_index.IDX.keys())
         weighted_index = self.calculate_bm25_weight_with_combined_tf(collection, term_frequencies)
         self.print_computation_time(start_time, time.time())
 
         return weighted_index
 
+    def weight_terms(self, collection, terms):
+        """
+        Returns the weighted index of some terms only, see WeightingStrategy.weight_terms.
+        The combined term frequencies and the document lengths need all the postings, they are computed
+        once for the factors (alpha, beta, gamma). The inverted index is not transformed.
+        """
+        factors = (self.alpha, self.beta, self.gamma)
+        if self.combined_tf_columns is None or self.combined_tf_columns[0] != factors:
+            columns = self.compute_combined_tf_columns(collection)
+            self.update_dl(collection, columns)
+
+            # The columns are grouped by term, the documents of a term keep their order
+            order = np.argsort(columns[0], kind='stable')
+            self.combined_tf_columns = (factors, tuple(column[order] for column in columns))
+
+        article_path = collection.inverted_index.add_xpath(self.ARTICLE_PATH)
+        term_column, docno_column, tf_column = self.combined_tf_columns[1]
+
+        postings, term_frequencies = {}, {}
+        for term in terms:
+            if term is None:
+                continue
+
+            start, end = np.searchsorted(term_column, [term, term + 1])
+            if start == end:
+                continue
+
+            docnos = docno_column[start:end].tolist()
+            postings[term] = {article_path: docnos}
+            term_frequencies[term] = {article_path: dict(zip(docnos, tf_column[start:end].tolist()))}
+
+        return self.bm25_weighted_index(collection, self.k1, self.b, term_frequencies, article_path, postings)
+
+    def weight_terms_grid(self, collection, terms, strategies):
+        """
+        Returns the weights of some terms for a grid of (k1, b, alpha, beta, gamma), see WeightingStrategy.weight_terms_grid.
+        The postings of the term frequencies are gathered once. The combined term frequencies and the document
+        lengths are computed for each strategy (they need all the postings), then the postings of the terms
+        are weighted for all the strategies at once. The document lengths of the statistics are not updated.
+        """
+        posting_columns = self.posting_columns(collection)
+        pair_terms, pair_docnos = posting_columns[4], posting_columns[5]
+        article_path = collection.inverted_index.add_xpath(self.ARTICLE_PATH)
+
+        # The (term, document) of the terms, the documents of a term keep their order
+        term_order = np.argsort(pair_terms, kind='stable')
+        sorted_terms = pair_terms[term_order]
+        groups, selected = [], []
+        for term in dict.fromkeys(terms):
+            if term is None:
+                continue
+
+            start, end = np.searchsorted(sorted_terms, [term, term + 1])
+            if start < end:
+                groups.append((term, article_path, pair_docnos[term_order[start:end]].tolist()))
+                selected.append(term_order[start:end])
+
+        if not groups:
+            return {}
+
+        selected = np.concatenate(selected)
+        tf, dl = [], []
+        for strategy in strategies:
+            _, docno_column, tf_column = strategy.compute_combined_tf_columns(collection, posting_columns)
+            lengths = np.zeros(int(docno_column.max()) + 1, dtype=np.float64)
+            np.add.at(lengths, docno_column, tf_column)
+
+            tf.append(tf_column[selected])
+            dl.append(lengths[docno_column[selected]])
+
+        tag = collection.xpath_tag(article_path)
+        N, avdl = self.tag_statistics(collection)[tag]
+        group_sizes = [len(docno_list) for _, _, docno_list in groups]
+        idfs = []
+        for term, _, _ in groups:
+            df = collection.document_frequency(term, tag)           # Document frequency
+            idfs.append(math.log10((N - df + 0.5) / (df + 0.5)))    # Inverse document frequency
+
+        k1 = np.array([strategy.k1 for strategy in strategies], dtype=np.float64)[:, np.newaxis]
+        b = np.array([strategy.b for strategy in strategies], dtype=np.float64)[:, np.newaxis]
+        weights = self.bm25_weights(np.array(tf), np.array(dl), np.full(len(selected), avdl, dtype=np.float64),
+                                    np.repeat(np.array(idfs, dtype=np.float64), group_sizes), k1, b)
+        return self.grid_weighted_index(groups, weights)
+
     def get_weighting_scheme_parameters(self):
         """
         Returns the parameters of the weighting scheme.
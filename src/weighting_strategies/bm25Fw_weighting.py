@@ -1,9 +1,8 @@
 from weighting_strategies.weighting_strategy import WeightingStrategy
+from models.weighted_index import WeightedIndex
 
-import math
+import numpy as np
 import time
-import re
-import json
 
 
 class BM25FwWeighting(WeightingStrategy):
@@ -21,76 +20,79 @@ class BM25FwWeighting(WeightingStrategy):
 
     def compute_bm25_weight_on_fields(self, collection):
         """
-        Constructs the weighted inverted index using the BM25 weighting scheme.
+        Constructs the weighted inverted index using the BM25 weighting scheme, see bm25_weighted_index.
+        The weights are kept in float64 until they are combined.
         """
-        weighted_index = {}
-
-        for term, postings in collection.inverted_index.IDX.items():
-            for x_path, docno_list in postings.items():
-                tag = re.sub(r'\[\d+\]', '', x_path).split("/")[-1]
-                N = collection.statistics.avdl_df.loc[collection.statistics.avdl_df['XPath'] == tag]['N'].values[0]
-                avdl = collection.statistics.avdl_df.loc[collection.statistics.avdl_df['XPath'] == tag]['avdl'].values[0]
+        return self.bm25_weighted_index(collection, self.k1, self.b, dtype=np.float64)
 
-                df = collection.document_frequency(term, tag)            # Document frequency
-                idf = math.log10((N - df + 0.5) / (df + 0.5))            # Inverse document frequency
+    def field_factor(self, granularity):
+        """
+        Returns the factor of the weights of a granularity, the weights of the other granularities are kept.
+        """
+        if granularity == self.ALPHA_GRANULARITY:
+            return self.alpha
+        elif granularity == self.BETA_GRANULARITY:
+            return self.beta
+        elif granularity == self.GAMMA_GRANULARITY:
+            return self.gamma
 
-                for docno in docno_list:
-                    dl = collection.document_length(docno, tag)               # Document length
-                    tf = collection.term_frequency(docno, term, x_path)  # Term frequency
+        return 1
 
-                    # Calculate BM25 weight for the term in the document
-                    weight = (tf * (self.k1 + 1)) / \
-                        (self.k1 * ((1 - self.b) + self.b * (dl / avdl)) + tf)
-                    weight *= idf
+    def _apply_weights_factor(self, collection, weighted_index):
+        _, _, x_paths, weights = weighted_index.columns()
+        unique_x_paths, x_path_ids = np.unique(x_paths, return_inverse=True)
+        factors = np.array([self.field_factor(collection.xpath_tag(x_path)) for x_path in unique_x_paths.tolist()],
+                           dtype=np.float64)
 
-                    # Update the weighted index
-                    if term not in weighted_index:
-                        weighted_index[term] = []
+        return weighted_index.with_weights(weights * factors[x_path_ids], dtype=np.float64)
 
-                    weighted_index[term].append({"XPath": x_path, "docno": docno, "weight": weight})
+    def _sum_weights(self, collection, weighted_index):
+        """
+        Sums the weights by (term, document) into the article XPath, see sum_weight_columns.
+        """
+        terms, docnos, _, weights = weighted_index.columns()
+        groups, combined_weights = self.sum_weight_columns(collection, terms, docnos, weights)
+        return WeightedIndex.from_groups(groups, combined_weights)
 
-        return weighted_index
+    def sum_weight_columns(self, collection, terms, docnos, weights):
+        """
+        Sums the weights of the postings by (term, document), in the order of the postings.
 
-    def _apply_weights_factor(self, weighted_index):
-        for _, postings in weighted_index.items():
-            for posting in postings:
-                tag = re.sub(r'\[\d+\]', '', posting["XPath"]).split("/")[-1]
-                if tag == self.ALPHA_GRANULARITY:
-                    posting["weight"] *= self.alpha
-                elif tag == self.BETA_GRANULARITY:
-                    posting["weight"] *= self.beta
-                elif tag == self.GAMMA_GRANULARITY:
-                    posting["weight"] *= self.gamma
+        Args:
+            collection: The collection, with its inverted index and statistics.
+            terms (np.ndarray): The term id of each posting.
+            docnos (np.ndarray): The document id of each posting.
+            weights (np.ndarray): The weights of the postings, the last axis, ex: one row per strategy of a grid.
 
-        return weighted_index
-
-    def _sum_weights(self, weighted_index):
-        weighted_index_combined = {}
-        for term, postings in weighted_index.items():
-            if term not in weighted_index_combined:
-                weighted_index_combined[term] = {}
+        Returns:
+            tuple: The groups of (term, document) [(term, article_path, docnos)] in the order of their first
+                posting, and their summed weights.
+        """
+        if len(docnos) == 0:
+            return [], np.zeros(weights.shape, dtype=np.float64)
 
-            for posting in postings:
-                docno = posting["docno"]
-                weight = posting["weight"]
+        # np.add.at adds the weights of a (term, document) in their order
+        number_of_documents = int(docnos.max()) + 1
+        pairs, first_positions, pair_ids = np.unique(terms * number_of_documents + docnos, return_index=True, return_inverse=True)
+        combined_weights = np.zeros((len(pairs),) + weights.shape[:-1], dtype=np.float64)
+        np.add.at(combined_weights, pair_ids, weights.T)
 
-                if docno not in weighted_index_combined[term]:
-                    weighted_index_combined[term][docno] = weight
-                else:
-                    weighted_index_combined[term][docno] += weight
+        order = np.argsort(first_positions, kind='stable')
+        pair_terms, pair_docnos = (pairs[order] // number_of_documents).tolist(), (pairs[order] % number_of_documents).tolist()
 
-        result = {}
-        for term, postings in weighted_index_combined.items():
-            result[term] = [{"XPath": "/article[1]", "docno": docno, "weight": weight} for docno, weight in postings.items()]
+        article_path = collection.inverted_index.add_xpath("/article[1]")
+        combined_groups = {}
+        for term, docno in zip(pair_terms, pair_docnos):
+            combined_groups.setdefault(term, []).append(docno)
 
-        return result
+        return [(term, article_path, docno_list) for term, docno_list in combined_groups.items()], combined_weights[order].T
 
-    def combine_weights(self, weighted_index):
+    def combine_weights(self, collection, weighted_index):
         # first step: apply the alpha, beta, gamma weights to the weights of the different fields
         # second step: sum the weights of the different fields by term and docno in a new XPaths field ("/article[1]")
 
-        weighted_index = self._apply_weights_factor(weighted_index)
-        weighted_index = self._sum_weights(weighted_index)
+        weighted_index = self._apply_weights_factor(collection, weighted_index)
+        weighted_index = self._sum_weights(collection, weighted_index)
 
         return weighted_index
 
@@ -109,13 +111,45 @@ class BM25FwWeighting(WeightingStrategy):
 
         weighted_index = {}
         weighted_index = self.compute_bm25_weight_on_fields(collection)
-        weighted_index = self.combine_weights(weighted_index)
+        weighted_index = self.combine_weights(collection, weighted_index)
 
         end_time = time.time()
         self.print_computation_time(start_time, end_time)
 
         return weighted_index
 
+    def weight_terms(self, collection, terms):
+        """
+        Returns the weighted index of some terms only, see WeightingStrategy.weight_terms.
+        """
+        weighted_index = self.bm25_weighted_index(collection, self.k1, self.b, postings=self.term_postings(collection, terms),
+                                                  dtype=np.float64)
+        return self.combine_weights(collection, weighted_index)
+
+    def weight_terms_grid(self, collection, terms, strategies):
+        """
+        Returns the weights of some terms for a grid of (k1, b, alpha, beta, gamma), see WeightingStrategy.weight_terms_grid.
+        The postings are gathered once, they are weighted, multiplied by the factor of their field and summed by
+        (term, document) for all the strategies at once, in the order of combine_weights.
+        """
+        columns = self.bm25_columns(collection, postings=self.term_postings(collection, terms))
+        if columns is None:
+            return {}
+
+        groups, tf, dl, avdl, idf = columns
+        k1 = np.array([strategy.k1 for strategy in strategies], dtype=np.float64)[:, np.newaxis]
+        b = np.array([strategy.b for strategy in strategies], dtype=np.float64)[:, np.newaxis]
+        weights = self.bm25_weights(tf, dl, avdl, idf, k1, b)
+
+        group_sizes = [len(docno_list) for _, _, docno_list in groups]
+        factors = np.array([[strategy.field_factor(collection.xpath_tag(x_path)) for _, x_path, _ in groups]
+                            for strategy in strategies], dtype=np.float64)
+        weights *= np.repeat(factors, group_sizes, axis=1)
+
+        terms = np.repeat(np.array([term for term, _, _ in groups], dtype=np.int64), group_sizes)
+        docnos = np.array([docno for _, _, docno_list in groups for docno in docno_list], dtype=np.int64)
+        return self.grid_weighted_index(*self.sum_weight_columns(collection, terms, docnos, weights))
+
     def get_weighting_scheme_parameters(self):
         """
         Returns the parameters of the weighting scheme.
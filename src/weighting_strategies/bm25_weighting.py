@@ -1,9 +1,7 @@
 from weighting_strategies.weighting_strategy import WeightingStrategy
 
-import math
+import numpy as np
 import time
-import json
-import re
 
 
 class BM25Weighting(WeightingStrategy):
@@ -14,38 +12,36 @@ class BM25Weighting(WeightingStrategy):
     def calculate_weight(self, collection):
         """
         Constructs the weighted inverted index using the BM25 weighting scheme.
+        The weights of all the postings are computed at once, see bm25_weighted_index.
         """
-        weighted_index = {}
         start_time = time.time()
-
-        for term, postings in collection.inverted_index.IDX.items():
-            for x_path, docno_list in postings.items():
-                tag = re.sub(r'\[\d+\]', '', x_path).split("/")[-1]
-                N = collection.statistics.avdl_df.loc[collection.statistics.avdl_df['XPath'] == tag]['N'].values[0]
-                avdl = collection.statistics.avdl_df.loc[collection.statistics.avdl_df['XPath'] == tag]['avdl'].values[0]
-
-                df = collection.document_frequency(term, tag)          # Document frequency
-                idf = math.log10((N - df + 0.5) / (df + 0.5))          # Inverse document frequency
-                for docno in docno_list:
-                    dl = collection.document_length(docno, tag)  # Document lengt
-                    tf = collection.term_frequency(docno, term, x_path)
-
-                    # Calculate BM25 weight for the term in the document
-                    weight = (tf * (self.k1 + 1)) / \
-                        (self.k1 * ((1 - self.b) + self.b * (dl / avdl)) + tf)
-                    weight *= idf
-
-                    # Update the weighted index
-                    if term not in weighted_index:
-                        weighted_index[term] = []
-
-                    weighted_index[term].append({"XPath": x_path, "docno": docno, "weight": weight})
+        weighted_index = self.bm25_weighted_index(collection, self.k1, self.b)
 
         end_time = time.time()
         self.print_computation_time(start_time, end_time)
 
         return weighted_index
 
+    def weight_terms(self, collection, terms):
+        """
+        Returns the weighted index of some terms only, see WeightingStrategy.weight_terms.
+        """
+        return self.bm25_weighted_index(collection, self.k1, self.b, postings=self.term_postings(collection, terms))
+
+    def weight_terms_grid(self, collection, terms, strategies):
+        """
+        Returns the weights of some terms for a grid of (k1, b), see WeightingStrategy.weight_terms_grid.
+        The postings are gathered once and weighted for all the pairs of parameters at once.
+        """
+        columns = self.bm25_columns(collection, postings=self.term_postings(collection, terms))
+        if columns is None:
+            return {}
+
+        groups, tf, dl, avdl, idf = columns
+        k1 = np.array([strategy.k1 for strategy in strategies], dtype=np.float64)[:, np.newaxis]
+        b = np.array([strategy.b for strategy in strategies], dtype=np.float64)[:, np.newaxis]
+        return self.grid_weighted_index(groups, self.bm25_weights(tf, dl, avdl, idf, k1, b))
+
     def get_weighting_scheme_parameters(self):
         """
         Returns the parameters of the weighting scheme.
@@ -1,7 +1,8 @@
 from weighting_strategies.weighting_strategy import WeightingStrategy
+from models.weighted_index import WeightedIndex
+import numpy as np
 import time
 import math
-import re
 
 
 class LNUWeighting(WeightingStrategy):
@@ -13,32 +14,65 @@ class LNUWeighting(WeightingStrategy):
         Constructs the weighted index using the LNU weighting scheme.
         """
         start_time = time.time()
-        weighted_index = {}
+        weighted_index = self.weight_terms(collection, collection.inverted_index.IDX.keys())
 
-        for term, postings in collection.inverted_index.IDX.items():
+        end_time = time.time()
+        self.print_computation_time(start_time, end_time)
+
+        return weighted_index
+
+    def weight_terms(self, collection, terms):
+        """
+        Returns the weighted index of some terms only, see WeightingStrategy.weight_terms.
+        """
+        groups = []     # (term, x_path, docnos) of each group of postings
+        weights = []
+
+        for term, postings in self.term_postings(collection, terms).items():
             for xpath, docno_list in postings.items():
-                tag = re.sub(r'\[\d+\]', '', xpath).split("/")[-1]
-                avdl = collection.statistics.avdl_df.loc[collection.statistics.avdl_df['XPath'] == tag]['avdl'].values[0]
+                tag = collection.xpath_tag(xpath)
+                avdl = collection.statistics.avdl(tag)
 
+                groups.append((term, xpath, docno_list))
                 for docno in docno_list:
                     lnn = 1 + math.log10(collection.term_frequency(docno, term, xpath))
                     length_normalization = 1 + math.log10(collection.document_length(docno, tag) / avdl)
 
                     pivot = collection.statistics.avg_distinct_terms_in_document
-                    nt_d = collection.statistics.distinct_terms_in_document[docno]
+                    nt_d = int(collection.statistics.distinct_terms_in_document[docno])
 
                     adjustement = (1 - self.slope) + pivot + (self.slope * nt_d)
-                    weight = (lnn / length_normalization) / adjustement
+                    weights.append((lnn / length_normalization) / adjustement)
 
-                    if term not in weighted_index:
-                        weighted_index[term] = []
+        return WeightedIndex.from_groups(groups, weights)
 
-                    weighted_index[term].append({"XPath": xpath, "docno": docno, "weight": weight})
+    def weight_terms_grid(self, collection, terms, strategies):
+        """
+        Returns the weights of some terms for a grid of slopes, see WeightingStrategy.weight_terms_grid.
+        The normalized term frequencies are computed once, the pivoted normalization is applied for all the slopes at once.
+        """
+        groups = []     # (term, x_path, docnos) of each group of postings
+        normalized_tfs, distinct_terms = [], []
+        for term, postings in self.term_postings(collection, terms).items():
+            for xpath, docno_list in postings.items():
+                tag = collection.xpath_tag(xpath)
+                avdl = collection.statistics.avdl(tag)
 
-        end_time = time.time()
-        self.print_computation_time(start_time, end_time)
+                groups.append((term, xpath, docno_list))
+                for docno in docno_list:
+                    lnn = 1 + math.log10(collection.term_frequency(docno, term, xpath))
+                    length_normalization = 1 + math.log10(collection.document_length(docno, tag) / avdl)
 
-        return weighted_index
+                    normalized_tfs.append(lnn / length_normalization)
+                    distinct_terms.append(int(collection.statistics.distinct_terms_in_document[docno]))
+
+        if not groups:
+            return {}
+
+        pivot = collection.statistics.avg_distinct_terms_in_document
+        slope = np.array([strategy.slope for strategy in strategies], dtype=np.float64)[:, np.newaxis]
+        adjustement = (1 - slope) + pivot + (slope * np.array(distinct_terms, dtype=np.float64))
+        return self.grid_weighted_index(groups, np.array(normalized_tfs, dtype=np.float64) / adjustement)
 
     def get_weighting_scheme_parameters(self):
         """
@@ -1,11 +1,15 @@
 from weighting_strategies.weighting_strategy import WeightingStrategy
 from weighting_strategies.ltn_weighting import LTNWeighting
 
-import math
+import numpy as np
 import time
 
 
 class LTCWeighting(WeightingStrategy):
+    def __init__(self):
+        self.sum_of_squares = None  # The sum of squares of the LTN weights of each document id, see weight_terms
+        self.normalized_docnos = None   # The document ids of the sums of squares, renumbered when the index is imported again
+
     def calculate_weight(self, collection):
         """
         Constructs the weighted index using the LTC weighting scheme.
@@ -19,42 +23,64 @@ class LTCWeighting(WeightingStrategy):
         self.print_computation_time(start_time, end_time)
         return normalized_index
 
-    def length_normalization(self, collection, weighted_index):
+    def weight_terms(self, collection, terms):
+        """
+        Returns the weighted index of some terms only, see WeightingStrategy.weight_terms.
+        The documents are normalized by the LTN weights of the terms of the inverted index (ex: the vocabulary
+        of the queries) like calculate_weight, they are computed once. The documents of a term loaded later
+        which are not normalized yet are normalized by the weights of the term. They are computed again
+        when the documents of the collection change, ex: after Collection.delete_documents.
+        """
+        if self.sum_of_squares is None or self.normalized_docnos is not collection.inverted_index.docnos:
+            weighted_index = LTNWeighting().weight_terms(collection, collection.inverted_index.IDX.keys())
+            self.sum_of_squares = self._compute_sum_of_squares(collection, weighted_index)
+            self.normalized_docnos = collection.inverted_index.docnos
+
+        weighted_index = LTNWeighting().weight_terms(collection, terms)
+        sum_of_squares = self._compute_sum_of_squares(collection, weighted_index)
+        missing = np.isnan(self.sum_of_squares)
+        self.sum_of_squares[missing] = sum_of_squares[missing]
+
+        return self.length_normalization(collection, weighted_index, self.sum_of_squares)
+
+    def length_normalization(self, collection, weighted_index, sum_of_squares=None):
         """
         Normalizes the weights in the weighted index using the length normalization formula.
+        The sum of squares of each document id is computed from the weighted index when it is not given.
+        The weights of all the postings are normalized at once, in float64.
         """
-        sum_of_squares_dict = self._compute_sum_of_squares(collection, weighted_index)
+        if sum_of_squares is None:
+            sum_of_squares = self._compute_sum_of_squares(collection, weighted_index)
 
-        # Normalize the weights
-        for _, entries in weighted_index.items():
-            for entry in entries:
-                docno = entry['docno']
-                sum_of_squares = sum_of_squares_dict[docno]
+        _, docnos, _, weights = weighted_index.columns()
 
-                # Calculate the normalization factor
-                # w(i, d): Weight of term 'term' in document 'docno' before normalization
-                normalization_factor = 1.0 / math.sqrt(sum_of_squares)
+        # Calculate the normalization factor
+        # w(i, d): Weight of term 'term' in document 'docno' before normalization
+        normalization_factors = 1.0 / np.sqrt(sum_of_squares[docnos])
 
-                # Apply the length normalization to the weight for term 'term' in document 'docno'
-                # w_ln(i, d): Weight of term 'term' in document 'docno' after length normalization
-                entry['weight'] *= normalization_factor
-        return weighted_index
+        # Apply the length normalization to the weight for term 'term' in document 'docno'
+        # w_ln(i, d): Weight of term 'term' in document 'docno' after length normalization
+        return weighted_index.with_weights(weights.astype(np.float64) * normalization_factors)
 
     def _compute_sum_of_squares(self, collection, weighted_index):
         """
-        Computes the sum of squares for each document in the collection.
+        Computes the sum of squares of the weights of each document id of the collection, NaN for the
+        documents without weights. The squares are added in the order of the postings.
         """
-        sum_of_squares_dict = {}
-        for term, entries in weighted_index.items():
-            for entry in entries:
-                docno = entry['docno']
-                sum_of_squares_dict.setdefault(docno, 0)
+        _, docnos, _, weights = weighted_index.columns()
+        number_of_documents = max(len(collection.inverted_index.docnos), int(docnos.max(initial=-1)) + 1)
+
+        # Calculate the square of the weight for term 'term' in document 'docno' and add it to the sum of squares
+        # w_ln(i, d): Weight of term 'term' in document 'docno' after length normalization
+        weights = weights.astype(np.float64)
+        sum_of_squares = np.zeros(number_of_documents, dtype=np.float64)
+        np.add.at(sum_of_squares, docnos, weights * weights)
 
-                # Calculate the square of the weight for term 'term' in document 'docno' and add it to the sum of squares
-                # w_ln(i, d): Weight of term 'term' in document 'docno' after length normalization
-                sum_of_squares_dict[docno] += math.pow(entry['weight'], 2)
+        has_weights = np.zeros(number_of_documents, dtype=bool)
+        has_weights[docnos] = True
+        sum_of_squares[~has_weights] = np.nan
 
-        return sum_of_squares_dict
+        return sum_of_squares
 
     def get_weighting_scheme_parameters(self):
         """
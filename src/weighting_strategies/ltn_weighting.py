@@ -1,4 +1,5 @@
 from weighting_strategies.weighting_strategy import WeightingStrategy
+from models.weighted_index import WeightedIndex
 import time
 
 
@@ -8,23 +9,28 @@ class LTNWeighting(WeightingStrategy):
         Constructs the weighted inverted index.
         """
         start_time = time.time()
-        weighted_index = {}
-
-        for term, postings in collection.inverted_index.IDX.items():
-            for xpath, docno_list in postings.items():
-                for docno in docno_list:
-                    weight = self.TF_IDF_weight(collection, docno, term, xpath)
-
-                    if term not in weighted_index:
-                        weighted_index[term] = []
-
-                    weighted_index[term].append({"XPath": xpath, "docno": docno, "weight": weight})
+        weighted_index = self.weight_terms(collection, collection.inverted_index.IDX.keys())
 
         end_time = time.time()
         self.print_computation_time(start_time, end_time)
 
         return weighted_index
 
+    def weight_terms(self, collection, terms):
+        """
+        Returns the weighted index of some terms only, see WeightingStrategy.weight_terms.
+        """
+        groups = []     # (term, x_path, docnos) of each group of postings
+        weights = []
+
+        for term, postings in self.term_postings(collection, terms).items():
+            for xpath, docno_list in postings.items():
+                groups.append((term, xpath, docno_list))
+                for docno in docno_list:
+                    weights.append(self.TF_IDF_weight(collection, docno, term, xpath))
+
+        return WeightedIndex.from_groups(groups, weights)
+
     def get_weighting_scheme_parameters(self):
         """
         Returns the parameters of the weighting scheme.
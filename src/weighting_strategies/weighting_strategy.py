@@ -1,20 +1,67 @@
+from models.weighted_index import WeightedIndex, WEIGHT_DTYPE
+
 from colorama import Fore, Style
+import numpy as np
 import json
 import math
-import re
 
 
 class WeightingStrategy:
     def calculate_weight(self, collection):
         raise NotImplementedError("Subclasses must implement this method")
 
+    def weight_terms(self, collection, terms) -> dict:
+        """
+        Returns the weighted index of some terms only, with the weights of calculate_weight.
+        It is used by the query-time scoring, see LazyWeightedIndex.
+
+        Args:
+            collection: The collection, with its inverted index and statistics.
+            terms: The term ids, the terms which are not in the inverted index are ignored.
+
+        Returns:
+            WeightedIndex: The weighted index {term: TermWeights}.
+        """
+        raise NotImplementedError("Subclasses must implement this method")
+
+    def weight_terms_grid(self, collection, terms, strategies: list) -> dict:
+        """
+        Returns the weights of some terms for a grid of strategies of the same scheme at once, ex: to tune
+        their parameters. The postings of a term are in the order of weight_terms, each strategy has its row
+        of weights. The strategies are applied one after the other, the schemes with parameters weight the
+        postings for the whole grid at once.
+
+        Args:
+            collection: The collection, with its inverted index and statistics.
+            terms: The term ids, the terms which are not in the inverted index are ignored.
+            strategies (list): The strategies, ex: [BM25Weighting(k1=k1, b=b) for ...].
+
+        Returns:
+            dict: The weights {term: (x_paths, docnos, weights)}, NumPy arrays with weights of shape (strategies, postings).
+        """
+        weighted_indexes = [strategy.weight_terms(collection, terms) for strategy in strategies]
+
+        grid = {}
+        for term, term_weights in weighted_indexes[0].items():
+            weights = np.array([weighted_index[term].weights for weighted_index in weighted_indexes], dtype=WEIGHT_DTYPE)
+            grid[term] = (term_weights.x_paths, term_weights.docnos, weights)
+
+        return grid
+
+    def term_postings(self, collection, terms) -> dict:
+        """
+        Returns the postings {term: {x_path: [docno]}} of the terms of the inverted index, the other terms are ignored.
+        """
+        IDX = collection.inverted_index.IDX
+        return {term: IDX[term] for term in terms if term in IDX}
+
     def IDF(self, collection, term, x_path):
         """
         Calculates the IDF of a term.
         """
         # Calculate the IDF
         # idf(i): IDF of term 'term'
-        tag = re.sub(r'\[\d+\]', '', x_path).split("/")[-1]
+        tag = collection.xpath_tag(x_path)
         return math.log10(collection.collection_size / collection.document_frequency(term, tag))
 
     def TF(self, collection, docno, term, x_path):
@@ -33,10 +80,165 @@ class WeightingStrategy:
         # w(i, d): Weight of term 'term' in document 'docno'
         return (1 + math.log10(self.TF(collection, docno, term, x_path))) * self.IDF(collection, term, x_path)
 
-    def export_weighted_index(self, weighted_index, filename):
+    def tag_statistics(self, collection) -> dict:
         """
-        Exports the weighted index to a JSON file.
+        Returns the number of elements and the average length of each tag {tag: (N, avdl)}.
         """
+        statistics = collection.statistics
+        return {tag: (statistics.N(tag), statistics.avdl(tag)) for tag in statistics.tags}
+
+    def document_length_columns(self, collection, tags: list) -> np.ndarray:
+        """
+        Returns the length of each document id for each tag, one row per tag (0 if the document has no element of the tag).
+        """
+        lengths = collection.statistics.document_length_columns(tags)
+        number_of_documents = len(collection.inverted_index.docnos)
+        if lengths.shape[1] < number_of_documents:
+            lengths = np.pad(lengths, ((0, 0), (0, number_of_documents - lengths.shape[1])))
+
+        return lengths
+
+    def bm25_weighted_index(self, collection, k1, b, term_frequencies: dict = None, weighted_x_path: int = None,
+                            postings: dict = None, dtype=WEIGHT_DTYPE) -> WeightedIndex:
+        """
+        Returns the BM25 weights of the postings of the inverted index, computed at once with NumPy.
+        The postings are gathered into columns (term frequency, document length, average document length
+        and IDF of their tag), the weights are computed with the same operations as for a single posting
+        so they are the same numbers.
+
+        Args:
+            collection: The collection, with its inverted index and statistics.
+            k1 (float): The term frequency saturation.
+            b (float): The document length normalization.
+            term_frequencies (dict, optional): The term frequencies {term: {x_path: {docno: tf}}} replacing the ones
+                of the index, ex: the combined term frequencies of BM25Fr. Defaults to None.
+            weighted_x_path (int, optional): The XPath id of the weighted postings. Defaults to the XPath of each posting.
+            postings (dict, optional): The weighted postings {term: {x_path: [docno]}}. Defaults to the inverted index.
+            dtype (np.dtype, optional): The type of the stored weights, see WeightedIndex.from_groups. Defaults to WEIGHT_DTYPE.
+
+        Returns:
+            WeightedIndex: The weighted index {term: TermWeights}.
+        """
+        columns = self.bm25_columns(collection, term_frequencies, postings)
+        if columns is None:
+            return WeightedIndex()
+
+        groups, tf, dl, avdl, idf = columns
+        return WeightedIndex.from_groups(groups, self.bm25_weights(tf, dl, avdl, idf, k1, b), weighted_x_path, dtype)
+
+    def bm25_columns(self, collection, term_frequencies: dict = None, postings: dict = None) -> tuple:
+        """
+        Gathers the postings into the columns of the BM25 weights: the term frequency, the document length,
+        the average document length and the IDF of the tag of each posting.
+
+        Args:
+            collection: The collection, with its inverted index and statistics.
+            term_frequencies (dict, optional): The term frequencies replacing the ones of the index, see bm25_weighted_index.
+            postings (dict, optional): The postings {term: {x_path: [docno]}}. Defaults to the inverted index.
+
+        Returns:
+            tuple: The groups of postings [(term, x_path, docnos)] and the tf, dl, avdl and idf columns (NumPy arrays),
+                None if there is no posting.
+        """
+        tag_statistics = self.tag_statistics(collection)
+        inverted_index = collection.inverted_index
+        tag_rows = {}   # The row of each tag in the document length columns
+
+        groups = []     # (term, x_path, docnos) of each group of postings
+        docnos, tfs, group_rows, avdls, idfs = [], [], [], [], []
+        if postings is None:
+            postings = inverted_index.IDX
+
+        for term, term_postings in postings.items():
+            if term_frequencies is None:
+                xpath_tfs = {x_path: frequencies for x_path, _, frequencies in inverted_index.TF.xpath_postings(term)}
+
+            for x_path, docno_list in term_postings.items():
+                if not docno_list:
+                    continue
+
+                tag = collection.xpath_tag(x_path)
+                N, avdl = tag_statistics[tag]
+                df = collection.document_frequency(term, tag)           # Document frequency
+                idf = math.log10((N - df + 0.5) / (df + 0.5))           # Inverse document frequency
+
+                if term_frequencies is not None:
+                    frequencies = term_frequencies[term][x_path]
+                    tfs.extend(frequencies.get(docno, 0) for docno in docno_list)
+                else:
+                    frequencies = xpath_tfs.get(x_path)
+                    if frequencies is not None and len(frequencies) == len(docno_list):
+                        tfs.extend(frequencies)
+                    else:
+                        tfs.extend(collection.term_frequency(docno, term, x_path) for docno in docno_list)
+
+                groups.append((term, x_path, docno_list))
+                docnos.extend(docno_list)
+                group_rows.append(tag_rows.setdefault(tag, len(tag_rows)))
+                avdls.append(avdl)
+                idfs.append(idf)
+
+        if not groups:
+            return None
+
+        group_sizes = [len(docno_list) for _, _, docno_list in groups]
+        tf = np.array(tfs, dtype=np.float64)
+        dl = self.document_length_columns(collection, list(tag_rows))[np.repeat(group_rows, group_sizes),
+                                                                      np.array(docnos, dtype=np.int64)]
+        avdl = np.repeat(np.array(avdls, dtype=np.float64), group_sizes)
+        idf = np.repeat(np.array(idfs, dtype=np.float64), group_sizes)
+
+        return groups, tf, dl, avdl, idf
+
+    def bm25_weights(self, tf, dl, avdl, idf, k1, b) -> np.ndarray:
+        """
+        Returns the BM25 weights of columns of postings, see bm25_columns.
+        k1 and b are numbers, or columns of one value per row to weight the postings for a grid of parameters
+        at once (one row of weights per pair of parameters).
+        """
+        weights = (tf * (k1 + 1)) / (k1 * ((1 - b) + b * (dl / avdl)) + tf)
+        weights *= idf
+        return weights
+
+    def grid_weighted_index(self, groups: list, weights: np.ndarray, weighted_x_path: int = None) -> dict:
+        """
+        Returns the weights of a grid of strategies {term: (x_paths, docnos, weights)}, see weight_terms_grid.
+        The weights are stored in WEIGHT_DTYPE like the weighted indexes.
+
+        Args:
+            groups (list): The groups of postings [(term, x_path, docnos)], the groups of a term follow each other.
+            weights (np.ndarray): The weights of the postings of the groups, one row per strategy.
+            weighted_x_path (int, optional): The XPath id of the weighted postings. Defaults to the XPath of each posting.
+        """
+        bounds = {}     # The first and last postings of each term
+        x_paths, docnos = [], []
+        for term, x_path, docno_list in groups:
+            start = bounds[term][0] if term in bounds else len(docnos)
+            x_paths.extend([x_path if weighted_x_path is None else weighted_x_path] * len(docno_list))
+            docnos.extend(docno_list)
+            bounds[term] = (start, len(docnos))
+
+        x_paths = np.array(x_paths, dtype=np.int64)
+        docnos = np.array(docnos, dtype=np.int64)
+        weights = np.asarray(weights, dtype=WEIGHT_DTYPE)
+        return {term: (x_paths[start:end], docnos[start:end], weights[:, start:end]) for term, (start, end) in bounds.items()}
+
+    def export_weighted_index(self, weighted_index, filename, inverted_index=None):
+        """
+        Exports the weighted index to a JSON file, the ids are translated back to strings
+        when the inverted index is given.
+        """
+        if inverted_index is not None:
+            terms, docnos, xpaths = inverted_index.terms, inverted_index.docnos, inverted_index.xpaths
+            weighted_index = {
+                terms.key(term): [{"XPath": xpaths.key(x_path),
+                                   "docno": docnos.key(docno),
+                                   "weight": weight} for docno, x_path, weight in term_weights.postings()]
+                for term, term_weights in weighted_index.items()
+            }
+        else:
+            weighted_index = {term: term_weights.entries() for term, term_weights in weighted_index.items()}
+
         weighted_index_data = {"weighted_index": weighted_index}
 
         with open(filename, "w") as file: